@@ -1,22 +1,30 @@
+import os
 import json
+from results_log import log_path_for, read_results
+
+def read_entries(file_path):
+    """Yields the entries of a results JSONL log, or of an exported results JSON array."""
+    if file_path.endswith(".jsonl"):
+        yield from read_results(file_path)
+    else:
+        with open(file_path, 'r') as file:
+            yield from json.load(file)
 
 def calculate_percentage_with_score_1(file_path):
     """
-    Reads a JSON file and calculates the percentage of entries with a score of 1.0.
+    Reads a results log (or exported JSON file) and calculates the percentage of entries with a score of 1.0.
     
-    :param file_path: Path to the JSON file.
+    :param file_path: Path to the JSONL log or JSON file.
     :return: Percentage of entries with a score of 1.0.
     """
     try:
-        # Load the JSON data
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-        
-        # Total entries in the JSON file
-        total_entries = len(data)
-        
-        # Count entries with a score of 1.0
-        score_1_count = sum(1 for entry in data if entry.get('Score') == 1.0)
+        # Stream the entries, counting as we go
+        total_entries = 0
+        score_1_count = 0
+        for entry in read_entries(file_path):
+            total_entries += 1
+            if entry.get('Score') == 1.0:
+                score_1_count += 1
         
         # Calculate the percentage
         if total_entries > 0:
@@ -33,6 +41,8 @@ def calculate_percentage_with_score_1(file_path):
         print(f"Error reading or processing the JSON file: {e}")
         return None
 
-# Replace 'results.json' with the path to your JSON file
+# Replace 'results.json' with the path to your JSON file; its JSONL log is read instead when present
 results_file = "results_gpt-4o-mini_text-embedding-ada-002_relevancy.json"
+if os.path.exists(log_path_for(results_file)):
+    results_file = log_path_for(results_file)
 calculate_percentage_with_score_1(results_file)
@@ -0,0 +1,114 @@
+import os
+import threading
+import numpy as np
+from tracing import get_tracer
+
+# Optional approximate nearest-neighbour search over an embedding matrix, selected
+# with the "ann" section of config.json, e.g. {"type": "hnsw"}. The HNSW graph
+# (hnswlib, installed separately) is built at ingest next to the matrix in the
+# artifact store. min_nodes can keep small corpora on exact search, which is both
+# faster and exact at that size. It is compared with the whole corpus a matrix is
+# searched with (every document of a multi-document engine): a single filing has
+# a few hundred nodes, so a per-document threshold would rarely be reached.
+
+DEFAULT_ANN_CONFIG = {
+    "type": "exact",
+    "min_nodes": 0,
+    "M": 16,
+    "ef_construction": 200,
+    "ef_search": 100,
+}
+
+def ann_config_with_defaults(ann_config=None):
+    """Fills in the defaults for the "ann" section of the config."""
+    return {**DEFAULT_ANN_CONFIG, **(ann_config or {})}
+
+def ann_settings(ann_config):
+    """Returns the settings that change the built graph, for artifact store keys. ef_search does not."""
+    return {"type": ann_config["type"], "M": ann_config["M"], "ef_construction": ann_config["ef_construction"]}
+
+class HnswIndex:
+    """
+    HNSW graph over the rows of a normalized embedding matrix, scored by inner product (cosine).
+
+    The search list length (ef) is shared by every thread querying the graph, so it
+    is only ever raised: to ``ef_search`` when loaded and to the largest k asked for
+    since. A query then never searches with a shorter list than it needs.
+    """
+
+    def __init__(self, index, ef_search):
+        self.index = index
+        self.ef_search = ef_search
+        self.ef = ef_search
+        self.ef_lock = threading.Lock()
+        self.index.set_ef(ef_search)
+
+    @classmethod
+    def build(cls, matrix, M=16, ef_construction=200, ef_search=100):
+        """Builds the graph over every row of the matrix; row i gets label i."""
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        index.init_index(max_elements=len(matrix), M=M, ef_construction=ef_construction, random_seed=0)
+        index.add_items(np.asarray(matrix, dtype=np.float32), np.arange(len(matrix)))
+        return cls(index, ef_search)
+
+    @classmethod
+    def load(cls, index_path, dim, ef_search=100):
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(index_path)
+        return cls(index, ef_search)
+
+    def save(self, index_path):
+        """Saves the graph, moving it into place only once it is completely written."""
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        self.index.save_index(tmp_path)
+        os.replace(tmp_path, index_path)
+
+    def query(self, queries, k):
+        """
+        Returns (positions, scores) arrays of shape (num_queries, k), best first.
+
+        ``queries`` must be normalized. hnswlib's "ip" distance is 1 - dot product.
+        """
+        # The search list has to be at least k long
+        if k > self.ef:
+            with self.ef_lock:
+                if k > self.ef:
+                    self.index.set_ef(k)
+                    self.ef = k
+        labels, distances = self.index.knn_query(np.asarray(queries, dtype=np.float32), k=k)
+        return labels.astype(np.int64), (1.0 - distances).astype(np.float32)
+
+def open_ann_index(store, embeddings_key, matrix, ann_config=None, verbosity=False, corpus_nodes=None):
+    """
+    Returns the ANN index of an embedding matrix, building and saving it on first use.
+
+    Returns None when the config selects exact search or the corpus is smaller
+    than ``min_nodes``. ``corpus_nodes`` is the size of the corpus the matrix is
+    searched with, by default its own row count.
+    """
+    ann_config = ann_config_with_defaults(ann_config)
+    if corpus_nodes is None:
+        corpus_nodes = len(matrix)
+    if ann_config["type"] == "exact" or corpus_nodes < ann_config["min_nodes"]:
+        return None
+    if ann_config["type"] != "hnsw":
+        raise ValueError(f"Unsupported ANN index type: {ann_config['type']}")
+
+    ann_key = store.key("ann", embeddings_key, ann_settings(ann_config))
+    index_path = store.path("ann", ann_key, extension=".bin")
+    with get_tracer().span("index_build", kind="hnsw", nodes=len(matrix)) as span:
+        if store.contains("ann", ann_key, extension=".bin"):
+            span.set(cache_hit=True)
+            return HnswIndex.load(index_path, matrix.shape[1], ann_config["ef_search"])
+
+        span.set(cache_hit=False)
+        if verbosity:
+            print(f"Building HNSW index over {len(matrix)} nodes...")
+        index = HnswIndex.build(matrix, ann_config["M"], ann_config["ef_construction"], ann_config["ef_search"])
+        index.save(index_path)
+        return index
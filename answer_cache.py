@@ -0,0 +1,170 @@
+import re
+import threading
+import time as time
+import numpy as np
+from collections import OrderedDict
+
+# Defaults for the "answer_cache" section of config.json. The threshold is high on
+# purpose: "revenue in Q3" and "revenue in Q2" embed very closely, so a cached answer
+# is only reused when the questions also mention exactly the same numbers.
+DEFAULT_SIMILARITY_THRESHOLD = 0.97
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1024
+
+def query_numbers(query):
+    """Returns the numbers (years, quarters, amounts) mentioned in a query."""
+    return frozenset(re.findall(r"\d+(?:[.,]\d+)*", query))
+
+def retrieval_settings(engine):
+    """
+    Returns the settings that change which nodes an engine retrieves, as a hashable tuple.
+
+    These are the retriever's type and options (the multi-document filter, the
+    hybrid candidates and RRF constant) and each node postprocessor's class with
+    its scalar fields (the reranker's model, top_n, batch size and budget). Fields
+    holding nodes, like the pages of a ParentPagePostprocessor, are left out: they
+    come from the same ingest as the index, whose artifact key is in the scope.
+    """
+    retriever = engine.retriever
+    settings = [type(retriever).__name__]
+    for option in ("_document_filter", "_candidates", "_rrf_k"):
+        value = getattr(retriever, option, None)
+        if value is not None:
+            settings.append((option.lstrip("_"), tuple(sorted(value)) if isinstance(value, list) else value))
+    for postprocessor in engine._node_postprocessors:
+        fields = ((name, getattr(postprocessor, name)) for name in type(postprocessor).model_fields)
+        settings.append((
+            postprocessor.class_name(),
+            tuple((name, value) for name, value in fields if isinstance(value, (str, int, float, bool, type(None)))),
+        ))
+    return tuple(settings)
+
+def answer_scope(engine, document_name, retrieval_depth):
+    """
+    Returns what a cached answer depends on besides the question.
+
+    The last part is the artifact key of the index (for one document, the key
+    of its embedding matrix: a hash of its nodes and embedding model), so
+    re-ingesting a changed document changes the scope.
+    """
+    retriever = engine.retriever
+    llm = getattr(engine._response_synthesizer, "_llm", None)
+    artifact = getattr(retriever.index, "artifact_key", "")
+    return (
+        document_name,
+        getattr(llm, "model", type(llm).__name__),
+        retriever.embed_model.model_name,
+        retrieval_depth,
+        retrieval_settings(engine),
+        artifact,
+    )
+
+class SemanticAnswerCache:
+    """
+    Thread-safe cache of answers, looked up by query-embedding similarity.
+
+    A lookup hits when a cached question in the same scope (see answer_scope)
+    has cosine similarity of at least ``similarity_threshold`` with the new one
+    and mentions the same numbers. Entries expire after ``ttl_seconds`` and the
+    least recently used are evicted beyond ``max_entries``. When a document's
+    artifact hash changes, its entries for the old hash are dropped.
+    """
+
+    def __init__(self, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.artifacts = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a cache from the "answer_cache" section of a config, or returns None if it is disabled (the default)."""
+        cache_config = config.get("answer_cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        return cls(
+            similarity_threshold=cache_config.get("similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD),
+            ttl_seconds=cache_config.get("ttl_seconds", DEFAULT_TTL_SECONDS),
+            max_entries=cache_config.get("max_entries", DEFAULT_MAX_ENTRIES),
+        )
+
+    def lookup(self, scope, query, query_embedding):
+        """Returns the cached (answer, retrieval context) for a similar query, or None."""
+        embedding = self._normalize(query_embedding)
+        numbers = query_numbers(query)
+        now = time.time()
+        with self.lock:
+            self._check_artifact(scope)
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id, entry in list(self.entries.items()):
+                if now - entry["created"] > self.ttl_seconds:
+                    del self.entries[entry_id]
+                    self.expirations += 1
+                    continue
+                if entry["scope"] != scope or entry["numbers"] != numbers:
+                    continue
+                similarity = float(np.dot(entry["embedding"], embedding))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self.entries[best_id]
+            return entry["answer"], list(entry["retrieval_context"])
+
+    def put(self, scope, query, query_embedding, answer, retrieval_context):
+        """Caches the answer to a query."""
+        with self.lock:
+            self._check_artifact(scope)
+            self.entries[self.next_id] = {
+                "scope": scope,
+                "numbers": query_numbers(query),
+                "embedding": self._normalize(query_embedding),
+                "answer": answer,
+                "retrieval_context": list(retrieval_context),
+                "created": time.time(),
+            }
+            self.next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns entry, hit, miss, expiration, eviction and invalidation counts."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_artifact(self, scope):
+        # Caller holds self.lock. Drops entries built on an older artifact of the same document.
+        document_scope, artifact = scope[:-1], scope[-1]
+        if self.artifacts.get(document_scope, artifact) != artifact:
+            stale = [entry_id for entry_id, entry in self.entries.items() if entry["scope"][:-1] == document_scope and entry["scope"][-1] != artifact]
+            for entry_id in stale:
+                del self.entries[entry_id]
+            self.invalidations += len(stale)
+        self.artifacts[document_scope] = artifact
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
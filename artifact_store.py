@@ -0,0 +1,113 @@
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+
+# Bump when the on-disk layout or the pickled payloads change shape, so old artifacts are ignored
+STORE_VERSION = 1
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """Returns the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_hash(text):
+    """Returns the sha256 hex digest of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def hash_texts(texts):
+    """Returns the sha256 hex digest of an ordered sequence of strings."""
+    digest = hashlib.sha256()
+    for text in texts:
+        encoded = text.encode("utf-8")
+        # Length prefix keeps ["ab", "c"] and ["a", "bc"] distinct
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+def atomic_write(file_path, write):
+    """
+    Writes a file atomically.
+
+    ``write`` is called with a binary file object for a temporary file in the
+    target directory, which is fsynced and then moved over ``file_path``.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ArtifactStore:
+    """
+    Content-addressed store for the layers of the ingest pipeline.
+
+    Every artifact lives under ``<root>/v<STORE_VERSION>/<layer>/<key>.pkl`` where
+    the key is a hash of the layer's input content plus the settings that affect
+    it. A change to one setting therefore only invalidates the layers below it.
+    Writes go to a temporary file in the same directory and are moved into place
+    with ``os.replace``, so a crash never leaves a half-written artifact behind.
+    """
+
+    def __init__(self, root="artifacts"):
+        self.root = os.path.join(root, f"v{STORE_VERSION}")
+        self.hits = {}
+        self.misses = {}
+
+    def key(self, layer, input_hash, settings=None):
+        """Derives the key of a layer from the hash of its input and its settings."""
+        payload = json.dumps(
+            {"layer": layer, "input": input_hash, "settings": settings or {}},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, layer, key, extension=".pkl"):
+        """Returns the file path of an artifact."""
+        return os.path.join(self.root, layer, f"{key}{extension}")
+
+    def contains(self, layer, key, extension=".pkl"):
+        """Checks whether an artifact exists, counting the lookup as a hit or a miss."""
+        if os.path.exists(self.path(layer, key, extension)):
+            self.hits[layer] = self.hits.get(layer, 0) + 1
+            return True
+        self.misses[layer] = self.misses.get(layer, 0) + 1
+        return False
+
+    def get(self, layer, key):
+        """Loads a pickled artifact, or returns None if it is not in the store."""
+        if not self.contains(layer, key):
+            return None
+        with open(self.path(layer, key), "rb") as f:
+            return pickle.load(f)
+
+    def put(self, layer, key, data):
+        """Atomically writes a pickled artifact to the store."""
+        atomic_write(
+            self.path(layer, key),
+            lambda f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+
+    def remove(self, layer, key, extension=".pkl"):
+        """Deletes an artifact if it exists."""
+        if os.path.exists(self.path(layer, key, extension)):
+            os.remove(self.path(layer, key, extension))
+
+    def stats(self):
+        """Returns the hit and miss counts per layer."""
+        layers = sorted(set(self.hits) | set(self.misses))
+        return {
+            layer: {"hits": self.hits.get(layer, 0), "misses": self.misses.get(layer, 0)}
+            for layer in layers
+        }
@@ -0,0 +1,1210 @@
+import os
+import sys
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import TextNode, MetadataMode, QueryBundle, NodeWithScore
+from dotenv import load_dotenv
+import json
+import pickle
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time as time
+from artifact_store import ArtifactStore, hash_file, hash_texts
+from embedding_matrix import EmbeddingMatrixIndex, EmbeddingMatrixRetriever, save_embedding_matrix
+from stub_models import StubLLM, StubEmbedding
+from pdf_parsers import parse_document, parser_settings
+from embedding_pipeline import EmbeddingPipeline
+from embedding_cache import EmbeddingCache, CachedEmbedding
+from answer_cache import SemanticAnswerCache, answer_scope
+from ann_index import open_ann_index
+from bm25_index import HybridRetriever, open_lexical_index
+from reranker import initialize_reranker, rerank_time
+from multi_document import MultiDocumentIndex, DEFAULT_MAX_ROUTED_DOCUMENTS, routed_documents
+from incremental_ingest import build_nodes_incrementally, embed_incrementally
+from table_summaries import SummaryCachingMarkdownElementNodeParser, TableSummarizer
+from node_metadata import intern_metadata, set_shared_metadata, share_metadata
+from node_dedup import ParentPagePostprocessor, dedup_config_with_defaults, dedup_settings, deduplicate_nodes
+from financial_facts import fact_answer, fact_context, open_financial_facts
+from results_log import append_result
+from resource_cache import ResourceCache
+from tracing import configure_tracing, count_tokens, get_tracer, percentile
+
+# The query pipeline: configuration, model clients, ingest, query engines and
+# queries, with their caches and latency metrics. The CLI (script.py), the
+# Streamlit UI (ui.py), the evaluator (evaluate.py) and the query service
+# (service.py) are thin clients of it, through Backend.
+
+def initialize_keys():
+    """Automatically sets API keys from environment variables."""
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        sys.exit("API Key are missing. Please set OPENAI_API_KEY in your environment.")
+    llama_cloud_key = os.getenv("LLAMA_CLOUD_API_KEY")
+    if not llama_cloud_key:
+        sys.exit("API Key are missing. Please set LLAMA_CLOUD_API_KEY in your environment.")
+    #replicate_api_key = os.getenv("REPLICATE_API_TOKEN")
+    #if not replicate_api_key:
+        #sys.exit("API Key are missing. Please set REPLICATE_API_TOKEN in your environment.")
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        sys.exit("API Key are missing. Please set GOOGLE_API_KEY in your environment.")
+# --- Backend Helper Functions ---
+def load_config(config_file="config.json"):
+    """Load configuration settings from a JSON file."""
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    return config
+
+# --- Utility Functions ---
+_artifact_store = None
+
+def get_artifact_store():
+    """Returns the process-wide artifact store, creating it on first use."""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore("artifacts")
+    return _artifact_store
+
+_embedding_cache = None
+
+def get_embedding_cache():
+    """Returns the process-wide per-text embedding cache, creating it on first use."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        os.makedirs("artifacts", exist_ok=True)
+        _embedding_cache = EmbeddingCache(os.path.join("artifacts", "embedding_cache.sqlite"))
+    return _embedding_cache
+
+_financial_facts = {}
+
+def get_financial_facts():
+    """Returns the process-wide financial facts of the documents loaded so far, by document name."""
+    return _financial_facts
+
+def uses_stub_models(config):
+    """Checks whether both the LLM and the embedding model are offline stubs."""
+    return (
+        config.get("llm", {}).get("type", "").lower() == "stub"
+        and config.get("embedding_model", {}).get("type", "").lower() == "stub"
+    )
+
+# Provider SDKs are imported by initialize_llm and initialize_embedding_model when a
+# config selects them, so a run pays only for its own provider: the HuggingFace
+# integrations alone pull in torch and transformers.
+
+def initialize_llm(config):
+    """Initialize the LLM based on the provided configuration, importing only its provider's integration."""
+    llm_config = config.get("llm", {})
+    llm_type = llm_config.get("type", "").lower()
+    
+    if llm_type == "openai":
+        from llama_index.llms.openai import OpenAI
+        model = llm_config.get("model", "")
+        return OpenAI(model=model)
+    elif llm_type == "huggingface":
+        from llama_index.llms.huggingface import HuggingFaceLLM
+        model = llm_config.get("model", "")
+        tokenizer_name = llm_config.get("tokenizer", model)  # Default to model name if no tokenizer is specified
+        return HuggingFaceLLM(model_name=model, tokenizer_name=tokenizer_name)
+    elif llm_type == "replicate":
+        from llama_index.llms.replicate import Replicate
+        model = llm_config.get("model", "")
+        return Replicate(model=model)
+    elif llm_type == "gemini":
+        from llama_index.llms.gemini import Gemini
+        model = llm_config.get("model", "")  # Default model if not specified
+        return Gemini(model=model)
+    elif llm_type == "stub":
+        model = llm_config.get("model", "stub")
+        return StubLLM(model=model, latency=llm_config.get("latency", 0.0))
+    else:
+        raise ValueError(f"Unsupported LLM type: {llm_type}")
+
+def initialize_embedding_model(config):
+    """
+    Initialize the embedding model based on the provided configuration, importing only its provider's integration.
+
+    Unless "embedding_cache" is {"enabled": false} in the config, the model is
+    wrapped in a CachedEmbedding so repeated texts and queries are not re-embedded.
+    """
+    embedding_config = config.get("embedding_model", {})
+    llm_provider = embedding_config.get("type", "").lower()
+
+    if llm_provider == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        model = embedding_config.get("model_name", "text-embedding-ada-002")
+        embedding_model = OpenAIEmbedding(model=model)
+    elif llm_provider == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        model = embedding_config.get("model_name", "BAAI/bge-small-en-v1.5")
+        embedding_model = HuggingFaceEmbedding(model_name=model)
+    elif llm_provider == "gemini":
+        from llama_index.embeddings.gemini import GeminiEmbedding
+        model = embedding_config.get("model_name", "models/text-embedding-004")
+        embedding_model = GeminiEmbedding(model_name=model)
+    elif llm_provider == "stub":
+        model = embedding_config.get("model_name", "stub")
+        embedding_model = StubEmbedding(model_name=model, latency=embedding_config.get("latency", 0.0))
+    else:
+        raise ValueError(f"Unsupported embedding model type: {llm_provider}")
+
+    if not config.get("embedding_cache", {}).get("enabled", True):
+        return embedding_model
+    return CachedEmbedding(embedding_model, get_embedding_cache())
+
+def get_page_nodes(docs, separator="\n---\n"):
+    """Split each document into page nodes, by separator. The pages of a document share one metadata record."""
+    nodes = []
+    for doc in docs:
+        metadata = intern_metadata(doc.metadata)
+        doc_chunks = doc.text.split(separator)
+        for doc_chunk in doc_chunks:
+            node = TextNode(text=doc_chunk)
+            set_shared_metadata(node, metadata)
+            nodes.append(node)
+    return nodes
+
+# --- Document Processing ---
+def parse_and_index_single_document(file_path, model, embedding_model, verbosity=False, parser_config=None, incremental=False, embedding_pipeline=None, ann_config=None, dedup_config=None, table_summarizer=None):
+    """
+    Parses and indexes a single document with a specific embedding model.
+
+    Each stage of the pipeline is cached in the artifact store, keyed by the
+    content hash of its input and the settings it depends on:
+
+        raw PDF -> parsed markdown -> element nodes (with LLM table summaries) -> embeddings
+
+    Changing only the embedding model reuses the parsed markdown and the table
+    summaries, and an edited PDF with the same file name is re-processed.
+    ``parser_config`` selects the PDF parser (see pdf_parsers.py), LlamaParse by default.
+
+    With ``incremental``, nodes are built page by page (see incremental_ingest.py):
+    when an amended filing is ingested, unchanged pages and tables reuse their
+    nodes and summaries, surviving nodes keep their embeddings from the previous
+    ingest of the same file name, and nodes of removed pages are dropped.
+
+    Tables are summarized by ``table_summarizer`` (see table_summaries.py), which
+    saves each summary as soon as the LLM returns it.
+
+    Embeddings are computed by ``embedding_pipeline`` (see embedding_pipeline.py),
+    in batches that are checkpointed so an interrupted ingest resumes where it stopped.
+    ``ann_config`` optionally builds an approximate nearest-neighbour index over
+    them (see ann_index.py).
+
+    With deduplication enabled in ``dedup_config`` (see node_dedup.py), pages whose
+    text is covered by their element nodes are not indexed, near-duplicate nodes
+    are dropped, and every page is stored in the "parent_nodes" layer.
+
+    Each stage is traced as a span with a cache hit flag (see tracing.py).
+    """
+    store = get_artifact_store()
+    tracer = get_tracer()
+
+    # Layer 1: parsed markdown, keyed by the PDF bytes and the parser settings
+    with tracer.span("parse", parser=(parser_config or {}).get("type", "llamaparse")) as span:
+        pdf_hash = hash_file(file_path)
+        parsed_key = store.key("parsed", pdf_hash, parser_settings(parser_config))
+        doc = store.get("parsed", parsed_key)
+        span.set(cache_hit=doc is not None)
+        if doc is None:
+            if verbosity:
+                print(f"Processing document: {os.path.basename(file_path)}")
+            doc = parse_document(file_path, parser_config)
+            store.put("parsed", parsed_key, doc)
+        span.set(pages=sum(len(d.text.split("\n---\n")) for d in doc))
+
+    # Layer 2: element nodes and table summaries, keyed by the parsed text and the LLM
+    parsed_hash = hash_texts(d.text for d in doc)
+    nodes_settings = {"llm": model.model, "incremental": True} if incremental else {"llm": model.model}
+    dedup_config = dedup_config_with_defaults(dedup_config)
+    if dedup_config["enabled"]:
+        nodes_settings["dedup"] = dedup_settings(dedup_config)
+    nodes_key = store.key("nodes", parsed_hash, nodes_settings)
+    with tracer.span("element_parse", incremental=incremental) as span:
+        combined_nodes = store.get("nodes", nodes_key)
+        span.set(cache_hit=combined_nodes is not None)
+        if combined_nodes is not None:
+            share_metadata(combined_nodes)
+        else:
+            if table_summarizer is None:
+                table_summarizer = TableSummarizer(model, store)
+            if incremental:
+                if verbosity:
+                    print("Parsing changed pages into element nodes...")
+                element_nodes, page_nodes, ingest_stats = build_nodes_incrementally(doc, model, store, table_summarizer=table_summarizer)
+                if verbosity:
+                    print(f"Incremental ingest: {ingest_stats}")
+            else:
+                if verbosity:
+                    print("Parsing document into element nodes...")
+                node_parser = SummaryCachingMarkdownElementNodeParser(table_summarizer)
+                nodes = node_parser.get_nodes_from_documents(doc)
+                base_nodes, objects = node_parser.get_nodes_and_objects(nodes)
+                element_nodes, page_nodes = base_nodes + objects, get_page_nodes(doc)
+            if verbosity:
+                print(f"Table summaries: {table_summarizer.stats}")
+
+            if dedup_config["enabled"]:
+                combined_nodes, parent_nodes, dedup_stats = deduplicate_nodes(element_nodes, page_nodes, dedup_config)
+                share_metadata(parent_nodes.values())
+                store.put("parent_nodes", store.key("parent_nodes", nodes_key), parent_nodes)
+                if verbosity:
+                    print(f"Deduplication: {dedup_stats}")
+            else:
+                # Combine nodes
+                combined_nodes = element_nodes + page_nodes
+            # Nodes of a document share their metadata records, so each is pickled once
+            store.put("nodes", nodes_key, share_metadata(combined_nodes))
+        span.set(nodes=len(combined_nodes))
+
+    # Layer 3: embeddings, keyed by the node contents and the embedding model
+    nodes_hash = hash_texts(
+        f"{node.node_id}\0{node.get_content(metadata_mode=MetadataMode.EMBED)}" for node in combined_nodes
+    )
+    embedding_settings = {"embedding_model": embedding_model.model_name}
+    embeddings_key = store.key("embeddings", nodes_hash, embedding_settings)
+    matrix_path = store.path("embeddings", embeddings_key, extension=".npy")
+    # The last embeddings built for this file name, which an incremental ingest copies from
+    manifest_key = store.key("manifests", os.path.basename(file_path), {**nodes_settings, **embedding_settings})
+    with tracer.span("embed", model=embedding_model.model_name, nodes=len(combined_nodes)) as span:
+        embeddings_cached = store.contains("embeddings", embeddings_key, extension=".npy")
+        span.set(cache_hit=embeddings_cached)
+        if not embeddings_cached:
+            if verbosity:
+                print(f"Embedding {len(combined_nodes)} nodes...")
+            if embedding_pipeline is None:
+                embedding_pipeline = EmbeddingPipeline(embedding_model, store)
+            if incremental:
+                manifest = store.get("manifests", manifest_key)
+                previous_matrix_path = None
+                if manifest and os.path.exists(store.path("embeddings", manifest["embeddings_key"], extension=".npy")):
+                    previous_matrix_path = store.path("embeddings", manifest["embeddings_key"], extension=".npy")
+                embeddings, embedding_stats = embed_incrementally(combined_nodes, embedding_pipeline, previous_matrix_path, show_progress=verbosity)
+                if verbosity:
+                    print(f"Incremental embedding: {embedding_stats}")
+                span.set(embeddings_reused=embedding_stats["embeddings_reused"], tokens=0)
+                if embedding_stats["embeddings_recomputed"]:
+                    span.set(tokens=embedding_pipeline.stats["tokens"])
+            else:
+                embeddings = embedding_pipeline.embed(combined_nodes, show_progress=verbosity)
+                span.set(tokens=embedding_pipeline.stats["tokens"], batches_resumed=embedding_pipeline.stats["batches_resumed"])
+            node_ids = [node.node_id for node in combined_nodes]
+            save_embedding_matrix(matrix_path, node_ids, [embeddings[node_id] for node_id in node_ids])
+            embedding_pipeline.discard_checkpoints()
+            if verbosity:
+                print(f"Embedding throughput: {embedding_pipeline.stats}")
+    if incremental:
+        store.put("manifests", manifest_key, {"pdf_hash": pdf_hash, "embeddings_key": embeddings_key})
+    # Lets load_documents find this document's artifacts from the PDF alone, without loading its nodes
+    document_manifest = {"nodes_key": nodes_key, "embeddings_key": embeddings_key}
+    document_key = document_manifest_key(pdf_hash, model, embedding_model, parser_config, incremental, dedup_config)
+    if store.get("documents", document_key) != document_manifest:
+        store.put("documents", document_key, document_manifest)
+
+    if verbosity:
+        print(f"Artifact store: {store.stats()}")
+
+    # The matrix is memory-mapped, so opening the index makes no embedding calls and copies nothing
+    with tracer.span("index_build", kind="matrix", nodes=len(combined_nodes), cache_hit=embeddings_cached):
+        index = EmbeddingMatrixIndex(matrix_path, combined_nodes)
+    index.ann = open_ann_index(store, embeddings_key, index.matrix, ann_config, verbosity)
+    return index, combined_nodes  # Return both index and nodes
+
+def document_manifest_key(pdf_hash, model, embedding_model, parser_config=None, incremental=False, dedup_config=None):
+    """Key of the record pointing from a PDF and the ingest settings to its nodes and embeddings."""
+    settings = {
+        "parser": parser_settings(parser_config),
+        "llm": model.model,
+        "embedding_model": embedding_model.model_name,
+        "incremental": incremental,
+    }
+    dedup_config = dedup_config_with_defaults(dedup_config)
+    if dedup_config["enabled"]:
+        settings["dedup"] = dedup_settings(dedup_config)
+    return get_artifact_store().key("documents", pdf_hash, settings)
+
+def open_parent_pages(file_path, model, embedding_model, parser_config=None, incremental=False, dedup_config=None):
+    """
+    Returns a postprocessor that answers with the pages of the retrieved nodes, or None.
+
+    Only used when deduplication is enabled with "return_parents"; the document
+    must have been ingested with the same settings.
+    """
+    dedup_config = dedup_config_with_defaults(dedup_config)
+    if not (dedup_config["enabled"] and dedup_config["return_parents"]):
+        return None
+    store = get_artifact_store()
+    document_key = document_manifest_key(hash_file(file_path), model, embedding_model, parser_config, incremental, dedup_config)
+    manifest = store.get("documents", document_key)
+    parents = store.get("parent_nodes", store.key("parent_nodes", manifest["nodes_key"]))
+    share_metadata(parents.values())
+    return ParentPagePostprocessor(parents=parents)
+
+def open_document_facts(file_path, parser_config=None, verbosity=False):
+    """
+    Returns the facts of a document's financial tables, for answering lookups without retrieval.
+
+    They are extracted from the parsed markdown (see financial_facts.py), which
+    is only loaded when the facts are not in the artifact store yet.
+    """
+    store = get_artifact_store()
+    parsed_key = store.key("parsed", hash_file(file_path), parser_settings(parser_config))
+    return open_financial_facts(store, parsed_key, lambda: store.get("parsed", parsed_key), verbosity)
+
+def open_lazy_document_index(file_path, model, embedding_model, verbosity=False, parser_config=None, incremental=False, embedding_pipeline=None, ann_config=None, dedup_config=None, table_summarizer=None):
+    """
+    Opens a document's embedding matrix, leaving its nodes in the artifact store until first needed.
+
+    Documents that were never ingested with these settings are ingested first.
+    """
+    store = get_artifact_store()
+    document_key = document_manifest_key(hash_file(file_path), model, embedding_model, parser_config, incremental, dedup_config)
+    manifest = store.get("documents", document_key)
+    if manifest is None or not store.contains("embeddings", manifest["embeddings_key"], extension=".npy"):
+        parse_and_index_single_document(
+            file_path, model, embedding_model, verbosity=verbosity, parser_config=parser_config,
+            incremental=incremental, embedding_pipeline=embedding_pipeline, dedup_config=dedup_config,
+            table_summarizer=table_summarizer,
+        )
+        manifest = store.get("documents", document_key)
+    index = EmbeddingMatrixIndex(
+        store.path("embeddings", manifest["embeddings_key"], extension=".npy"),
+        load_nodes=lambda: share_metadata(store.get("nodes", manifest["nodes_key"])),
+    )
+    index.ann = open_ann_index(store, manifest["embeddings_key"], index.matrix, ann_config, verbosity)
+    return index
+
+def create_query_engine(index, embedding_model, retreival_depth =5, reranker=None, verbosity=True, llm=None, streaming=False, lexical_index=None, rrf_k=60, parent_pages=None):
+    """
+    Creates a query engine on top of an already embedded index.
+
+    The index is an EmbeddingMatrixIndex (or anything with the same
+    ``as_retriever`` interface, such as a VectorStoreIndex), so no document
+    embeddings are computed here. Only the query itself is embedded, with the
+    same model the index was built with. Answers are synthesized with ``llm``,
+    falling back to the llama_index default LLM when it is not given. With
+    ``streaming`` the engine returns answers as token streams. With a BM25
+    ``lexical_index`` over the same rows, dense and lexical results are fused
+    with reciprocal rank fusion (see bm25_index.py). ``parent_pages`` (see
+    open_parent_pages) replaces the final nodes with their pages.
+    """
+    if lexical_index is not None:
+        retriever = HybridRetriever(
+            index, lexical_index, embedding_model, similarity_top_k=retreival_depth, rrf_k=rrf_k, verbose=verbosity
+        )
+    else:
+        retriever = index.as_retriever(
+            embed_model=embedding_model,
+            similarity_top_k=retreival_depth,
+            verbose=verbosity,
+        )
+    node_postprocessors = [postprocessor for postprocessor in [reranker, parent_pages] if postprocessor]
+    if not node_postprocessors:
+        return RetrieverQueryEngine.from_args(
+            retriever,
+            llm=llm,
+            #response_mode="tree_summarize",
+            streaming=streaming,
+            verbose=verbosity,
+        )
+
+    # Apply the recursive query engine with reranker
+    return RetrieverQueryEngine.from_args(
+        retriever,
+        llm=llm,
+        node_postprocessors=node_postprocessors,
+        streaming=streaming,
+        verbose=verbosity,
+    )
+
+# --- Query Engines ---
+def load(document_choice, retreival_depth, verbose, config=None, streaming=False):
+    """
+    Main function for running the query pipeline.
+    
+    Arguments:
+        document_choice (str): Path to the document.
+        query (str): Query string.
+        retreival_depth (int): Depth for document retrieval.
+        verbose (bool): Verbose mode.
+        config (dict): Model configuration, read from config.json when not given.
+        streaming (bool): Build engines that stream their answers (see run_query's stream mode).
+    """
+    
+    #nest_asyncio.apply()
+
+    # Load configuration and initialize models
+    if config is None:
+        config = load_config("config.json")
+    configure_tracing(config)
+    if not uses_stub_models(config):
+        initialize_keys()
+    llm_choice = initialize_llm(config)
+    embedding_model = initialize_embedding_model(config)
+    
+    print(f"LLM: {llm_choice.model}")
+    print(f"Embedding Model: {embedding_model.model_name}")
+
+    if not document_choice:
+        sys.exit("No document path provided. Please add paths to your documents.")
+    engine = build_document_engine(document_choice, llm_choice, embedding_model, config, retreival_depth, verbose, streaming)
+    document_name = engine["document_name"]
+    if engine["financial_facts"] is not None:
+        get_financial_facts()[document_name] = engine["financial_facts"]
+    print(f"Query engine made for {document_name} document")
+    return {document_name: engine["query_engine"]}
+
+def build_document_engine(document_choice, llm, embedding_model, config, retreival_depth=5, verbosity=False, streaming=False):
+    """
+    Ingests a document (or opens its cached artifacts) and builds its query engine.
+
+    Returns:
+        dict: The engine and what it was built from: "document_name", "llm",
+            "embedding_model", "index", "query_engine" and "financial_facts"
+            (None unless enabled in the config).
+    """
+    document_name = os.path.splitext(os.path.basename(document_choice))[0]
+    incremental = config.get("ingest", {}).get("incremental", False)
+    retrieval_config = config.get("retrieval") or {}
+    # Every ingest stage, cached or not, is traced as a child of the document's span
+    with get_tracer().span("ingest", document=document_name, llm=llm.model, embedding_model=embedding_model.model_name):
+        document_index, _ = parse_and_index_single_document(
+            document_choice, llm, embedding_model, verbosity=verbosity,
+            parser_config=config.get("parser"), incremental=incremental,
+            embedding_pipeline=EmbeddingPipeline.from_config(embedding_model, get_artifact_store(), config),
+            ann_config=config.get("ann"), dedup_config=config.get("dedup"),
+            table_summarizer=TableSummarizer.from_config(llm, get_artifact_store(), config),
+        )
+        parent_pages = open_parent_pages(
+            document_choice, llm, embedding_model, config.get("parser"), incremental, config.get("dedup")
+        )
+        financial_facts = None
+        if (config.get("financial_facts") or {}).get("enabled", False):
+            financial_facts = open_document_facts(document_choice, config.get("parser"), verbosity)
+
+        lexical_index = None
+        if retrieval_config.get("mode", "dense") == "hybrid":
+            lexical_index = open_lexical_index(get_artifact_store(), document_index, verbosity=verbosity)
+
+    # With a reranker, the retriever fetches a wider candidate set for it to narrow down
+    reranker, candidates = initialize_reranker(config, retreival_depth)
+
+    query_engine = create_query_engine(
+        document_index, embedding_model, retreival_depth=candidates, reranker=reranker, verbosity=verbosity, llm=llm,
+        streaming=streaming, lexical_index=lexical_index, rrf_k=retrieval_config.get("rrf_k", 60), parent_pages=parent_pages,
+    )
+    return {
+        "document_name": document_name, "llm": llm, "embedding_model": embedding_model, "index": document_index,
+        "query_engine": query_engine, "financial_facts": financial_facts,
+    }
+
+def create_multi_document_engine(document_choices, llm, embedding_model, config, retreival_depth=5, verbosity=False, streaming=False, document_filter=None):
+    """Builds a query engine over a MultiDocumentIndex of the documents, ingesting any that are not cached."""
+    embedding_pipeline = EmbeddingPipeline.from_config(embedding_model, get_artifact_store(), config)
+    table_summarizer = TableSummarizer.from_config(llm, get_artifact_store(), config)
+    documents = {}
+    for document_choice in document_choices:
+        document_name = os.path.splitext(os.path.basename(document_choice))[0]
+        documents[document_name] = open_lazy_document_index(
+            document_choice, llm, embedding_model, verbosity=verbosity,
+            parser_config=config.get("parser"), incremental=config.get("ingest", {}).get("incremental", False),
+            embedding_pipeline=embedding_pipeline, ann_config=None, dedup_config=config.get("dedup"),
+            table_summarizer=table_summarizer,
+        )
+    # Whether to search approximately depends on the size of the whole corpus
+    corpus_nodes = sum(len(document.matrix) for document in documents.values())
+    for document in documents.values():
+        document.ann = open_ann_index(
+            get_artifact_store(), document.artifact_key, document.matrix, config.get("ann"), verbosity, corpus_nodes
+        )
+    index = MultiDocumentIndex(
+        documents,
+        max_routed_documents=config.get("multi_document", {}).get("max_routed_documents", DEFAULT_MAX_ROUTED_DOCUMENTS),
+    )
+
+    reranker, candidates = initialize_reranker(config, retreival_depth)
+    retriever = index.as_retriever(
+        embed_model=embedding_model, similarity_top_k=candidates, document_filter=document_filter, verbose=verbosity
+    )
+    return RetrieverQueryEngine.from_args(
+        retriever, llm=llm, node_postprocessors=[reranker] if reranker else None, streaming=streaming, verbose=verbosity
+    )
+
+# Name under which load_documents returns its single multi-document engine
+ALL_DOCUMENTS = "all_documents"
+
+def load_documents(document_choices, retreival_depth, verbose, config=None, streaming=False, document_filter=None):
+    """
+    Loads many documents behind one query engine that routes each query to the relevant filings.
+
+    Arguments:
+        document_choices (list): Paths to the documents.
+        retreival_depth (int): Depth for document retrieval.
+        verbose (bool): Verbose mode.
+        config (dict): Model configuration, read from config.json when not given.
+        streaming (bool): Build an engine that streams its answers.
+        document_filter (list): Only retrieve from these documents (names without extension)
+            instead of routing each query.
+
+    Returns:
+        dict: {ALL_DOCUMENTS: query engine}, to be used with run_query like load's result.
+    """
+    if config is None:
+        config = load_config("config.json")
+    configure_tracing(config)
+    if not uses_stub_models(config):
+        initialize_keys()
+    llm_choice = initialize_llm(config)
+    embedding_model = initialize_embedding_model(config)
+
+    query_engine = create_multi_document_engine(
+        document_choices, llm_choice, embedding_model, config, retreival_depth,
+        verbosity=verbose, streaming=streaming, document_filter=document_filter,
+    )
+    print(f"Query engine made for {len(document_choices)} documents")
+    return {ALL_DOCUMENTS: query_engine}
+
+def run_query(query, query_engine, document_name, retrieval_depth, verbose=False, timings=None, stream=False, answer_cache=None, financial_facts=None):
+    """
+    Execute a query using the provided query engine and return the result.
+
+    Parameters:
+        query (str): The query to execute.
+        query_engine (object): The query engine to process the query.
+        document_name(str): The name of the document.
+        retrieval_depth (int): The number of retrieval chunks to include in the context.
+        verbose (bool): Whether to print verbose output.
+        timings (dict): Optional dict that receives the retrieval, synthesis and total latency in seconds.
+        stream (bool): Stream the answer. Requires an engine built with streaming=True.
+        answer_cache (SemanticAnswerCache): Optional cache answering questions similar to ones
+            already asked of the same document, LLM, embedding model, depth and retrieval
+            settings without retrieval or synthesis. Its lookup time, including the query
+            embedding that retrieval then reuses, is recorded as "cache_lookup".
+        financial_facts (dict): Optional FinancialFacts by document name (see get_financial_facts).
+            Questions asking for one figure of the document's financial tables are
+            answered from them before any other step. The lookup time is recorded as "table_lookup".
+
+    Returns:
+        tuple: A tuple containing the response answer (str) and retrieval context (list).
+            In stream mode the answer is a generator of text tokens; the timings
+            (including time to first token) are filled in once it is exhausted.
+    """
+    if not query:
+        raise ValueError("Please enter a query to proceed.")
+
+    # Retrieval, reranking and synthesis are traced as children of the query's span
+    with get_tracer().span("query", document=document_name, stream=stream) as query_span:
+        if query_span.recording:
+            query_span.set(query_tokens=count_tokens(query))
+        return answer_query(query, query_engine, document_name, retrieval_depth, verbose, timings, stream, answer_cache, financial_facts, query_span)
+
+def answer_query(query, query_engine, document_name, retrieval_depth, verbose, timings, stream, answer_cache, financial_facts, query_span):
+    """run_query's pipeline. In stream mode, ``query_span`` is detached and ended with the stream."""
+    engine = query_engine[document_name]
+    query_bundle = QueryBundle(query)
+
+    start_time = time.time()
+    facts = (financial_facts or {}).get(document_name)
+    if facts is not None:
+        fact = facts.lookup(query)
+        query_span.set(table_lookup_hit=fact is not None)
+        if fact is not None:
+            return table_answer(query, fact, start_time, verbose, timings, stream)
+        table_lookup_time = time.time() - start_time
+    if answer_cache is not None:
+        # The query embedding is needed for the lookup, and reused by retrieval on a miss
+        lookup_start_time = time.time()
+        query_bundle.embedding = engine.retriever.embed_model.get_query_embedding(query)
+        scope = answer_scope(engine, document_name, retrieval_depth)
+        cached = answer_cache.lookup(scope, query, query_bundle.embedding)
+        query_span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached_answer(query, cached, start_time, verbose, timings, stream)
+        lookup_time = time.time() - lookup_start_time
+
+    # Retrieval and synthesis are run as separate steps so each can be timed; the
+    # lookups above are timed on their own
+    tracer = get_tracer()
+    retrieval_start_time = time.time()
+    with tracer.span("retrieve", top_k=getattr(engine.retriever, "similarity_top_k", None)) as span:
+        nodes = engine.retrieve(query_bundle)
+        span.set(nodes=len(nodes))
+    retrieval_time = time.time() - retrieval_start_time
+    # Reranking happens inside retrieval and is also reported on its own
+    rerank_seconds = rerank_time(engine)
+    if timings is not None and rerank_seconds:
+        timings["rerank"] = rerank_seconds
+    if verbose and rerank_seconds:
+        print(f"Rerank Time: {round(rerank_seconds, 2)}s")
+    synthesis_start_time = time.time()
+    with tracer.span("synthesize") as synthesize_span:
+        response = engine.synthesize(query_bundle, nodes)
+        if synthesize_span.recording:
+            synthesize_span.set(prompt_tokens=prompt_tokens(query, nodes))
+        if stream and hasattr(response, "response_gen"):
+            # Generation happens as the stream is consumed, which ends both spans
+            synthesize_span.detach()
+            query_span.detach()
+        elif synthesize_span.recording:
+            synthesize_span.set(completion_tokens=count_tokens(response.response or ""))
+
+    retrieval_context = [node.get_content() for node in response.source_nodes[:retrieval_depth]]
+
+    if stream:
+        if not hasattr(response, "response_gen"):
+            raise ValueError("Streaming requires a query engine created with streaming=True.")
+        tokens = stream_tokens(
+            response.response_gen, start_time, retrieval_time, synthesis_start_time, verbose, timings, spans=(synthesize_span, query_span)
+        )
+        if facts is not None and timings is not None:
+            timings["table_lookup"] = table_lookup_time
+        if answer_cache is not None:
+            if timings is not None:
+                timings["cache_lookup"] = lookup_time
+            tokens = cache_streamed_answer(tokens, answer_cache, scope, query, query_bundle.embedding, retrieval_context)
+        return (tokens, retrieval_context)
+
+    synthesis_time = time.time() - synthesis_start_time
+    total_time = time.time() - start_time
+
+    if timings is not None:
+        if facts is not None:
+            timings["table_lookup"] = table_lookup_time
+        if answer_cache is not None:
+            timings["cache_lookup"] = lookup_time
+        timings["retrieval"] = retrieval_time
+        timings["synthesis"] = synthesis_time
+        timings["total"] = total_time
+    if answer_cache is not None:
+        answer_cache.put(scope, query, query_bundle.embedding, response.response, retrieval_context)
+
+    if verbose:
+        print(f"Query: {query}\n\nResponse: {response.response}")
+        print(f"Retrieval Time: {round(retrieval_time, 2)}s")
+        print(f"Synthesis Time: {round(synthesis_time, 2)}s")
+        print(f"Elapsed Time: {round(total_time, 2)}s")
+
+    return (response.response, retrieval_context)
+
+def cached_answer(query, cached, start_time, verbose=False, timings=None, stream=False):
+    """
+    Returns a cached (answer, retrieval context) in run_query's format, as one token when streaming.
+
+    The timings of a cached answer have no retrieval or synthesis stage.
+    """
+    answer, retrieval_context = cached
+    total_time = time.time() - start_time
+    if timings is not None:
+        timings["cache_lookup"] = total_time
+        timings["total"] = total_time
+    if stream:
+        if timings is not None:
+            timings["time_to_first_token"] = total_time
+        return (iter([answer]), retrieval_context)
+
+    if verbose:
+        print(f"Query: {query}\n\nResponse (cached): {answer}")
+        print(f"Elapsed Time: {round(total_time, 2)}s")
+    return (answer, retrieval_context)
+
+def table_answer(query, fact, start_time, verbose=False, timings=None, stream=False):
+    """
+    Returns the answer to a lookup question from a financial fact in run_query's format.
+
+    The retrieval context is the table row the fact comes from.
+    """
+    answer, retrieval_context = fact_answer(fact), [fact_context(fact)]
+    total_time = time.time() - start_time
+    if timings is not None:
+        timings["table_lookup"] = total_time
+        timings["total"] = total_time
+    if stream:
+        if timings is not None:
+            timings["time_to_first_token"] = total_time
+        return (iter([answer]), retrieval_context)
+
+    if verbose:
+        print(f"Query: {query}\n\nResponse (table lookup): {answer}")
+        print(f"Elapsed Time: {round(total_time, 2)}s")
+    return (answer, retrieval_context)
+
+def prompt_tokens(query, nodes):
+    """Estimated tokens of a synthesis prompt: the query and the retrieved text, without the template."""
+    return count_tokens(query) + sum(count_tokens(node.get_content()) for node in nodes)
+
+def cache_streamed_answer(tokens, answer_cache, scope, query, query_embedding, retrieval_context):
+    """Passes streamed tokens through, caching the full answer once the stream completes."""
+    answer = ""
+    for token in tokens:
+        answer += token
+        yield token
+    answer_cache.put(scope, query, query_embedding, answer, retrieval_context)
+
+def stream_tokens(response_gen, start_time, retrieval_time, synthesis_start_time, verbose=False, timings=None, spans=()):
+    """
+    Yields the tokens of a streaming response, recording time to first token, synthesis and total time.
+
+    ``spans`` (the synthesize span, then the query span) are ended with the stream,
+    the first with the answer's token count and time to first token. A stream its
+    client abandons (closed or garbage collected) ends them with ``aborted=True``.
+    """
+    first_token_time = None
+    answer = ""
+    completed = False
+    try:
+        for token in response_gen:
+            if first_token_time is None:
+                first_token_time = time.time() - start_time
+            answer += token
+            yield token
+        completed = True
+    except Exception as e:
+        for span in spans:
+            span.end(error=e)
+        raise
+    finally:
+        if not completed:
+            # Spans ended by an error above are left as they are
+            for span in spans:
+                span.end(aborted=True)
+    synthesis_time = time.time() - synthesis_start_time
+    total_time = time.time() - start_time
+    if first_token_time is None:
+        first_token_time = total_time
+    if spans and spans[0].recording:
+        spans[0].set(completion_tokens=count_tokens(answer), time_to_first_token_ms=round(first_token_time * 1000, 3))
+    for span in spans:
+        span.end()
+
+    if timings is not None:
+        timings["retrieval"] = retrieval_time
+        timings["time_to_first_token"] = first_token_time
+        timings["synthesis"] = synthesis_time
+        timings["total"] = total_time
+
+    if verbose:
+        print(f"\nRetrieval Time: {round(retrieval_time, 2)}s")
+        print(f"Time To First Token: {round(first_token_time, 2)}s")
+        print(f"Synthesis Time: {round(synthesis_time, 2)}s")
+        print(f"Elapsed Time: {round(total_time, 2)}s")
+
+async def arun_query(query, query_engine, document_name, retrieval_depth, verbose=False, timings=None, answer_cache=None, financial_facts=None):
+    """
+    Async version of run_query, using the engine's async retrieval and synthesis paths.
+
+    Takes the same parameters and returns the same (answer, retrieval context) tuple.
+    """
+    if not query:
+        raise ValueError("Please enter a query to proceed.")
+
+    with get_tracer().span("query", document=document_name, stream=False) as query_span:
+        if query_span.recording:
+            query_span.set(query_tokens=count_tokens(query))
+        return await aanswer_query(query, query_engine, document_name, retrieval_depth, verbose, timings, answer_cache, financial_facts, query_span)
+
+async def aanswer_query(query, query_engine, document_name, retrieval_depth, verbose, timings, answer_cache, financial_facts, query_span):
+    """arun_query's pipeline, the async counterpart of answer_query."""
+    engine = query_engine[document_name]
+    query_bundle = QueryBundle(query)
+
+    start_time = time.time()
+    facts = (financial_facts or {}).get(document_name)
+    if facts is not None:
+        fact = facts.lookup(query)
+        query_span.set(table_lookup_hit=fact is not None)
+        if fact is not None:
+            return table_answer(query, fact, start_time, verbose, timings)
+        table_lookup_time = time.time() - start_time
+    if answer_cache is not None:
+        lookup_start_time = time.time()
+        query_bundle.embedding = await engine.retriever.embed_model.aget_query_embedding(query)
+        scope = answer_scope(engine, document_name, retrieval_depth)
+        cached = answer_cache.lookup(scope, query, query_bundle.embedding)
+        query_span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached_answer(query, cached, start_time, verbose, timings)
+        lookup_time = time.time() - lookup_start_time
+
+    tracer = get_tracer()
+    retrieval_start_time = time.time()
+    with tracer.span("retrieve", top_k=getattr(engine.retriever, "similarity_top_k", None)) as span:
+        nodes = await engine.aretrieve(query_bundle)
+        span.set(nodes=len(nodes))
+    retrieval_time = time.time() - retrieval_start_time
+    rerank_seconds = rerank_time(engine)
+    synthesis_start_time = time.time()
+    with tracer.span("synthesize") as span:
+        response = await engine.asynthesize(query_bundle, nodes)
+        if span.recording:
+            span.set(prompt_tokens=prompt_tokens(query, nodes), completion_tokens=count_tokens(response.response or ""))
+    synthesis_time = time.time() - synthesis_start_time
+    total_time = time.time() - start_time
+    retrieval_context = [node.get_content() for node in response.source_nodes[:retrieval_depth]]
+
+    if timings is not None:
+        if facts is not None:
+            timings["table_lookup"] = table_lookup_time
+        if answer_cache is not None:
+            timings["cache_lookup"] = lookup_time
+        if rerank_seconds:
+            timings["rerank"] = rerank_seconds
+        timings["retrieval"] = retrieval_time
+        timings["synthesis"] = synthesis_time
+        timings["total"] = total_time
+    if answer_cache is not None:
+        answer_cache.put(scope, query, query_bundle.embedding, response.response, retrieval_context)
+
+    if verbose:
+        print(f"Query: {query}\n\nResponse: {response.response}")
+        print(f"Elapsed Time: {round(total_time, 2)}s")
+
+    return (response.response, retrieval_context)
+
+# --- Batch Queries ---
+def read_queries_file(queries_file):
+    """
+    Reads (query id, query) pairs from a file of questions.
+
+    Accepts JSONL, one {"query": ..., "id": ...} object per line (the id is
+    optional), or a test_data_*.pkl file as written by make_data.py.
+    """
+    if queries_file.endswith(".pkl"):
+        with open(queries_file, "rb") as f:
+            return [(query_id, content["query"]) for query_id, content in pickle.load(f).items()]
+    queries = []
+    with open(queries_file, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                queries.append((record.get("id", str(line_number)), record["query"]))
+    return queries
+
+def embed_queries(embedding_model, queries):
+    """
+    Embeds many queries at once.
+
+    Models whose query and document embeddings are the same go through a single
+    batched call. Others (e.g. Gemini, which embeds queries with a different task
+    type) get their query embeddings requested concurrently.
+    """
+    # By class name, so checking does not import the OpenAI SDK
+    if type(getattr(embedding_model, "inner", embedding_model)).__name__ in ("OpenAIEmbedding", "StubEmbedding"):
+        return embedding_model.get_text_embedding_batch(queries)
+
+    async def embed_all():
+        return await asyncio.gather(*(embedding_model.aget_query_embedding(query) for query in queries))
+
+    return asyncio.run(embed_all())
+
+def run_batch_queries(queries, query_engine, document_name, retrieval_depth, output_file, workers=4, verbose=False):
+    """
+    Answers a list of (query id, query) pairs against one document.
+
+    All queries are embedded together and retrieved with one matrix operation,
+    then answers are synthesized by a pool of workers. Each answer is appended
+    to the JSONL output file as soon as it completes.
+
+    Returns:
+        dict: Timings for the embedding, retrieval and synthesis stages, in seconds.
+    """
+    engine = query_engine[document_name]
+    retriever = engine.retriever
+    query_texts = [query for _, query in queries]
+    timings = {}
+
+    start_time = time.time()
+    if isinstance(retriever, EmbeddingMatrixRetriever):
+        query_embeddings = embed_queries(retriever.embed_model, query_texts)
+        timings["embedding"] = time.time() - start_time
+
+        start_time = time.time()
+        positions, scores = retriever.index.top_k_batch(query_embeddings, retriever.similarity_top_k)
+        retrieved = [
+            [NodeWithScore(node=retriever.index.nodes[position], score=float(score)) for position, score in zip(row_positions, row_scores)]
+            for row_positions, row_scores in zip(positions, scores)
+        ]
+        bundles = [QueryBundle(query, embedding=embedding) for query, embedding in zip(query_texts, query_embeddings)]
+        # engine.retrieve would apply the rerankers, so apply them to the batched results too
+        for postprocessor in engine._node_postprocessors:
+            retrieved = [postprocessor.postprocess_nodes(nodes, query_bundle=bundle) for nodes, bundle in zip(retrieved, bundles)]
+    else:
+        # Other retrievers (hybrid, multi-document) are queried one at a time
+        bundles = [QueryBundle(query) for query in query_texts]
+        retrieved = [engine.retrieve(bundle) for bundle in bundles]
+    timings["retrieval"] = time.time() - start_time
+
+    def answer(i):
+        response = engine.synthesize(bundles[i], retrieved[i])
+        return i, response
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(answer, i) for i in range(len(queries))]
+        for future in as_completed(futures):
+            i, response = future.result()
+            query_id, query = queries[i]
+            append_result({
+                "id": query_id,
+                "query": query,
+                "response": response.response,
+                "retrieval_context": [node.get_content() for node in response.source_nodes[:retrieval_depth]],
+            }, output_file)
+            if verbose:
+                print(f"Answered query id: {query_id}")
+    timings["synthesis"] = time.time() - start_time
+
+    if verbose:
+        print(f"Answered {len(queries)} queries into {output_file}")
+        for stage, seconds in timings.items():
+            print(f"{stage.capitalize()} Time: {round(seconds, 2)}s")
+    return timings
+
+# --- Metrics ---
+class LatencyMetrics:
+    """Thread-safe record of per-stage query latencies."""
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, timings):
+        """Adds one query's stage timings (in seconds)."""
+        with self.lock:
+            self.requests += 1
+            for stage, seconds in timings.items():
+                stage_samples = self.samples.setdefault(stage, [])
+                stage_samples.append(seconds)
+                if len(stage_samples) > self.max_samples:
+                    del stage_samples[: len(stage_samples) - self.max_samples]
+
+    def record_error(self):
+        """Counts a failed request."""
+        with self.lock:
+            self.errors += 1
+
+    def report(self):
+        """Returns request counts and count/mean/p50/p95/p99/max latency in milliseconds per stage."""
+        with self.lock:
+            stages = {}
+            for stage, stage_samples in self.samples.items():
+                ordered = sorted(stage_samples)
+                stages[stage] = {
+                    "count": len(ordered),
+                    "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+                    "p50_ms": round(1000 * percentile(ordered, 50), 2),
+                    "p95_ms": round(1000 * percentile(ordered, 95), 2),
+                    "p99_ms": round(1000 * percentile(ordered, 99), 2),
+                    "max_ms": round(1000 * ordered[-1], 2),
+                }
+            return {"requests": self.requests, "errors": self.errors, "stages": stages}
+
+# --- Backend ---
+# Model clients and query engines are cached per process, across queries, reruns and sessions
+MAX_CACHED_MODELS = 4
+MAX_CACHED_ENGINES = 8
+ENGINE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+def estimate_engine_bytes(entry):
+    """Estimates the memory held by a cached query engine: its embedding matrix plus node text."""
+    index = entry["index"]
+    if hasattr(index, "documents"):
+        # Multi-document engines load node text lazily, only their matrices count up front
+        return sum(document.matrix.nbytes for document in index.documents.values())
+    return index.matrix.nbytes + sum(len(node.get_content()) for node in index.nodes)
+
+def model_cache_key(config):
+    """Key of cached model clients: (LLM, embedding model)."""
+    return (json.dumps(config["llm"], sort_keys=True), json.dumps(config["embedding_model"], sort_keys=True))
+
+def engine_cache_key(document_path, config, retrieval_depth, streaming=False):
+    """Key of a cached query engine: (document, LLM, embedding model, retrieval depth, streaming)."""
+    return (os.path.abspath(document_path), *model_cache_key(config), retrieval_depth, streaming)
+
+def multi_document_engine_cache_key(document_paths, config, retrieval_depth, streaming=False, document_filter=None):
+    """Key of a cached multi-document engine: (ALL_DOCUMENTS, documents, LLM, embedding model, retrieval depth, streaming, filter)."""
+    documents = ",".join(sorted(os.path.abspath(document_path) for document_path in document_paths))
+    document_filter = ",".join(sorted(document_filter)) if document_filter else None
+    return (ALL_DOCUMENTS, *engine_cache_key(documents, config, retrieval_depth, streaming), document_filter)
+
+class Backend:
+    """
+    The query pipeline shared by the CLI, the Streamlit UI, the evaluator and the query service.
+
+    A Backend keeps model clients and query engines warm in size-bounded LRU
+    caches, keyed by document and config, and answers queries through them,
+    blocking, streamed or async. Queries go through the financial facts and the
+    semantic answer cache first, and every query's stage latencies are recorded
+    in ``metrics``. ``stats`` reports them with the hit rates of every cache.
+
+    ``documents`` is a document path, or a list of paths to ask across with one
+    engine that routes each query to the relevant filings. ``config`` defaults to
+    the backend's own; engines are built on first use, or up front with ``engine``.
+    Engines of different configs share one answer cache, as answers are scoped per
+    document, LLM, embedding model and retrieval depth.
+    """
+
+    def __init__(self, config=None, retrieval_depth=5, verbose=False, max_cached_models=MAX_CACHED_MODELS,
+                 max_cached_engines=MAX_CACHED_ENGINES, engine_cache_max_bytes=ENGINE_CACHE_MAX_BYTES):
+        self.config = config if config is not None else load_config("config.json")
+        configure_tracing(self.config)
+        self.retrieval_depth = retrieval_depth
+        self.verbose = verbose
+        self.models = ResourceCache(max_entries=max_cached_models)
+        self.engines = ResourceCache(
+            max_entries=max_cached_engines, max_bytes=engine_cache_max_bytes, sizeof=estimate_engine_bytes
+        )
+        self.answer_cache = SemanticAnswerCache.from_config(self.config)
+        self.metrics = LatencyMetrics()
+
+    # --- Engine lifecycle ---
+    def get_models(self, config=None):
+        """Returns the (LLM, embedding model) clients for a config, initializing them once."""
+        config = self.config if config is None else config
+
+        def build():
+            if not uses_stub_models(config):
+                initialize_keys()
+            return initialize_llm(config), initialize_embedding_model(config)
+
+        return self.models.get_or_create(model_cache_key(config), build)
+
+    def engine_key(self, documents, config=None, retrieval_depth=None, streaming=False, document_filter=None):
+        """Key of the engine ``engine`` returns for the same arguments."""
+        config = self.config if config is None else config
+        retrieval_depth = retrieval_depth or self.retrieval_depth
+        if isinstance(documents, (list, tuple)):
+            return multi_document_engine_cache_key(documents, config, retrieval_depth, streaming, document_filter)
+        return engine_cache_key(documents, config, retrieval_depth, streaming)
+
+    def engine(self, documents, config=None, retrieval_depth=None, streaming=False, document_filter=None, verbose=None):
+        """
+        Returns a warm engine for the documents and models, building it on first use.
+
+        Returns:
+            dict: "document_name" (ALL_DOCUMENTS for a list of documents), "llm",
+                "embedding_model", "index", "query_engine" and "financial_facts".
+        """
+        config = self.config if config is None else config
+        retrieval_depth = retrieval_depth or self.retrieval_depth
+        verbose = self.verbose if verbose is None else verbose
+
+        def build():
+            llm, embedding_model = self.get_models(config)
+            if not isinstance(documents, (list, tuple)):
+                return build_document_engine(documents, llm, embedding_model, config, retrieval_depth, verbose, streaming)
+            query_engine = create_multi_document_engine(
+                documents, llm, embedding_model, config, retrieval_depth,
+                verbosity=verbose, streaming=streaming, document_filter=document_filter,
+            )
+            return {
+                "document_name": ALL_DOCUMENTS, "llm": llm, "embedding_model": embedding_model,
+                "index": query_engine.retriever.index, "query_engine": query_engine, "financial_facts": None,
+            }
+
+        key = self.engine_key(documents, config, retrieval_depth, streaming, document_filter)
+        return self.engines.get_or_create(key, build)
+
+    def evict(self, documents=None, config=None, retrieval_depth=None, streaming=False, document_filter=None):
+        """Drops one engine, or every engine and model client when documents is None."""
+        if documents is None:
+            self.engines.evict()
+            self.models.evict()
+        else:
+            self.engines.evict(self.engine_key(documents, config, retrieval_depth, streaming, document_filter))
+
+    # --- Queries ---
+    def query(self, query, documents, config=None, retrieval_depth=None, stream=False, document_filter=None, verbose=None):
+        """
+        Answers a query with run_query and records its stage latencies.
+
+        Returns:
+            dict: "response", "retrieval_context", "timings" (see run_query), the
+                "engine" that answered and, for several documents, the "documents"
+                retrieved from (None when no retrieval was needed). With stream, the
+                response is a generator of text tokens and the timings are filled in
+                once it is exhausted.
+        """
+        retrieval_depth = retrieval_depth or self.retrieval_depth
+        verbose = self.verbose if verbose is None else verbose
+        timings = {}
+        try:
+            engine = self.engine(documents, config, retrieval_depth, stream, document_filter)
+            document_name = engine["document_name"]
+            routed_documents.set(None)
+            answer, retrieval_context = run_query(
+                query, {document_name: engine["query_engine"]}, document_name, retrieval_depth, verbose=verbose,
+                timings=timings, stream=stream, answer_cache=self.answer_cache,
+                financial_facts={document_name: engine["financial_facts"]},
+            )
+        except Exception:
+            self.metrics.record_error()
+            raise
+        if stream:
+            answer = self.record_stream(answer, timings)
+        else:
+            self.metrics.record(timings)
+        return {
+            "response": answer, "retrieval_context": retrieval_context, "timings": timings, "engine": engine,
+            "documents": routed_documents.get(),
+        }
+
+    def record_stream(self, tokens, timings):
+        """Passes streamed tokens through, recording the query's timings once the stream completes."""
+        try:
+            yield from tokens
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self.metrics.record(timings)
+
+    async def aquery(self, query, documents, config=None, retrieval_depth=None, verbose=None):
+        """
+        Async version of query, with arun_query. The engine should already be warm:
+        building one blocks the event loop.
+        """
+        retrieval_depth = retrieval_depth or self.retrieval_depth
+        verbose = self.verbose if verbose is None else verbose
+        timings = {}
+        try:
+            engine = self.engine(documents, config, retrieval_depth)
+            document_name = engine["document_name"]
+            routed_documents.set(None)
+            answer, retrieval_context = await arun_query(
+                query, {document_name: engine["query_engine"]}, document_name, retrieval_depth, verbose=verbose,
+                timings=timings, answer_cache=self.answer_cache, financial_facts={document_name: engine["financial_facts"]},
+            )
+        except Exception:
+            self.metrics.record_error()
+            raise
+        self.metrics.record(timings)
+        return {
+            "response": answer, "retrieval_context": retrieval_context, "timings": timings, "engine": engine,
+            "documents": routed_documents.get(),
+        }
+
+    def batch_query(self, queries, documents, output_file, config=None, retrieval_depth=None, workers=4, document_filter=None, verbose=None):
+        """Answers (query id, query) pairs with run_batch_queries, appending each answer to a JSONL file."""
+        retrieval_depth = retrieval_depth or self.retrieval_depth
+        verbose = self.verbose if verbose is None else verbose
+        engine = self.engine(documents, config, retrieval_depth, document_filter=document_filter)
+        document_name = engine["document_name"]
+        return run_batch_queries(
+            queries, {document_name: engine["query_engine"]}, document_name, retrieval_depth, output_file,
+            workers=workers, verbose=verbose,
+        )
+
+    # --- Stats ---
+    def stats(self):
+        """Returns query counts and per-stage latency percentiles, with the hit rates of every cache."""
+        return {
+            **self.metrics.report(),
+            "engines": self.engines.stats(),
+            "models": self.models.stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "embedding_cache": get_embedding_cache().stats(),
+            "artifact_store": get_artifact_store().stats(),
+        }
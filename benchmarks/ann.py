@@ -0,0 +1,75 @@
+import os
+import sys
+import argparse
+import tempfile
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import HnswIndex, DEFAULT_ANN_CONFIG
+from embedding_matrix import EmbeddingMatrixIndex, normalize_rows, save_embedding_matrix
+
+def synthetic_embeddings(rng, num_nodes, dim, latent_dim=32):
+    """
+    Random embeddings with low intrinsic dimension, like real text embeddings.
+
+    Isotropic noise in every dimension would make all points nearly equidistant,
+    which no ANN index (and no real embedding model) has to deal with.
+    """
+    projection = np.random.default_rng(1).standard_normal((latent_dim, dim)).astype(np.float32)
+    embeddings = np.empty((num_nodes, dim), dtype=np.float32)
+    for start in range(0, num_nodes, 100000):
+        stop = min(start + 100000, num_nodes)
+        latent = rng.standard_normal((stop - start, latent_dim)).astype(np.float32)
+        embeddings[start:stop] = latent @ projection + 0.1 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+    return embeddings
+
+def benchmark(num_nodes, dim, num_queries, top_k, M, ef_construction, ef_search):
+    """Compares HNSW against exact search on the memory-mapped matrix: build time, recall@k and query latency."""
+    rng = np.random.default_rng(0)
+    embeddings = synthetic_embeddings(rng, num_nodes, dim)
+    queries = normalize_rows(synthetic_embeddings(rng, num_queries, dim))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        matrix_path = os.path.join(tmp_dir, "embeddings.npy")
+        save_embedding_matrix(matrix_path, [str(i) for i in range(num_nodes)], embeddings)
+        del embeddings
+        index = EmbeddingMatrixIndex(matrix_path, load_nodes=list)
+
+        start_time = time.time()
+        exact = [set(index.top_k(query, top_k)[0].tolist()) for query in queries]
+        exact_query = (time.time() - start_time) / num_queries
+
+        start_time = time.time()
+        ann = HnswIndex.build(index.matrix, M=M, ef_construction=ef_construction, ef_search=ef_search)
+        build_time = time.time() - start_time
+
+        start_time = time.time()
+        approximate = [set(ann.query(query[None, :], top_k)[0][0].tolist()) for query in queries]
+        ann_query = (time.time() - start_time) / num_queries
+
+    recall = np.mean([len(found & truth) / len(truth) for found, truth in zip(approximate, exact)])
+    print(f"{num_nodes} nodes x {dim} dims, top-{top_k}")
+    print(f"  exact: {exact_query * 1000:.2f}ms/query")
+    print(f"  hnsw (M={M}, ef_construction={ef_construction}, ef_search={ef_search}): "
+          f"build {build_time:.1f}s, {ann_query * 1000:.3f}ms/query, recall@{top_k} {recall:.3f}")
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/ann.py --num_nodes 10000 100000 1000000 --dim 256
+    #
+    parser = argparse.ArgumentParser(
+        description="Benchmark recall@k and query latency of the HNSW index against exact search."
+    )
+    parser.add_argument("--num_nodes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--num_queries", type=int, default=200)
+    parser.add_argument("--top_k", type=int, default=5)
+    parser.add_argument("--M", type=int, default=DEFAULT_ANN_CONFIG["M"])
+    parser.add_argument("--ef_construction", type=int, default=DEFAULT_ANN_CONFIG["ef_construction"])
+    parser.add_argument("--ef_search", type=int, default=DEFAULT_ANN_CONFIG["ef_search"])
+    args = parser.parse_args()
+
+    for num_nodes in args.num_nodes:
+        benchmark(num_nodes, args.dim, args.num_queries, args.top_k, args.M, args.ef_construction, args.ef_search)
@@ -0,0 +1,62 @@
+import os
+import sys
+import argparse
+import time as time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from backend import (
+    load_config,
+    initialize_keys,
+    initialize_llm,
+    initialize_embedding_model,
+    parse_and_index_single_document,
+    create_query_engine,
+)
+
+def time_cold_start(document_choice, retrieval_depth, reuse_index):
+    """
+    Times model setup, cache load and query engine construction for one document.
+
+    Returns:
+        tuple: Elapsed seconds and the number of embedding calls made.
+    """
+    start_time = time.time()
+    config = load_config("config.json")
+    initialize_keys()
+    llm_choice = initialize_llm(config)
+    embedding_model = initialize_embedding_model(config)
+
+    token_counter = TokenCountingHandler()
+    embedding_model.callback_manager = CallbackManager([token_counter])
+
+    index, combined_nodes = parse_and_index_single_document(document_choice, llm_choice, embedding_model)
+    if not reuse_index:
+        # The previous behaviour: rebuild the index from the raw nodes
+        index = VectorStoreIndex(combined_nodes, embed_model=embedding_model)
+    create_query_engine(index, embedding_model, retreival_depth=retrieval_depth, verbosity=False)
+
+    elapsed_time = time.time() - start_time
+    return elapsed_time, len(token_counter.embedding_token_counts)
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/cold_start.py --document_choice "./TSLA-10Q-Sep2024.pdf"
+    #
+    parser = argparse.ArgumentParser(
+        description="Compare query engine cold-start time with and without the cached index."
+    )
+    parser.add_argument("--document_choice", type=str, default="./TSLA-10Q-Sep2024.pdf")
+    parser.add_argument("--retrieval_depth", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for reuse_index in (True, False):
+        label = "cached index" if reuse_index else "rebuilt index"
+        timings = []
+        for _ in range(args.runs):
+            elapsed_time, embedding_calls = time_cold_start(args.document_choice, args.retrieval_depth, reuse_index)
+            timings.append(elapsed_time)
+        print(f"{label}: best {min(timings):.2f}s, mean {sum(timings) / len(timings):.2f}s, embedding calls {embedding_calls}")
@@ -0,0 +1,90 @@
+import os
+import sys
+import pickle
+import argparse
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.node_parser import MarkdownElementNodeParser
+from llama_index.core.schema import NodeRelationship
+from artifact_store import hash_file
+from bm25_index import BM25Index
+from node_dedup import deduplicate_nodes, matching_text, shingles
+from pdf_parsers import parser_settings
+from backend import get_artifact_store, get_page_nodes, load_config
+from stub_models import StubLLM
+
+def build_nodes(file_path):
+    """
+    Element and page nodes of a PDF's cached LlamaParse output, as a full ingest builds them.
+
+    Table summaries come from the offline stub LLM, so no network calls are made.
+    """
+    store = get_artifact_store()
+    docs = store.get("parsed", store.key("parsed", hash_file(file_path), parser_settings(None)))
+    if docs is None:
+        sys.exit(f"No parsed output of {file_path} in the artifact store; run script.py on it first.")
+    node_parser = MarkdownElementNodeParser(llm=StubLLM(), num_workers=1)
+    base_nodes, objects = node_parser.get_nodes_and_objects(node_parser.get_nodes_from_documents(docs))
+    return base_nodes + objects, get_page_nodes(docs)
+
+def redundancy(nodes, containment=0.8):
+    """Share of retrieved nodes that mostly repeat a higher-ranked one, in either direction."""
+    shingle_sets = [shingles(matching_text(node)) for node in nodes]
+    redundant = 0
+    for i, current in enumerate(shingle_sets):
+        for earlier in shingle_sets[:i]:
+            overlap = len(current & earlier)
+            if current and earlier and overlap >= containment * min(len(current), len(earlier)):
+                redundant += 1
+                break
+    return redundant / len(nodes) if nodes else 0.0
+
+def distinct_pages(nodes):
+    """How many different pages the retrieved nodes come from."""
+    pages = set()
+    for node in nodes:
+        parent = node.relationships.get(NodeRelationship.PARENT)
+        pages.add(parent.node_id if parent is not None else node.node_id)
+    return len(pages)
+
+def retrieval_diversity(nodes, queries, top_k):
+    """Mean redundancy and distinct pages of the BM25 top-k over the queries (no embedding calls)."""
+    lexical_index = BM25Index.build([node.get_content() for node in nodes])
+    redundancies, pages = [], []
+    for query in queries:
+        positions, _ = lexical_index.top_k(query, top_k)
+        retrieved = [nodes[position] for position in positions]
+        redundancies.append(redundancy(retrieved))
+        pages.append(distinct_pages(retrieved))
+    return float(np.mean(redundancies)), float(np.mean(pages))
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/dedup.py --document ./PANW-10Q-Oct2024.pdf --test_data test_data_PANW.pkl
+    #
+    parser = argparse.ArgumentParser(
+        description="Index size, embedding cost and retrieval diversity before and after page/element deduplication."
+    )
+    parser.add_argument("--document", type=str, default="./PANW-10Q-Oct2024.pdf")
+    parser.add_argument("--test_data", type=str, default="test_data_PANW.pkl")
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--top_k", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.test_data, "rb") as f:
+        queries = [content["query"] for content in pickle.load(f).values()]
+
+    element_nodes, page_nodes = build_nodes(args.document)
+    all_nodes = element_nodes + page_nodes
+    start_time = time.time()
+    indexed_nodes, _, stats = deduplicate_nodes(element_nodes, page_nodes, {**load_config(args.config).get("dedup", {}), "enabled": True})
+    elapsed_time = time.time() - start_time
+
+    print(f"{os.path.basename(args.document)}: deduplicated in {elapsed_time:.2f}s, {stats}")
+    for label, nodes in [("before", all_nodes), ("after", indexed_nodes)]:
+        mean_redundancy, mean_pages = retrieval_diversity(nodes, queries, args.top_k)
+        print(f"  {label}: {len(nodes)} nodes, {stats[f'embedding_tokens_{label}']} embedding tokens, "
+              f"top-{args.top_k} redundancy {mean_redundancy:.3f}, distinct pages {mean_pages:.2f}")
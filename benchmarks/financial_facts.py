@@ -0,0 +1,86 @@
+import os
+import sys
+import pickle
+import argparse
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import query_numbers
+from artifact_store import hash_file
+from financial_facts import classify_query, fact_answer
+from pdf_parsers import parser_settings
+from backend import get_artifact_store, load, load_config, open_document_facts, run_query
+
+def figures(text):
+    """The numbers of a text without thousands separators, e.g. {"2138.8"} for "$2,138.8 million"."""
+    return {number.replace(",", "") for number in query_numbers(text)}
+
+def fact_is_correct(fact, expected_answer):
+    """Whether the fact's figure is one of the figures of the expected answer."""
+    return bool(figures(fact["text"]) & figures(expected_answer))
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/financial_facts.py --test_data test_data_PANW.pkl --config config.json
+    #        python benchmarks/financial_facts.py --test_data test_data_PANW.pkl --config config.stub.json --skip_rag
+    #
+    parser = argparse.ArgumentParser(
+        description="Hit rate, accuracy and latency saved by answering table lookups from the financial facts."
+    )
+    parser.add_argument("--test_data", type=str, nargs="+", default=["test_data_PANW.pkl"])
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--retrieval_depth", type=int, default=5)
+    parser.add_argument("--skip_rag", action="store_true", help="Do not time the RAG path for the questions the facts answer.")
+    parser.add_argument("--verbose", action="store_true", help="Print every question the facts answer.")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    store = get_artifact_store()
+    for test_data_file in args.test_data:
+        with open(test_data_file, "rb") as f:
+            test_data = pickle.load(f)
+        document_choice = next(iter(test_data.values()))["document_choice"]
+        if not store.contains("parsed", store.key("parsed", hash_file(document_choice), parser_settings(config.get("parser")))):
+            sys.exit(f"No parsed output of {document_choice} in the artifact store; run script.py on it first.")
+
+        start_time = time.time()
+        facts = open_document_facts(document_choice, config.get("parser"))
+        print(f"{os.path.basename(document_choice)}: {len(facts)} facts in {len(facts.rows)} table rows, opened in {(time.time() - start_time) * 1000:.1f}ms")
+
+        lookups, hits, correct, lookup_latencies, hit_latencies = 0, [], 0, [], []
+        for content in test_data.values():
+            lookups += classify_query(content["query"]) == "lookup"
+            start_time = time.time()
+            fact = facts.lookup(content["query"])
+            lookup_latencies.append(time.time() - start_time)
+            if fact is None:
+                continue
+            hits.append(content)
+            hit_latencies.append(lookup_latencies[-1])
+            correct += fact_is_correct(fact, content["expected_answer"])
+            if args.verbose:
+                print(f"  {content['query'].strip()}\n    -> {fact_answer(fact)}\n    expected: {content['expected_answer'].strip()}")
+
+        lookup_latencies = np.array(lookup_latencies)
+        print(f"  {len(test_data)} questions, {lookups} classified as lookups, {len(hits)} answered from the facts "
+              f"(hit rate {len(hits) / len(test_data):.1%}), {correct} of them with the expected figure")
+        print(f"  fact lookup p50 {np.percentile(lookup_latencies, 50) * 1000:.2f}ms, p95 {np.percentile(lookup_latencies, 95) * 1000:.2f}ms")
+
+        if args.skip_rag or not hits:
+            continue
+        # The same questions through embedding, retrieval and synthesis
+        query_engine = load(document_choice, args.retrieval_depth, False, config=config)
+        document_name = next(iter(query_engine))
+        rag_latencies = []
+        for content in hits:
+            timings = {}
+            run_query(content["query"], query_engine, document_name, args.retrieval_depth, timings=timings)
+            rag_latencies.append(timings["total"])
+        rag_latencies = np.array(rag_latencies)
+        # Both paths timed on the same questions: the ones the facts answer
+        saved = rag_latencies.sum() - np.sum(hit_latencies)
+        print(f"  RAG path for the same questions: p50 {np.percentile(rag_latencies, 50) * 1000:.0f}ms, "
+              f"p95 {np.percentile(rag_latencies, 95) * 1000:.0f}ms; {saved:.1f}s saved over the {len(hits)} answered questions "
+              f"({saved / len(hits) * 1000:.0f}ms per answered question)")
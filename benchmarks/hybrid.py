@@ -0,0 +1,81 @@
+import os
+import sys
+import pickle
+import argparse
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import QueryBundle
+from bm25_index import BM25Index, tokenize
+from backend import load, load_config, get_artifact_store
+
+# Words too common in questions and answers to say whether the right passage was found
+STOP_WORDS = {
+    "the", "and", "for", "that", "with", "this", "from", "was", "were", "are", "has", "have",
+    "its", "which", "what", "how", "did", "does", "company", "palo", "alto", "networks",
+}
+
+def answer_terms(expected_answer):
+    """The figures and distinctive words of an expected answer."""
+    return {token for token in tokenize(expected_answer) if token not in STOP_WORDS and (len(token) > 3 or token[0].isdigit())}
+
+def context_recall(expected_answer, retrieved_nodes):
+    """Share of the expected answer's terms that appear in the retrieved context, a proxy for answer quality."""
+    terms = answer_terms(expected_answer)
+    if not terms:
+        return None
+    context = set(tokenize(" ".join(node.node.get_content() for node in retrieved_nodes)))
+    return len(terms & context) / len(terms)
+
+def evaluate_mode(test_data, config, mode, retrieval_depth):
+    """Retrieves every test question with one retrieval mode; returns latencies and context recall."""
+    config = {**config, "retrieval": {**config.get("retrieval", {}), "mode": mode}}
+    engines = {}
+    latencies, recalls = [], []
+    for content in test_data.values():
+        document_choice = content["document_choice"]
+        if document_choice not in engines:
+            engines[document_choice] = next(iter(load(document_choice, retrieval_depth, False, config=config).values()))
+        engine = engines[document_choice]
+        # Embed outside the timing, so both modes are compared on retrieval alone
+        query_bundle = QueryBundle(content["query"], embedding=engine.retriever.embed_model.get_query_embedding(content["query"]))
+        start_time = time.time()
+        nodes = engine.retrieve(query_bundle)
+        latencies.append(time.time() - start_time)
+        recall = context_recall(content["expected_answer"], nodes)
+        if recall is not None:
+            recalls.append(recall)
+    return engines, np.array(latencies), np.array(recalls)
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/hybrid.py --test_data test_data_PANW.pkl --config config.json
+    #
+    parser = argparse.ArgumentParser(
+        description="Compare dense and hybrid (BM25 + dense) retrieval on the test questions."
+    )
+    parser.add_argument("--test_data", type=str, default="test_data_PANW.pkl")
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--retrieval_depth", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.test_data, "rb") as f:
+        test_data = pickle.load(f)
+    config = load_config(args.config)
+
+    for mode in ["dense", "hybrid"]:
+        engines, latencies, recalls = evaluate_mode(test_data, config, mode, args.retrieval_depth)
+        print(f"{mode}: {len(latencies)} questions, retrieval p50 {np.percentile(latencies, 50) * 1000:.2f}ms, "
+              f"p95 {np.percentile(latencies, 95) * 1000:.2f}ms, context recall {recalls.mean():.3f}")
+
+    # Load time of the persisted postings arrays
+    store = get_artifact_store()
+    for engine in engines.values():
+        index = engine.retriever.index
+        index_path = store.path("bm25", store.key("bm25", index.artifact_key), extension=".npz")
+        start_time = time.time()
+        lexical_index = BM25Index.load(index_path)
+        print(f"BM25 index: {len(lexical_index.terms)} terms, {len(lexical_index.doc_ids)} postings, "
+              f"{os.path.getsize(index_path) / 1024:.0f} KB, loaded in {(time.time() - start_time) * 1000:.1f}ms")
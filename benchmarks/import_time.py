@@ -0,0 +1,121 @@
+import os
+import re
+import ast
+import sys
+import argparse
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points and the import time each may take before it starts working, in
+# milliseconds. The budgets leave room for machine noise over llama_index.core,
+# which every entry point needs; a provider SDK imported at module load again
+# (torch and transformers alone take seconds) exceeds them.
+ENTRY_POINTS = {
+    "cli": "script.py",
+    "ui": "ui.py",
+    "evaluator": "evaluate.py",
+    "service": "service.py",
+}
+IMPORT_BUDGETS_MS = {
+    "cli": 2500,
+    "ui": 3500,
+    "evaluator": 2500,
+    "service": 2500,
+}
+
+# Only imported by the code paths that use them, never at start-up
+DEFERRED_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "google.generativeai",
+    "replicate",
+    "openai",
+    "llama_parse",
+    "llama_index.llms.huggingface",
+    "llama_index.llms.gemini",
+    "llama_index.embeddings.huggingface",
+    "llama_index.embeddings.gemini",
+    "matplotlib",
+    "deepeval",
+    "hnswlib",
+    "pdfplumber",
+]
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def top_level_imports(file_path):
+    """The import statements at the top level of a file: what running it pays for before its first line of work."""
+    with open(file_path, "r") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def measure_imports(code):
+    """
+    Runs the imports in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        tuple: Total import time in seconds (the cumulative time of the top-level
+            imports) and the set of every module imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else "import failed")
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, module = match.groups()
+        modules.add(module)
+        if len(indent) == 1:
+            total_us += int(cumulative)
+    return total_us / 1e6, modules
+
+def deferred_imports(modules):
+    """The deferred modules (or their submodules) among the imported ones."""
+    return sorted(
+        deferred for deferred in DEFERRED_MODULES
+        if any(module == deferred or module.startswith(deferred + ".") for module in modules)
+    )
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/import_time.py
+    #        python benchmarks/import_time.py --entry_points cli evaluator --runs 10
+    #
+    parser = argparse.ArgumentParser(
+        description="Start-up import time of the CLI, the UI, the evaluator and the service, checked against a budget."
+    )
+    parser.add_argument("--entry_points", type=str, nargs="+", default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point; the median is reported.")
+    parser.add_argument("--budget_scale", type=float, default=1.0, help="Multiplies every budget, for slower machines.")
+    args = parser.parse_args()
+
+    failures = []
+    for entry_point in args.entry_points:
+        code = top_level_imports(os.path.join(ROOT, ENTRY_POINTS[entry_point]))
+        budget = IMPORT_BUDGETS_MS[entry_point] * args.budget_scale
+        try:
+            runs = [measure_imports(code) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{entry_point} ({ENTRY_POINTS[entry_point]}): could not import: {e}")
+            failures.append(entry_point)
+            continue
+        seconds = np.array([elapsed for elapsed, _ in runs])
+        deferred = deferred_imports(runs[0][1])
+        print(f"{entry_point} ({ENTRY_POINTS[entry_point]}): median {np.median(seconds) * 1000:.0f}ms, "
+              f"min {seconds.min() * 1000:.0f}ms, budget {budget:.0f}ms, {len(runs[0][1])} modules")
+        if deferred:
+            print(f"  imported at start-up, should be deferred: {', '.join(deferred)}")
+        if np.median(seconds) * 1000 > budget or deferred:
+            failures.append(entry_point)
+
+    if failures:
+        sys.exit(f"Import time regression in: {', '.join(failures)}")
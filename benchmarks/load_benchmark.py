@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import pickle
+import argparse
+import urllib.request
+import time as time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing import percentile
+
+def post_query(url, query, document_name):
+    """Sends one query to the service and returns the client-side latency in seconds."""
+    request = urllib.request.Request(
+        f"{url}/query",
+        data=json.dumps({"query": query, "document": document_name}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    start_time = time.time()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.time() - start_time
+
+if __name__ == "__main__":
+    #
+    # USAGE: python service.py --config config.stub.json &
+    #        python benchmarks/load_benchmark.py --document PANW-10Q-Oct2024 --concurrency 16
+    #
+    parser = argparse.ArgumentParser(
+        description="Load-test a running query service with the bundled test questions."
+    )
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--document", type=str, default="PANW-10Q-Oct2024")
+    parser.add_argument("--test_data", type=str, default="./test_data_PANW.pkl")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.test_data, "rb") as f:
+        questions = [content["query"] for content in pickle.load(f).values()]
+    queries = [questions[i % len(questions)] for i in range(args.requests)]
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = sorted(executor.map(lambda query: post_query(args.url, query, args.document), queries))
+    elapsed_time = time.time() - start_time
+
+    print(f"{args.requests} requests at concurrency {args.concurrency} in {elapsed_time:.2f}s")
+    print(f"Throughput: {args.requests / elapsed_time:.1f} req/s")
+    print(f"Client latency p50 {1000 * percentile(latencies, 50):.1f}ms, p95 {1000 * percentile(latencies, 95):.1f}ms, p99 {1000 * percentile(latencies, 99):.1f}ms")
+    with urllib.request.urlopen(f"{args.url}/metrics") as response:
+        print(json.dumps(json.load(response), indent=4))
@@ -0,0 +1,70 @@
+import gc
+import os
+import sys
+import glob
+import pickle
+import argparse
+import tracemalloc
+import time as time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from node_metadata import share_metadata
+from artifact_store import ArtifactStore
+
+def unshare_metadata(nodes):
+    """Gives every node and relationship its own metadata dict, as ingest did before records were shared."""
+    # Set directly, like share_metadata, so both variants pickle the same node state otherwise
+    for node in nodes:
+        object.__setattr__(node, "metadata", dict(node.metadata))
+        for related in node.relationships.values():
+            for info in related if isinstance(related, list) else [related]:
+                object.__setattr__(info, "metadata", dict(info.metadata))
+        obj = getattr(node, "obj", None)
+        if obj is not None and hasattr(obj, "relationships"):
+            for related in obj.relationships.values():
+                for info in related if isinstance(related, list) else [related]:
+                    object.__setattr__(info, "metadata", dict(info.metadata))
+    return nodes
+
+def measure_load(payload, share):
+    """Memory held by the loaded nodes (after sharing their metadata, if ``share``) and the load time."""
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.time()
+    nodes = pickle.loads(payload)
+    if share:
+        share_metadata(nodes)
+    elapsed_time = time.time() - start_time
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return memory, elapsed_time
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/metadata.py
+    #        python benchmarks/metadata.py --nodes artifacts/v1/nodes/<key>.pkl
+    #
+    parser = argparse.ArgumentParser(
+        description="Cache file size and resident memory of node artifacts with per-node and shared metadata."
+    )
+    parser.add_argument("--nodes", type=str, nargs="+", default=None, help="Nodes artifacts (default: all in the artifact store).")
+    args = parser.parse_args()
+
+    store = ArtifactStore()
+    paths = args.nodes or sorted(glob.glob(os.path.join(store.root, "nodes", "*.pkl")))
+    for path in paths:
+        with open(path, "rb") as f:
+            stored = f.read()
+        # Loading once first imports the node classes, which would otherwise be measured too
+        nodes = pickle.loads(stored)
+        stored_memory, stored_time = measure_load(stored, share=False)
+        copied = pickle.dumps(unshare_metadata(nodes))
+        shared = pickle.dumps(share_metadata(nodes))
+        copied_memory, copied_time = measure_load(copied, share=False)
+        shared_memory, shared_time = measure_load(shared, share=True)
+        print(f"{os.path.basename(path)}: {len(nodes)} nodes")
+        print(f"  as stored:         {len(stored) / 1024:.0f} KB on disk, {stored_memory / 1024:.0f} KB loaded in {stored_time * 1000:.0f}ms")
+        print(f"  per-node metadata: {len(copied) / 1024:.0f} KB on disk, {copied_memory / 1024:.0f} KB loaded in {copied_time * 1000:.0f}ms")
+        print(f"  shared metadata:   {len(shared) / 1024:.0f} KB on disk, {shared_memory / 1024:.0f} KB loaded in {shared_time * 1000:.0f}ms")
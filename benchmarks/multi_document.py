@@ -0,0 +1,90 @@
+import os
+import sys
+import argparse
+import tempfile
+import tracemalloc
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import TextNode
+from embedding_matrix import EmbeddingMatrixIndex, save_embedding_matrix
+from multi_document import MultiDocumentIndex
+
+def benchmark(num_documents, nodes_per_document, dim, num_queries, top_k, max_routed_documents):
+    """
+    Measures the Python heap held by a MultiDocumentIndex after loading and after
+    querying, and per-query latency with routing against scoring every document.
+
+    Documents are random clusters, so routing by centroid finds the queried one.
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((num_documents, dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for d in range(num_documents):
+            embeddings = centers[d] + 0.5 * rng.standard_normal((nodes_per_document, dim)).astype(np.float32)
+            node_ids = [f"doc{d}-node{i}" for i in range(nodes_per_document)]
+            save_embedding_matrix(os.path.join(tmp_dir, f"doc{d}.npy"), node_ids, embeddings)
+
+        def load_nodes(d):
+            return [TextNode(text=f"document {d} node {i} " * 50, id_=f"doc{d}-node{i}") for i in range(nodes_per_document)]
+
+        tracemalloc.start()
+        start_time = time.time()
+        index = MultiDocumentIndex(
+            {
+                f"doc{d}": EmbeddingMatrixIndex(os.path.join(tmp_dir, f"doc{d}.npy"), load_nodes=lambda d=d: load_nodes(d))
+                for d in range(num_documents)
+            },
+            max_routed_documents=max_routed_documents,
+        )
+        load_time = time.time() - start_time
+        load_memory = tracemalloc.get_traced_memory()[0]
+
+        queried = rng.integers(0, num_documents, num_queries)
+        queries = centers[queried] + 0.5 * rng.standard_normal((num_queries, dim)).astype(np.float32)
+
+        start_time = time.time()
+        results = [index.top_k(query, top_k, index.route("", query)) for query in queries]
+        routed_query = (time.time() - start_time) / num_queries
+        routed_correctly = sum(
+            any(name == f"doc{document}" for name, _, _ in result) for document, result in zip(queried, results)
+        )
+        # Only the documents that were retrieved from load their nodes
+        for result in results:
+            for name, row, _ in result:
+                index.node(name, row)
+        query_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start_time = time.time()
+        for query in queries:
+            index.top_k(query, top_k)
+        all_query = (time.time() - start_time) / num_queries
+
+    print(f"{num_documents} documents x {nodes_per_document} nodes x {dim} dims, top-{top_k}")
+    print(f"  load: {load_time * 1000:.1f}ms, {load_memory / 1024 ** 2:.1f} MB heap "
+          f"({query_memory / 1024 ** 2:.1f} MB after {num_queries} queries)")
+    print(f"  routed to {max_routed_documents}: {routed_query * 1000:.2f}ms/query, "
+          f"{routed_correctly}/{num_queries} routed to the right document")
+    print(f"  every document: {all_query * 1000:.2f}ms/query")
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/multi_document.py --num_documents 10 50 200
+    #
+    parser = argparse.ArgumentParser(
+        description="Benchmark memory and query latency of the multi-document index as documents are added."
+    )
+    parser.add_argument("--num_documents", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--nodes_per_document", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--num_queries", type=int, default=50)
+    parser.add_argument("--top_k", type=int, default=5)
+    parser.add_argument("--max_routed_documents", type=int, default=3)
+    args = parser.parse_args()
+
+    for num_documents in args.num_documents:
+        benchmark(num_documents, args.nodes_per_document, args.dim, args.num_queries, args.top_k, args.max_routed_documents)
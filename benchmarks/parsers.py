@@ -0,0 +1,52 @@
+import os
+import sys
+import argparse
+import time as time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.node_parser import MarkdownElementNodeParser
+from artifact_store import hash_file
+from pdf_parsers import parse_document, parser_settings
+from backend import get_artifact_store, get_page_nodes
+from stub_models import StubLLM
+
+def count_nodes(docs):
+    """
+    Counts base, table and page nodes for parsed documents, as ingest would build them.
+
+    Table summaries come from the offline stub LLM, so counting makes no network calls.
+    """
+    node_parser = MarkdownElementNodeParser(llm=StubLLM(), num_workers=1)
+    base_nodes, objects = node_parser.get_nodes_and_objects(node_parser.get_nodes_from_documents(docs))
+    return {"base": len(base_nodes), "tables": len(objects), "pages": len(get_page_nodes(docs))}
+
+def cached_llamaparse_counts(file_path):
+    """Node counts for the cached LlamaParse output of a PDF, or None if nothing is cached."""
+    store = get_artifact_store()
+    docs = store.get("parsed", store.key("parsed", hash_file(file_path), parser_settings(None)))
+    if docs is None:
+        return None
+    return count_nodes(docs)
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/parsers.py --workers 4
+    #
+    parser = argparse.ArgumentParser(
+        description="Compare the local PDF parser against the cached LlamaParse output."
+    )
+    parser.add_argument("--documents", type=str, nargs="+", default=["./TSLA-10Q-Sep2024.pdf", "./PANW-10Q-Oct2024.pdf"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    for document in args.documents:
+        start_time = time.time()
+        docs = parse_document(document, {"type": "pdfplumber", "workers": args.workers})
+        elapsed_time = time.time() - start_time
+        counts = count_nodes(docs)
+
+        print(f"{os.path.basename(document)}")
+        print(f"  pdfplumber ({args.workers} workers): {counts['pages']} pages in {elapsed_time:.2f}s "
+              f"({counts['pages'] / elapsed_time:.1f} pages/sec), nodes {counts}")
+        print(f"  cached LlamaParse: nodes {cached_llamaparse_counts(document)}")
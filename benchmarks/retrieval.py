@@ -0,0 +1,75 @@
+import os
+import sys
+import argparse
+import pickle
+import tempfile
+import time as time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.indices.query.embedding_utils import get_top_k_embeddings
+from llama_index.core.schema import TextNode
+from embedding_matrix import EmbeddingMatrixIndex, save_embedding_matrix
+
+def benchmark(num_nodes, dim, num_queries, top_k):
+    """
+    Compares load time and per-query top-k latency of the default in-memory store
+    (pickled Python lists) against the memory-mapped embedding matrix.
+    """
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((num_nodes, dim)).astype(np.float32)
+    nodes = [TextNode(text=f"node {i}", id_=f"node-{i}") for i in range(num_nodes)]
+    node_ids = [node.node_id for node in nodes]
+    queries = rng.standard_normal((num_queries, dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Default store: a dict of Python float lists, pickled and unpickled whole
+        lists_path = os.path.join(tmp_dir, "embeddings.pkl")
+        with open(lists_path, "wb") as f:
+            pickle.dump(dict(zip(node_ids, embeddings.tolist())), f)
+        start_time = time.time()
+        with open(lists_path, "rb") as f:
+            embedding_dict = pickle.load(f)
+        list_load = time.time() - start_time
+
+        start_time = time.time()
+        for query in queries:
+            get_top_k_embeddings(
+                query.tolist(),
+                list(embedding_dict.values()),
+                similarity_top_k=top_k,
+                embedding_ids=list(embedding_dict.keys()),
+            )
+        list_query = (time.time() - start_time) / num_queries
+
+        # Memory-mapped matrix
+        matrix_path = os.path.join(tmp_dir, "embeddings.npy")
+        save_embedding_matrix(matrix_path, node_ids, embeddings)
+        start_time = time.time()
+        index = EmbeddingMatrixIndex(matrix_path, nodes)
+        matrix_load = time.time() - start_time
+
+        start_time = time.time()
+        for query in queries:
+            index.top_k(query, top_k)
+        matrix_query = (time.time() - start_time) / num_queries
+
+    print(f"{num_nodes} nodes x {dim} dims, top-{top_k}")
+    print(f"  python lists: load {list_load * 1000:.1f}ms, query {list_query * 1000:.2f}ms")
+    print(f"  mmap matrix:  load {matrix_load * 1000:.1f}ms, query {matrix_query * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    #
+    # USAGE: python benchmarks/retrieval.py --num_nodes 5000 --dim 768
+    #
+    parser = argparse.ArgumentParser(
+        description="Benchmark embedding load time and top-k retrieval latency."
+    )
+    parser.add_argument("--num_nodes", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--num_queries", type=int, default=50)
+    parser.add_argument("--top_k", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args.num_nodes, args.dim, args.num_queries, args.top_k)
@@ -0,0 +1,192 @@
+import re
+import numpy as np
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from artifact_store import atomic_write
+from tracing import get_tracer
+
+# Lexical retrieval for the exact tokens dense embeddings blur: note names
+# ("2025 Convertible Senior Notes"), acronyms ("RSUs"), product names and figures.
+# Postings are stored CSR-style in flat numpy arrays, so an index loads with a
+# single np.load and no per-term Python objects.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+def tokenize(text):
+    """Lowercases and splits text into words and numbers, keeping figures like 2,138.8 whole."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents (here, the rows of an embedding matrix).
+
+    ``terms`` is the sorted vocabulary; the postings of ``terms[t]`` are
+    ``doc_ids[offsets[t]:offsets[t + 1]]`` with matching ``term_freqs``.
+    Terms are looked up by binary search, so no dict is built at load time.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, term_freqs, doc_lengths, k1=1.5, b=0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts):
+        """Builds the index; document i is texts[i]."""
+        term_ids = {}
+        postings = []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.append((term_ids.setdefault(token, len(term_ids)), doc_id, count))
+
+        terms = sorted(term_ids)
+        rank = np.empty(len(term_ids), dtype=np.int64)
+        rank[[term_ids[term] for term in terms]] = np.arange(len(terms))
+        postings = np.array(postings, dtype=np.int64).reshape(-1, 3)
+        postings[:, 0] = rank[postings[:, 0]] if len(postings) else postings[:, 0]
+        postings = postings[np.lexsort((postings[:, 1], postings[:, 0]))]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(postings[:, 0], minlength=len(terms)), out=offsets[1:])
+        return cls(
+            np.array(terms, dtype=str),
+            offsets,
+            postings[:, 1].astype(np.int32),
+            postings[:, 2].astype(np.float32),
+            doc_lengths,
+        )
+
+    def save(self, index_path):
+        """Saves the arrays as one uncompressed .npz file, atomically."""
+        atomic_write(index_path, lambda f: np.savez(
+            f, terms=self.terms, offsets=self.offsets, doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+        ))
+
+    @classmethod
+    def load(cls, index_path):
+        with np.load(index_path) as arrays:
+            return cls(arrays["terms"], arrays["offsets"], arrays["doc_ids"], arrays["term_freqs"], arrays["doc_lengths"])
+
+    def scores(self, query):
+        """Returns the BM25 score of every document for a query."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        if not len(self.terms):
+            return scores
+        num_docs = len(self.doc_lengths)
+        for token in set(tokenize(query)):
+            t = int(np.searchsorted(self.terms, token))
+            if t >= len(self.terms) or self.terms[t] != token:
+                continue
+            start, stop = self.offsets[t], self.offsets[t + 1]
+            doc_ids = self.doc_ids[start:stop]
+            term_freqs = self.term_freqs[start:stop]
+            idf = np.log(1.0 + (num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norms = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_ids] / self.average_length)
+            # Each document appears once per term's postings, so plain fancy-index addition is safe
+            scores[doc_ids] += idf * term_freqs * (self.k1 + 1.0) / (term_freqs + norms)
+        return scores
+
+    def top_k(self, query, k):
+        """Returns the positions and scores of the k best-matching documents, best first, skipping non-matches."""
+        scores = self.scores(query)
+        matches = np.flatnonzero(scores)
+        k = min(k, len(matches))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """
+    Fuses ranked lists of positions: each position scores sum(1 / (rrf_k + rank)).
+
+    Returns (position, fused score) pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, 1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense retrieval over an EmbeddingMatrixIndex with BM25 over the same rows.
+
+    Each side contributes its ``candidates`` best rows and the ``similarity_top_k``
+    best after reciprocal rank fusion are returned, with the fused score.
+    """
+
+    def __init__(self, index, lexical_index, embed_model, similarity_top_k=5, candidates=None, rrf_k=60, verbose=False, callback_manager=None):
+        self._index = index
+        self._lexical_index = lexical_index
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        self._candidates = candidates or max(20, 4 * similarity_top_k)
+        self._rrf_k = rrf_k
+        super().__init__(callback_manager=callback_manager, verbose=verbose)
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def embed_model(self):
+        return self._embed_model
+
+    @property
+    def similarity_top_k(self):
+        return self._similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        dense_positions, _ = self._index.top_k(query_bundle.embedding, self._candidates)
+        lexical_positions, _ = self._lexical_index.top_k(query_bundle.query_str, self._candidates)
+        fused = reciprocal_rank_fusion(
+            [dense_positions.tolist(), lexical_positions.tolist()], self._rrf_k
+        )[: self._similarity_top_k]
+        return [
+            NodeWithScore(node=self._index.nodes[position], score=score)
+            for position, score in fused
+        ]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = await self._embed_model.aget_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return self._retrieve(query_bundle)
+
+def open_lexical_index(store, index, verbosity=False):
+    """
+    Returns the BM25 index over the rows of an EmbeddingMatrixIndex, building and saving it on first use.
+
+    It is stored in the artifact store's "bm25" layer, keyed by the matrix's artifact key.
+    """
+    lexical_key = store.key("bm25", index.artifact_key)
+    index_path = store.path("bm25", lexical_key, extension=".npz")
+    with get_tracer().span("index_build", kind="bm25", nodes=len(index.node_ids)) as span:
+        if store.contains("bm25", lexical_key, extension=".npz"):
+            span.set(cache_hit=True)
+            return BM25Index.load(index_path)
+        span.set(cache_hit=False)
+        if verbosity:
+            print(f"Building BM25 index over {len(index.node_ids)} nodes...")
+        lexical_index = BM25Index.build([node.get_content() for node in index.nodes])
+        lexical_index.save(index_path)
+        return lexical_index
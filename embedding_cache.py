@@ -0,0 +1,167 @@
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from typing import Any, List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+# Embeddings are remembered per text, not per document: boilerplate 10-Q sections,
+# page nodes repeating base-node text and the same evaluation questions are
+# embedded once per embedding model, whichever document or run asks for them.
+
+def normalize_text(text):
+    """Normalizes unicode and collapses whitespace, so trivially different copies share an entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def text_key(text):
+    """Returns the sha256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache in a local SQLite file.
+
+    Rows are keyed by (embedding model, kind, hash of the normalized text), where
+    kind is "text" or "query" because some providers embed queries differently.
+    Vectors are stored as float32 blobs. The connection is shared between
+    threads behind a lock.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, kind TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, kind, text_hash))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_calls_saved = 0
+
+    def get_many(self, model, kind, texts):
+        """Returns the cached embedding of each text, or None where there is none."""
+        keys = [text_key(text) for text in texts]
+        found = {}
+        with self.lock:
+            # Stay well under SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND kind = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, kind, *chunk],
+                ).fetchall()
+                found.update(rows)
+            embeddings = [
+                np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None
+                for key in keys
+            ]
+            hits = sum(embedding is not None for embedding in embeddings)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return embeddings
+
+    def put_many(self, model, kind, texts, embeddings):
+        """Stores the embeddings of the given texts."""
+        rows = [
+            (model, kind, text_key(text), np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def record_call(self, saved):
+        """Counts one embedding request, either made or avoided because every text was cached."""
+        with self.lock:
+            if saved:
+                self.api_calls_saved += 1
+            else:
+                self.api_calls += 1
+
+    def stats(self):
+        """Returns hit and miss counts, the hit rate and the embedding requests made and saved."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "api_calls": self.api_calls,
+                "api_calls_saved": self.api_calls_saved,
+            }
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Embedding model that answers from an EmbeddingCache and passes only the
+    misses on to the wrapped model, for both document and query embeddings.
+    """
+
+    _inner: Any = PrivateAttr()
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, inner, cache, **kwargs):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._cache = cache
+
+    @property
+    def inner(self):
+        """The wrapped provider model."""
+        return self._inner
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def _lookup(self, kind, texts):
+        embeddings = self._cache.get_many(self.model_name, kind, texts)
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        self._cache.record_call(saved=not missing)
+        return embeddings, missing
+
+    def _fill(self, kind, texts, embeddings, missing, computed):
+        self._cache.put_many(self.model_name, kind, [texts[position] for position in missing], computed)
+        for position, embedding in zip(missing, computed):
+            embeddings[position] = embedding
+        return embeddings
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        embeddings, missing = self._lookup("query", [query])
+        if missing:
+            self._fill("query", [query], embeddings, missing, [self._inner._get_query_embedding(query)])
+        return embeddings[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        embeddings, missing = self._lookup("query", [query])
+        if missing:
+            self._fill("query", [query], embeddings, missing, [await self._inner._aget_query_embedding(query)])
+        return embeddings[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings, missing = self._lookup("text", texts)
+        if missing:
+            computed = self._inner._get_text_embeddings([texts[position] for position in missing])
+            self._fill("text", texts, embeddings, missing, computed)
+        return embeddings
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings, missing = self._lookup("text", texts)
+        if missing:
+            computed = await self._inner._aget_text_embeddings([texts[position] for position in missing])
+            self._fill("text", texts, embeddings, missing, computed)
+        return embeddings
@@ -0,0 +1,161 @@
+import os
+import json
+import threading
+import numpy as np
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from artifact_store import atomic_write
+
+def normalize_rows(matrix):
+    """L2-normalizes each row of a matrix, leaving all-zero rows untouched."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def save_embedding_matrix(matrix_path, node_ids, embeddings):
+    """
+    Saves embeddings as a normalized float32 ``.npy`` matrix with a node-id sidecar.
+
+    Row ``i`` of the matrix is the embedding of ``node_ids[i]``. Both files are
+    written to a temporary path first and moved into place atomically.
+    """
+    matrix = np.ascontiguousarray(normalize_rows(embeddings))
+    atomic_write(ids_path(matrix_path), lambda f: f.write(json.dumps(list(node_ids)).encode("utf-8")))
+    atomic_write(matrix_path, lambda f: np.save(f, matrix))
+
+def load_embedding_matrix(matrix_path):
+    """Opens a saved matrix read-only with np.memmap and returns it with its node ids."""
+    matrix = np.load(matrix_path, mmap_mode="r")
+    with open(ids_path(matrix_path), "r") as f:
+        node_ids = json.load(f)
+    return matrix, node_ids
+
+def ids_path(matrix_path):
+    """Returns the path of the node-id sidecar of a matrix file."""
+    return os.path.splitext(matrix_path)[0] + ".ids.json"
+
+class EmbeddingMatrixIndex:
+    """
+    Read-only vector index over a memory-mapped embedding matrix.
+
+    The matrix is opened with ``mmap_mode="r"``, so loading is O(1) and several
+    processes serving the same document share the same physical pages. Rows are
+    pre-normalized, which makes cosine similarity a single matrix-vector product.
+
+    Instead of ``nodes``, a ``load_nodes`` callable can be given; it is called
+    the first time the nodes are needed, so scoring alone never loads them.
+    With an ``ann`` index (see ann_index.py), top-k queries are answered by
+    approximate search instead of scoring every row.
+    """
+
+    def __init__(self, matrix_path, nodes=None, load_nodes=None, ann=None):
+        self.matrix_path = matrix_path
+        self.matrix, self.node_ids = load_embedding_matrix(matrix_path)
+        self.ann = ann
+        self._load_nodes = load_nodes
+        self._nodes = None
+        self._nodes_lock = threading.Lock()
+        if nodes is not None:
+            self._nodes = self._order_nodes(nodes)
+
+    @property
+    def artifact_key(self):
+        """The artifact store key of the matrix, a hash of the nodes and the embedding model."""
+        return os.path.splitext(os.path.basename(self.matrix_path))[0]
+
+    @property
+    def nodes(self):
+        """The nodes, in row order."""
+        if self._nodes is None:
+            with self._nodes_lock:
+                if self._nodes is None:
+                    self._nodes = self._order_nodes(self._load_nodes())
+        return self._nodes
+
+    def _order_nodes(self, nodes):
+        node_lookup = {node.node_id: node for node in nodes}
+        return [node_lookup[node_id] for node_id in self.node_ids]
+
+    def top_k(self, query_embedding, k):
+        """Returns the row positions and cosine scores of the k most similar rows, best first."""
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        if self.ann is not None and 0 < k < len(self.matrix):
+            positions, scores = self.ann.query(query[None, :], k)
+            return positions[0], scores[0]
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+    def top_k_batch(self, query_embeddings, k):
+        """
+        Top-k for many queries at once: one matrix-matrix product and a row-wise argpartition.
+
+        Returns (positions, scores) arrays of shape (num_queries, k), best first in each row.
+        """
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        if self.ann is not None and 0 < k < len(self.matrix):
+            return self.ann.query(queries, k)
+        scores = queries @ self.matrix.T
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if k < scores.shape[1]:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def as_retriever(self, embed_model, similarity_top_k=5, **kwargs):
+        """Returns a retriever over this index, mirroring VectorStoreIndex.as_retriever."""
+        return EmbeddingMatrixRetriever(self, embed_model, similarity_top_k=similarity_top_k, **kwargs)
+
+class EmbeddingMatrixRetriever(BaseRetriever):
+    """Retriever that embeds the query and takes the top-k rows of an EmbeddingMatrixIndex."""
+
+    def __init__(self, index, embed_model, similarity_top_k=5, verbose=False, callback_manager=None):
+        self._index = index
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        super().__init__(callback_manager=callback_manager, verbose=verbose)
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def embed_model(self):
+        return self._embed_model
+
+    @property
+    def similarity_top_k(self):
+        return self._similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        positions, scores = self._index.top_k(query_bundle.embedding, self._similarity_top_k)
+        return [
+            NodeWithScore(node=self._index.nodes[position], score=float(score))
+            for position, score in zip(positions, scores)
+        ]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = await self._embed_model.aget_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return self._retrieve(query_bundle)
@@ -0,0 +1,139 @@
+import asyncio
+import time as time
+from llama_index.core.schema import MetadataMode
+from llama_index.core.utils import get_tokenizer
+from artifact_store import hash_texts
+from rate_limit import ProviderRateLimiter, call_with_retries
+
+# Texts per embedding request. OpenAI accepts up to 2048 inputs per request and
+# Gemini's batchEmbedContents up to 100; HuggingFace models run locally, where
+# the batch size only trades memory for speed.
+DEFAULT_BATCH_SIZES = {
+    "openai": 512,
+    "gemini": 100,
+    "huggingface": 32,
+    "stub": 256,
+}
+
+# Embedding requests in flight at once. Local models gain nothing from more than one.
+DEFAULT_MAX_CONCURRENCY = {
+    "openai": 8,
+    "gemini": 4,
+    "huggingface": 1,
+    "stub": 8,
+}
+
+PROVIDERS = {
+    "OpenAIEmbedding": "openai",
+    "GeminiEmbedding": "gemini",
+    "HuggingFaceEmbedding": "huggingface",
+    "StubEmbedding": "stub",
+}
+
+def embedding_provider(embedding_model):
+    """Returns the provider name of an embedding model, for batch sizes and rate limits."""
+    # Look through a CachedEmbedding to the provider model it wraps
+    embedding_model = getattr(embedding_model, "inner", embedding_model)
+    return PROVIDERS.get(type(embedding_model).__name__, "openai")
+
+class EmbeddingPipeline:
+    """
+    Embeds nodes in fixed-size batches with a bounded number of concurrent requests.
+
+    Each request takes a token from the provider's rate limiter ("rate_limits"
+    in config.json) and is retried with backoff on 429s. Every completed batch
+    is checkpointed in the artifact store's "embedding_batches" layer, keyed by
+    its texts and the embedding model, so an interrupted ingest only re-embeds
+    the batches that had not finished. Checkpoints are removed once the whole
+    matrix has been saved (see ``discard_checkpoints``).
+    """
+
+    def __init__(self, embedding_model, store, batch_size=None, max_concurrency=None, rate_limiter=None):
+        self.embedding_model = embedding_model
+        self.store = store
+        self.provider = embedding_provider(embedding_model)
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZES.get(self.provider, 100)
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY.get(self.provider, 4)
+        self.rate_limiter = rate_limiter or ProviderRateLimiter()
+        self.checkpoint_keys = []
+        self.stats = {}
+
+    @classmethod
+    def from_config(cls, embedding_model, store, config):
+        """Builds a pipeline from the "ingest" and "rate_limits" sections of a config."""
+        ingest_config = config.get("ingest", {})
+        return cls(
+            embedding_model,
+            store,
+            batch_size=ingest_config.get("embed_batch_size"),
+            max_concurrency=ingest_config.get("embed_max_concurrency"),
+            rate_limiter=ProviderRateLimiter(config),
+        )
+
+    def batch_key(self, texts):
+        return self.store.key("embedding_batches", hash_texts(texts), {"embedding_model": self.embedding_model.model_name})
+
+    def embed(self, nodes, show_progress=False):
+        """
+        Embeds the nodes' text, as embed_nodes would, and returns a node id to embedding dict.
+
+        Throughput for the call is left in ``self.stats``.
+        """
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        self.checkpoint_keys = [self.batch_key(batch) for batch in batches]
+
+        start_time = time.time()
+        batch_embeddings, resumed = asyncio.run(self.embed_batches(batches, show_progress))
+        elapsed_time = time.time() - start_time
+
+        tokenizer = get_tokenizer()
+        embedded_batches = [batch for batch, was_resumed in zip(batches, resumed) if not was_resumed]
+        embedded_nodes = sum(len(batch) for batch in embedded_batches)
+        embedded_tokens = sum(len(tokenizer(text)) for batch in embedded_batches for text in batch)
+        self.stats = {
+            "provider": self.provider,
+            "nodes": len(nodes),
+            "batches": len(batches),
+            "batches_resumed": sum(resumed),
+            "tokens": embedded_tokens,
+            "seconds": round(elapsed_time, 3),
+            "nodes_per_sec": round(embedded_nodes / elapsed_time, 1) if elapsed_time else None,
+            "tokens_per_sec": round(embedded_tokens / elapsed_time, 1) if elapsed_time else None,
+        }
+
+        embeddings = [embedding for batch in batch_embeddings for embedding in batch]
+        return {node.node_id: embedding for node, embedding in zip(nodes, embeddings)}
+
+    async def embed_batches(self, batches, show_progress=False):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = self.rate_limiter.bucket(self.provider)
+        resumed = [False] * len(batches)
+        completed = 0
+
+        async def embed_batch(position, batch):
+            nonlocal completed
+            checkpoint = self.store.get("embedding_batches", self.checkpoint_keys[position])
+            if checkpoint is not None:
+                resumed[position] = True
+                return checkpoint
+            async with semaphore:
+                # One request per batch: aget_text_embedding_batch would split it
+                # again by the model's own embed_batch_size
+                embeddings = await call_with_retries(
+                    lambda: self.embedding_model._aget_text_embeddings(batch), bucket
+                )
+            self.store.put("embedding_batches", self.checkpoint_keys[position], embeddings)
+            completed += 1
+            if show_progress:
+                print(f"Embedded batch {completed}/{len(batches)} ({len(batch)} texts)")
+            return embeddings
+
+        batch_embeddings = await asyncio.gather(*(embed_batch(position, batch) for position, batch in enumerate(batches)))
+        return batch_embeddings, resumed
+
+    def discard_checkpoints(self):
+        """Removes the batch checkpoints of the last ``embed`` call, once its results are saved."""
+        for key in self.checkpoint_keys:
+            self.store.remove("embedding_batches", key)
+        self.checkpoint_keys = []
@@ -1,11 +1,9 @@
-from script import load, run_query
+from backend import Backend, load_config
+from rate_limit import ProviderRateLimiter, call_with_retries
+from results_log import append_result, export_results, load_result_index, log_path_for
+import asyncio
 import os
 import pickle
-from deepeval import evaluate
-from deepeval.metrics import AnswerRelevancyMetric
-from deepeval.metrics import FaithfulnessMetric
-from deepeval.test_case import LLMTestCase
-import matplotlib.pyplot as plt
 import json
 import re
 import hashlib
@@ -56,6 +54,9 @@ def plot_test_results(parsed_results):
     Plot test case results as a bar chart.
     :param parsed_results: List of dictionaries containing test case names and metrics.
     """
+    # Only plotting needs matplotlib, so it is not imported with this module
+    import matplotlib.pyplot as plt
+
     # Extract data for plotting
     test_names = [result["test_name"] for result in parsed_results]
     scores = [result["metrics"][0]["score"] if result["metrics"] else 0 for result in parsed_results]
@@ -139,55 +140,96 @@ def generate_query_id(query, document_choice):
     unique_str = f"{document_choice}:{query}"
     return hashlib.md5(unique_str.encode()).hexdigest()
 
-def append_to_json_file(new_data, file_path):
+async def answer_queries(loaded_data, cache_data, backend, document_choice, bucket, max_concurrency):
     """
-    Appends new data to an existing JSON file or creates the file if it doesn't exist.
-    :param new_data: List of new data dictionaries to append.
-    :param file_path: Path to the JSON file.
+    Answers every uncached query concurrently and stores the results in cache_data.
+    :param loaded_data: Dict of query id to test question.
+    :param cache_data: Dict of query id to (answer, context), updated in place.
+    :param backend: Backend with a warm engine for the document.
+    :param bucket: Token bucket of the LLM provider used for synthesis.
+    :param max_concurrency: Maximum number of queries in flight.
+    :return: The number of queries that were answered.
     """
-    # Check if the file exists
-    if os.path.exists(file_path):
-        # Load existing data
-        with open(file_path, "r") as json_file:
-            try:
-                existing_data = json.load(json_file)
-            except json.JSONDecodeError:
-                existing_data = []  # If the file is empty or corrupted, start fresh
-    else:
-        existing_data = []
-
-    # Append the new data
-    existing_data.append(new_data)
-
-    # Write back to the JSON file
-    with open(file_path, "w") as json_file:
-        json.dump(existing_data, json_file, indent=4)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending = [query_id for query_id in loaded_data if query_id not in cache_data]
+
+    async def answer(query_id):
+        async with semaphore:
+            result = await call_with_retries(
+                lambda: backend.aquery(loaded_data[query_id]['query'], document_choice),
+                bucket=bucket,
+            )
+        cache_data[query_id] = (result["response"], result["retrieval_context"])  # Cache the result
+        print(f"Generated result for query id: {query_id}")
+
+    await asyncio.gather(*(answer(query_id) for query_id in pending))
+    return len(pending)
+
+async def score_test_cases(tests, loaded_data, cache_data, metric_factory, results_log, bucket, max_concurrency):
+    """
+    Scores test cases concurrently, appending each result to the results log in test order.
+    :param tests: Dict of query id to LLMTestCase, in the order results should be written.
+    :param metric_factory: Callable returning a fresh metric; each test case gets its own instance.
+    :param bucket: Token bucket of the evaluation model's provider.
+    :param max_concurrency: Maximum number of metric calls in flight.
+    :return: The number of test cases that were scored.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    query_ids = list(tests)
+    scores = {}
+    next_to_write = 0
+
+    def flush():
+        # Results are written as soon as every earlier test is done, so the file order never depends on timing
+        nonlocal next_to_write
+        while next_to_write < len(query_ids) and query_ids[next_to_write] in scores:
+            q_id = query_ids[next_to_write]
+            next_to_write += 1
+            answer, context = cache_data[q_id]
+            print(f"Query : {loaded_data[q_id]['query']} \nAnswer: {answer} \nExpected Answer: {loaded_data[q_id]['expected_answer']} \nScore: {scores[q_id]}")
+            append_result({
+            "Query ID": q_id,
+            "Query": loaded_data[q_id]['query'],
+            "Answer": answer,
+            "Expected Answer": loaded_data[q_id]['expected_answer'],
+            "Score": scores[q_id]
+            }, results_log)
+
+    async def score(q_id):
+        metric = metric_factory()
+        async with semaphore:
+            await call_with_retries(lambda: metric.a_measure(tests[q_id]), bucket=bucket)
+        scores[q_id] = metric.score
+        flush()
+
+    await asyncio.gather(*(score(q_id) for q_id in query_ids))
+    return len(query_ids)
 
-    print(f"Data appended to {file_path}")
-    
 tests = {}
-def runEvaluation(metric_name: str):
-    results = []
-    
+def runEvaluation(metric_name: str, max_concurrency=8):
     """
     Run evaluation with the specified metric.
     :param metric_name: Name of the metric to use (e.g., 'AnswerRelevancyMetric' or 'FaithfulnessMetric').
+    :param max_concurrency: Maximum number of queries or metric calls in flight at once.
     """
+    # deepeval is only needed once an evaluation runs
+    from deepeval.metrics import AnswerRelevancyMetric, FaithfulnessMetric
+    from deepeval.test_case import LLMTestCase
+
     # Map metric names to classes
     metric_mapping = {
-        "AnswerRelevancyMetric": lambda: AnswerRelevancyMetric(model="gpt-4o-mini", include_reason=True),
-        "FaithfulnessMetric": lambda: FaithfulnessMetric(model="gpt-4o-mini", include_reason=True)
+        "AnswerRelevancyMetric": lambda: AnswerRelevancyMetric(model="gpt-4o-mini", include_reason=True, async_mode=True),
+        "FaithfulnessMetric": lambda: FaithfulnessMetric(model="gpt-4o-mini", include_reason=True, async_mode=True)
     }
+    # Provider of the evaluation model above
+    metric_provider = "openai"
 
     # Check if the metric name is valid
     if metric_name not in metric_mapping:
         raise ValueError(f"Invalid metric name '{metric_name}'. Choose from: {list(metric_mapping.keys())}")
 
-    # Initialize the metric
-    metric = metric_mapping[metric_name]()
     document_choice = "./PANW-10Q-Oct2024.pdf"
     pkl_file = "./test_data_PANW.pkl"
-    test_cases = [] 
 
     save_to_cache = False
     # Define test cases
@@ -204,36 +246,31 @@ def runEvaluation(metric_name: str):
             cache_data = pickle.load(f)
     else:
         cache_data = {}
-        save_to_cache = True
 
-    existing_results = {}
-    
-    if os.path.exists(results_file):
-        with open(results_file, "r") as f:
-            existing_results = {entry["Query ID"]: entry for entry in json.load(f)}
-
-    retrieval_depth = 5
-    query_engine = load(document_choice, retrieval_depth, False)
-    document_name = os.path.splitext(os.path.basename(document_choice))[0]
-    #tests = {}
-    #counter = 1
+    results_log = log_path_for(results_file)
+    existing_results = load_result_index(results_log, results_file)
+
+    config = load_config("config.json")
+    # Paraphrased test questions (e.g. RSUs vs PSUs) must each be answered, never from another's cached answer
+    config["answer_cache"] = {"enabled": False}
+    rate_limiter = ProviderRateLimiter(config)
+    backend = Backend(config, retrieval_depth=5)
+
+    start_time = time.time()
+    if any(query_id not in cache_data for query_id in loaded_data):
+        # Built before the event loop starts, as ingest runs its own
+        backend.engine(document_choice)
+        answered = asyncio.run(answer_queries(
+            loaded_data, cache_data, backend, document_choice,
+            rate_limiter.bucket(config["llm"]["type"]), max_concurrency,
+        ))
+        save_to_cache = answered > 0
+        elapsed_time = time.time() - start_time
+        print(f"Answered {answered} queries in {elapsed_time:.2f}s ({60 * answered / elapsed_time:.1f} questions/min)")
+
     for query_id, content in loaded_data.items():
-        # if counter>3:
-        #     break
-        # counter = counter +1 
-        # Check if result is cached
-        if query_id in cache_data:
-            answer, context = cache_data[query_id]
-            
-            #print(f"QUERY: {content['query']} is:\nANSWER: {answer}")
-        else:
-            # Run query if not cached
-            answer, context = run_query(query=content['query'], query_engine=query_engine, document_name=document_name, retrieval_depth=retrieval_depth, verbose=False)
-            cache_data[query_id] = (answer, context)  # Cache the result
-            print(f"Generated result for query id: {query_id}")
-        
+        answer, context = cache_data[query_id]
         #Create the test case
-        
         test_case = LLMTestCase(input=content['query'], actual_output=answer, retrieval_context=context)
         q_id = generate_query_id(content['query'], document_choice)
         tests[q_id] = test_case  
@@ -243,28 +280,25 @@ def runEvaluation(metric_name: str):
             pickle.dump(cache_data, f)
             print(f"Cache of answers saved to {cache_file}")
 
-    #counter = 1
+    to_score = {}
     for q_id, t in tests.items():
-        # if counter>3:
-        #     break
-        # counter = counter +1 
         if q_id in existing_results:
-            print(f"Skipping query id: {q_id} (already in {cache_file})")
+            print(f"Skipping query id: {q_id} (already in {results_log})")
             continue
-            
-        time.sleep(1)
-        answer, context = cache_data[q_id]
-        
-        metric.measure(t)
-        print(f"Query : {loaded_data[q_id]['query']} \nAnswer: {answer} \nExpected Answer: {loaded_data[q_id]['expected_answer']} \nScore: {metric.score}")
-        
-        append_to_json_file({
-        "Query ID": q_id,
-        "Query": loaded_data[q_id]['query'],
-        "Answer": answer,
-        "Expected Answer": loaded_data[q_id]['expected_answer'],
-        "Score": metric.score
-        }, results_file)
+        to_score[q_id] = t
+
+    start_time = time.time()
+    scored = asyncio.run(score_test_cases(
+        to_score, loaded_data, cache_data, metric_mapping[metric_name], results_log,
+        rate_limiter.bucket(metric_provider), max_concurrency,
+    ))
+    elapsed_time = time.time() - start_time
+    if scored:
+        print(f"Scored {scored} test cases in {elapsed_time:.2f}s ({60 * scored / elapsed_time:.1f} questions/min)")
+
+    # Compact the log into the diffable results_*.json layout
+    export_results(results_log, results_file)
+    print(f"Embedding cache: {backend.stats()['embedding_cache']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,375 @@
+import re
+import numpy as np
+from artifact_store import atomic_write
+
+# Many questions about a filing are point lookups ("What was the total revenue for
+# the quarter?") whose answer is one cell of a financial statement. At ingest the
+# markdown tables of the parsed document are flattened into facts keyed by
+# (statement, line item, period) and stored column by column in one .npz file. At
+# query time a rule-based classifier spots such lookups and answers them from the
+# facts, skipping embedding, retrieval and synthesis; anything it is unsure about
+# (comparisons, explanations, ambiguous line items) goes through the RAG path.
+
+FACT_COLUMNS = ["statement", "section", "line_item", "period", "unit", "text"]
+
+# Questions asking for more than one figure, or for reasoning about figures
+NARRATIVE_PATTERN = re.compile(
+    r"\b(why|how (?:did|does|do|has|have|is|are|was|were|will|would|could)|explain|describe|discuss|compare[ds]?|comparison|"
+    r"change[ds]?|increase[ds]?|decrease[ds]?|grow(?:th|n)?|trend|impact|affect|factors?|drivers?|reasons?|"
+    r"percent(?:age)?|margin|ratio|versus|vs|between|difference|prior|previous|last year|ago|year-over-year|each|"
+    r"breakdown|broken down|components?|sources|main|risks?|strateg(?:y|ies)|plans?|expects?|outlook|guidance)\b"
+)
+LOOKUP_PATTERN = re.compile(r"^\s*(what (?:is|was|were|are)|how (?:much|many)|give|tell|state|report)\b")
+
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+DURATIONS = {"three": "three months", "six": "six months", "nine": "nine months", "twelve": "twelve months"}
+
+# Phrases spelled differently in questions and statements
+QUERY_SYNONYMS = [
+    (re.compile(r"\bcurrent (?=quarter|period|fiscal|year)"), ""),
+    (re.compile(r"\b(?:eps|earnings per share)\b"), "net income per share"),
+    (re.compile(r"\br&d\b"), "research and development"),
+    (re.compile(r"\bsg&a\b"), "selling general and administrative"),
+    (re.compile(r"\bquarter(?:ly)?\b"), "three months"),
+]
+
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "in", "on", "to", "by", "as", "at", "from", "with", "its", "their",
+    "what", "is", "was", "were", "are", "how", "much", "many", "did", "does", "do", "give", "tell", "state", "report",
+    "reported", "company", "companys", "have", "has", "had", "period", "amount", "value", "figure", "end", "ended",
+    "ending", "during", "latest", "this", "that", "recent", "most", "fiscal", "year", "months", "month", "quarter",
+}
+PERIOD_WORDS = set(MONTHS) | set(DURATIONS)
+# Optional in a line item: "Total revenues" answers "What was the revenue?"
+OPTIONAL_ITEM_WORDS = {"total", "net"}
+
+PRIMARY_STATEMENTS = ("balance sheet", "statements of operations", "statements of income", "comprehensive income", "cash flows")
+
+def statement_rank(statement):
+    """Position of a primary financial statement in PRIMARY_STATEMENTS, or None for notes and other tables."""
+    statement = statement.lower()
+    return next((rank for rank, name in enumerate(PRIMARY_STATEMENTS) if name in statement), None)
+
+def words(text):
+    """Lowercased words of a text with a plural "s" removed, so "Revenues" matches "revenue"."""
+    return [
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in re.findall(r"[a-z]+", text.lower().replace("’", "").replace("'", ""))
+    ]
+
+def content_words(text):
+    return {word for word in words(text) if word not in STOPWORDS and word not in PERIOD_WORDS}
+
+def parse_amount(cell):
+    """Parses a table cell such as "$ 2,138.8", "(92)" or "12.5 %" into a float, or None."""
+    text = cell.replace("$", "").replace(",", "").replace("%", "").replace(" ", "").strip()
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()")
+    if not re.fullmatch(r"-?\d+(?:\.\d+)?", text):
+        return None
+    return -float(text) if negative else float(text)
+
+def period_duration(period):
+    """The duration of a lowercased period, e.g. "nine months" or "year", or None for a balance sheet date."""
+    duration = next((duration for duration in DURATIONS.values() if duration in period), None)
+    if duration is None and re.search(r"\b(?:fiscal )?years? ended\b", period):
+        return "year"
+    return duration
+
+def table_cells(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+def is_header_row(cells):
+    """A row of column headings below the separator: no label, and only dates or words in its cells."""
+    if cells[0] and not cells[0].startswith("("):
+        return False
+    return all(not cell or YEAR_PATTERN.fullmatch(cell) or parse_amount(cell) is None for cell in cells[1:])
+
+def column_periods(header_rows, num_columns):
+    """
+    Joins the header cells above each column into its period, e.g. "Three Months Ended October 31, 2024".
+
+    Headings spanning several columns are repeated or left blank to their right
+    by the parser; blanks are filled from the left in all but the last header row.
+    Columns whose period has no year (labels, "Change", "%") have no period.
+    """
+    periods = [[] for _ in range(num_columns)]
+    for row_number, cells in enumerate(header_rows):
+        last_row = row_number == len(header_rows) - 1
+        previous = ""
+        for column in range(1, num_columns):
+            cell = cells[column] if column < len(cells) else ""
+            if not cell and not last_row:
+                cell = previous
+            previous = cell
+            if cell and (not periods[column] or periods[column][-1] != cell):
+                periods[column].append(cell)
+    joined = [" ".join(parts) for parts in periods]
+    return [
+        period if column > 0 and YEAR_PATTERN.search(period) and "change" not in period.lower() else None
+        for column, period in enumerate(joined)
+    ]
+
+def statement_heading(line):
+    """The title a heading line gives the tables below it, or None for boilerplate headings."""
+    title = line.lstrip("#").strip()
+    if not title or title.startswith("(") or title.lower() in ("table of contents", "index"):
+        return None
+    return title
+
+def unit_of(text):
+    match = re.search(r"in (thousands|millions|billions)", text.lower())
+    return match.group(1) if match else None
+
+def extract_facts(docs, separator="\n---\n"):
+    """
+    Flattens the markdown tables of parsed documents into facts.
+
+    Each numeric cell under a dated column heading becomes one fact: the statement
+    (the nearest heading above the table), the section (the last label row without
+    figures, such as "Operating expenses", up to its total), the line item, the period, the unit
+    ("millions" from "(in millions, except per share data)") and the cell text.
+
+    Returns:
+        dict: FACT_COLUMNS plus "value" and "page", one entry per fact.
+    """
+    facts = {column: [] for column in FACT_COLUMNS + ["value", "page"]}
+    page = 0
+    for doc in docs:
+        # A statement can continue on the next page under no heading of its own
+        statement, unit = "", None
+        for page_text in doc.text.split(separator):
+            lines = page_text.split("\n")
+            position = 0
+            while position < len(lines):
+                line = lines[position].strip()
+                position += 1
+                if line.startswith("#"):
+                    title = statement_heading(line)
+                    if title is not None and unit_of(title) is None:
+                        statement, unit = title, None
+                if unit_of(line):
+                    unit = unit_of(line)
+                if not (line.startswith("|") and position < len(lines) and lines[position].strip().startswith("|---")):
+                    continue
+
+                # A table: its heading row, the separator, then more heading rows and the body
+                header_rows = [table_cells(line)]
+                position += 1
+                while position < len(lines) and lines[position].strip().startswith("|") and is_header_row(table_cells(lines[position])):
+                    header_rows.append(table_cells(lines[position]))
+                    position += 1
+                num_columns = max(len(cells) for cells in header_rows)
+                periods = column_periods(header_rows, num_columns)
+                table_unit = unit_of(" ".join(header_rows[0])) or unit
+                section = ""
+                while position < len(lines) and lines[position].strip().startswith("|"):
+                    cells = table_cells(lines[position])
+                    position += 1
+                    label = cells[0].rstrip(":").strip()
+                    values = [(column, parse_amount(cell)) for column, cell in enumerate(cells) if column > 0 and cell]
+                    if label and not values:
+                        section = label
+                        continue
+                    for column, value in values:
+                        if value is None or column >= len(periods) or periods[column] is None or not label:
+                            continue
+                        for key, entry in zip(FACT_COLUMNS + ["value", "page"],
+                                              [statement, section, label, periods[column], table_unit or "", cells[column], value, page]):
+                            facts[key].append(entry)
+                    if label.lower().startswith("total"):
+                        # "Total operating expenses" closes the "Operating expenses" section
+                        section = ""
+            page += 1
+    return facts
+
+def classify_query(query):
+    """Returns "lookup" for a question asking for a single reported figure, "other" otherwise."""
+    text = query.lower()
+    if not LOOKUP_PATTERN.search(text) or NARRATIVE_PATTERN.search(text):
+        return "other"
+    return "lookup"
+
+class FinancialFacts:
+    """
+    The facts of a document's tables, stored as columns (see extract_facts).
+
+    Line items are matched against a question by their words: every word of a
+    line item except "total" and "net" must appear in the question, and the
+    section and statement words it also mentions rank the candidates. The
+    question's dates and durations ("quarter", "nine months", "October 31, 2024")
+    select the period; the first fitting column (the latest period) is used, unless
+    the fitting columns cover several durations and the question names none.
+    """
+
+    def __init__(self, columns, value, page):
+        self.columns = columns
+        self.value = value
+        self.page = page
+        # Facts grouped by (statement, section, line item), in document order
+        self.rows = {}
+        for position, key in enumerate(zip(columns["statement"], columns["section"], columns["line_item"])):
+            self.rows.setdefault(tuple(str(part) for part in key), []).append(position)
+        self.row_words = {
+            key: (content_words(key[2]), content_words(key[1]), content_words(key[0]))
+            for key in self.rows
+        }
+        # Line items such as "Basic" or "Inventory" that a statement lists under several sections
+        sections = {}
+        for statement, section, line_item in self.rows:
+            sections.setdefault((statement, line_item), set()).add(section)
+        self.repeated_items = {key for key, item_sections in sections.items() if len(item_sections) > 1}
+
+    def __len__(self):
+        return len(self.value)
+
+    @classmethod
+    def build(cls, docs):
+        facts = extract_facts(docs)
+        return cls(
+            {column: np.array(facts[column], dtype=str) for column in FACT_COLUMNS},
+            np.array(facts["value"], dtype=np.float64),
+            np.array(facts["page"], dtype=np.int32),
+        )
+
+    def save(self, facts_path):
+        """Saves the columns as one uncompressed .npz file, atomically."""
+        atomic_write(facts_path, lambda f: np.savez(f, value=self.value, page=self.page, **self.columns))
+
+    @classmethod
+    def load(cls, facts_path):
+        with np.load(facts_path) as arrays:
+            return cls({column: arrays[column] for column in FACT_COLUMNS}, arrays["value"], arrays["page"])
+
+    def fact(self, position):
+        """The fact at a position, with a label naming its section when the line item alone is ambiguous."""
+        fact = {
+            **{column: str(self.columns[column][position]) for column in FACT_COLUMNS},
+            "value": float(self.value[position]),
+            "page": int(self.page[position]),
+        }
+        fact["label"] = fact["line_item"]
+        if fact["section"] and (fact["statement"], fact["line_item"]) in self.repeated_items:
+            fact["label"] = f"{fact['line_item']} {fact['section'][0].lower()}{fact['section'][1:]}"
+        return fact
+
+    def period_position(self, positions, query_text):
+        """
+        The first of a line item's facts whose period fits the question's dates and duration, or None.
+
+        None is also returned when the question names no duration and the fitting
+        periods have several: "net income in 2024" may be the quarter or the nine months.
+        """
+        years = set(YEAR_PATTERN.findall(query_text))
+        months = [month for month in MONTHS if month in query_text]
+        durations = [DURATIONS[word] for word in DURATIONS if f"{word} months" in query_text]
+        periods = [str(self.columns["period"][position]).lower() for position in positions]
+        # A balance sheet date has no duration; only filter by one where the line item has them
+        has_durations = any("months" in period for period in periods)
+        if has_durations and "as of" in query_text:
+            return None
+        fitting = []
+        for position, period in zip(positions, periods):
+            if years and not any(year in period for year in years):
+                continue
+            if months and not any(month in period for month in months):
+                continue
+            if durations and has_durations and not any(duration in period for duration in durations):
+                continue
+            fitting.append((position, period))
+        if not fitting:
+            return None
+        if not durations and len({period_duration(period) for _, period in fitting}) > 1:
+            return None
+        return fitting[0][0]
+
+    def lookup(self, query):
+        """
+        Returns the fact answering a lookup question, or None to leave it to retrieval.
+
+        None is also returned when the question mentions words no line item explains
+        (more than one), or when the best matching line items disagree on the figure.
+        """
+        if classify_query(query) != "lookup":
+            return None
+        query_text = query.lower()
+        for pattern, replacement in QUERY_SYNONYMS:
+            query_text = pattern.sub(replacement, query_text)
+        query_words = content_words(query_text)
+        if not query_words:
+            return None
+
+        candidates = []
+        for key, (item_words, section_words, statement_words) in self.row_words.items():
+            required = item_words - OPTIONAL_ITEM_WORDS
+            if not required or not required <= query_words:
+                continue
+            if len(query_words - item_words - section_words - statement_words) > 1:
+                continue
+            statement_words = statement_words - item_words - section_words
+            score = len(item_words & query_words) + len(section_words & query_words) + 0.5 * len(statement_words & query_words)
+            candidates.append((score, key))
+        if not candidates:
+            return None
+
+        best_score = max(score for score, _ in candidates)
+        best = [key for score, key in candidates if score == best_score]
+        # The financial statements are preferred to the notes repeating their figures
+        primary = sorted(
+            (key for key in best if statement_rank(key[0]) is not None), key=lambda key: statement_rank(key[0])
+        )
+        best = primary or best
+        # Then the sections the question mentions least of, so "diluted EPS" prefers
+        # the per-share "Diluted" row to the weighted average shares one
+        unmentioned = {key: len(self.row_words[key][1] - query_words) for key in best}
+        best = [key for key in best if unmentioned[key] == min(unmentioned.values())]
+        positions = [self.period_position(self.rows[key], query_text) for key in best]
+        positions = [position for position in positions if position is not None]
+        if not positions or len({float(self.value[position]) for position in positions}) > 1:
+            return None
+        return self.fact(positions[0])
+
+def format_amount(fact):
+    """Writes a fact's figure with its unit, e.g. "$2,138.8 million" or "$0.68" for a per-share amount."""
+    text = fact["text"].replace("$", "").replace(" ", "")
+    sign = ""
+    if text.startswith("(") and text.endswith(")"):
+        sign, text = "-", text.strip("()")
+    context = f"{fact['section']} {fact['line_item']}".lower()
+    if "%" in text:
+        return sign + text
+    if "per share" in context:
+        return f"{sign}${text}"
+    scale = {"thousands": "thousand", "millions": "million", "billions": "billion"}.get(fact["unit"])
+    if scale is None:
+        return sign + text
+    if "shares" in context:
+        return f"{sign}{text} {scale} shares"
+    return f"{sign}${text} {scale}"
+
+def fact_answer(fact):
+    """Answers a question with a fact, naming its period and statement."""
+    return f"{fact['label']} was {format_amount(fact)} for {fact['period']} ({fact['statement']})."
+
+def fact_context(fact):
+    """The table row a fact comes from, as the retrieval context of a fast-path answer."""
+    unit = f" (in {fact['unit']})" if fact["unit"] else ""
+    return f"{fact['statement']}{unit}, page {fact['page'] + 1}: {fact['label']}, {fact['period']}: {fact['text']}"
+
+def open_financial_facts(store, parsed_key, load_docs, verbosity=False):
+    """
+    Returns the facts of a parsed document, extracting and saving them on first use.
+
+    They are stored in the artifact store's "financial_facts" layer, keyed by the
+    parsed layer's key; ``load_docs`` is only called when they are not there yet.
+    """
+    facts_key = store.key("financial_facts", parsed_key)
+    facts_path = store.path("financial_facts", facts_key, extension=".npz")
+    if store.contains("financial_facts", facts_key, extension=".npz"):
+        return FinancialFacts.load(facts_path)
+    facts = FinancialFacts.build(load_docs())
+    if verbosity:
+        print(f"Extracted {len(facts)} financial facts from {len(facts.rows)} table rows")
+    facts.save(facts_path)
+    return facts
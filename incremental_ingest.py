@@ -0,0 +1,105 @@
+import numpy as np
+from llama_index.core import Document
+from llama_index.core.schema import TextNode
+from artifact_store import text_hash
+from embedding_matrix import load_embedding_matrix
+from table_summaries import SummaryCachingMarkdownElementNodeParser, TableSummarizer
+from node_metadata import set_shared_metadata
+
+# Incremental ingest works page by page instead of on the whole document, so an
+# amended filing only pays for the pages that changed:
+#   - element nodes are cached per (page text hash, LLM),
+#   - page nodes are keyed by page number and page text hash, so repeated pages
+#     (cover pages, blank separators) each keep a page node of their own,
+#   - table summaries are cached per (table text hash, LLM) by the table
+#     summarization stage (see table_summaries.py), so an unchanged table on an
+#     edited page is not summarized again,
+#   - embeddings of nodes that survive are copied from the document's previous matrix.
+
+def split_pages(docs, separator="\n---\n"):
+    """Splits parsed documents into (page text, document metadata) pairs."""
+    return [(page_text, doc.metadata) for doc in docs for page_text in doc.text.split(separator)]
+
+def page_node_id(page_number, page_hash):
+    """Node id of a page node: stable while the page keeps its number and its text."""
+    return f"page-{page_number}-{page_hash[:16]}"
+
+def build_nodes_incrementally(docs, model, store, separator="\n---\n", table_summarizer=None):
+    """
+    Builds base, table and page nodes page by page, reusing cached pages.
+
+    Tables of changed pages are summarized by ``table_summarizer`` (a TableSummarizer).
+    A page repeated with identical text gets its own page node, but its element
+    nodes are only added once.
+
+    Returns:
+        tuple: The element nodes (base nodes, then tables, as in a full ingest),
+            the page nodes and a dict of reuse counts.
+    """
+    if table_summarizer is None:
+        table_summarizer = TableSummarizer(model, store)
+    node_parser = SummaryCachingMarkdownElementNodeParser(table_summarizer)
+    base_nodes, objects, page_nodes = [], [], []
+    reused_pages = 0
+    seen_pages = set()
+    pages = split_pages(docs, separator)
+    for page_number, (page_text, metadata) in enumerate(pages):
+        page_hash = text_hash(page_text)
+        page_node = TextNode(id_=page_node_id(page_number, page_hash), text=page_text)
+        set_shared_metadata(page_node, metadata)
+        page_nodes.append(page_node)
+
+        page_key = store.key("page_nodes", page_hash, {"llm": model.model})
+        if page_key in seen_pages:
+            # The elements of identical pages (e.g. blank ones) would otherwise repeat node ids
+            reused_pages += 1
+            continue
+        seen_pages.add(page_key)
+        page_record = store.get("page_nodes", page_key)
+        if page_record is None:
+            nodes = node_parser.get_nodes_from_documents([Document(text=page_text, metadata=metadata)])
+            page_record = node_parser.get_nodes_and_objects(nodes)
+            store.put("page_nodes", page_key, page_record)
+        else:
+            reused_pages += 1
+        # Records written by earlier versions also hold a page node, which is rebuilt above
+        page_base_nodes, page_objects = page_record[:2]
+        base_nodes += page_base_nodes
+        objects += page_objects
+
+    stats = {
+        "pages_reused": reused_pages,
+        "pages_recomputed": len(pages) - reused_pages,
+        "table_summaries_reused": table_summarizer.stats["summaries_reused"],
+        "table_summaries_recomputed": table_summarizer.stats["summaries_requested"],
+    }
+    return base_nodes + objects, page_nodes, stats
+
+def embed_incrementally(combined_nodes, embedding_pipeline, previous_matrix_path=None, show_progress=False):
+    """
+    Embeds nodes with an EmbeddingPipeline, copying the embeddings of nodes that were in the previous matrix.
+
+    Nodes that are no longer present are dropped simply by not being carried over.
+
+    Returns:
+        tuple: Node id to embedding dict and a dict of reuse counts.
+    """
+    embeddings = {}
+    previous_ids = []
+    if previous_matrix_path is not None:
+        previous_matrix, previous_ids = load_embedding_matrix(previous_matrix_path)
+        current_ids = {node.node_id for node in combined_nodes}
+        for row, node_id in enumerate(previous_ids):
+            if node_id in current_ids:
+                embeddings[node_id] = np.asarray(previous_matrix[row])
+
+    missing = [node for node in combined_nodes if node.node_id not in embeddings]
+    if missing:
+        embeddings.update(embedding_pipeline.embed(missing, show_progress=show_progress))
+
+    stats = {
+        "embeddings_reused": len(combined_nodes) - len(missing),
+        "embeddings_recomputed": len(missing),
+        "nodes_removed": len(set(previous_ids) - {node.node_id for node in combined_nodes}),
+    }
+    return embeddings, stats
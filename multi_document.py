@@ -0,0 +1,168 @@
+import re
+import math
+import contextvars
+import numpy as np
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from embedding_matrix import normalize_rows
+from node_metadata import set_shared_metadata
+
+# Several filings behind one retriever. Each document keeps its own memory-mapped
+# matrix, so together they form one vector structure partitioned by document id:
+# filtering by document selects partitions before anything is scored, and the
+# router keeps a query to the few filings it is about. Per-query cost then grows
+# with the routed documents rather than with the whole corpus, and node text is
+# only loaded for documents that have actually been retrieved from.
+
+DEFAULT_MAX_ROUTED_DOCUMENTS = 3
+
+# The documents the latest query was answered from, per thread or asyncio task:
+# one cached retriever serves concurrent queries
+routed_documents = contextvars.ContextVar("routed_documents", default=None)
+
+def name_tokens(document_name):
+    """Returns the words of a document name that can identify it in a question, e.g. "tsla"."""
+    return {token for token in re.findall(r"[a-z]+", document_name.lower()) if len(token) >= 3}
+
+class MultiDocumentIndex:
+    """
+    Read-only vector index over the embedding matrices of many documents.
+
+    ``documents`` maps each document name to an EmbeddingMatrixIndex, typically
+    created with ``load_nodes`` so its nodes stay on disk until first retrieved.
+    Each document is summarized for routing by its centroid, the normalized mean
+    of its rows.
+    """
+
+    def __init__(self, documents, max_routed_documents=DEFAULT_MAX_ROUTED_DOCUMENTS):
+        self.documents = dict(documents)
+        self.names = list(self.documents)
+        self.max_routed_documents = max_routed_documents
+        self.centroids = normalize_rows(np.vstack([document_centroid(self.documents[name]) for name in self.names]))
+
+        # Name words shared by every document (e.g. "10q") do not tell them apart
+        tokens = {name: name_tokens(name) for name in self.names}
+        shared = set.intersection(*tokens.values()) if len(tokens) > 1 else set()
+        self.name_tokens = {name: document_tokens - shared for name, document_tokens in tokens.items()}
+
+    @property
+    def artifact_key(self):
+        """Changes whenever any document's embeddings change."""
+        return "+".join(self.documents[name].artifact_key for name in sorted(self.names))
+
+    def route(self, query, query_embedding):
+        """
+        Picks the documents a query should be answered from.
+
+        Documents named in the query ("Compare TSLA and PANW revenue") are used
+        as is. Otherwise the documents whose centroids are closest to the query
+        are chosen, at most ``max_routed_documents`` of them.
+        """
+        words = set(re.findall(r"[a-z]+", query.lower()))
+        mentioned = [name for name in self.names if self.name_tokens[name] & words]
+        if mentioned:
+            return mentioned
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        scores = self.centroids @ query
+        order = np.argsort(-scores, kind="stable")[: self.max_routed_documents]
+        return [self.names[position] for position in order]
+
+    def top_k(self, query_embedding, k, documents=None, per_document=False):
+        """
+        Returns the (document name, row, score) of the k most similar rows, best first.
+
+        Only the rows of ``documents`` (all documents when None) are scored. With
+        ``per_document``, each document contributes its ceil(k / n) best rows, so a
+        comparison across filings gets evidence from all of them.
+        """
+        documents = self.names if documents is None else documents
+        if not documents:
+            return []
+        per_document_k = math.ceil(k / len(documents)) if per_document else k
+        candidates = []
+        for name in documents:
+            positions, scores = self.documents[name].top_k(query_embedding, per_document_k)
+            candidates += [(name, int(position), float(score)) for position, score in zip(positions, scores)]
+        candidates.sort(key=lambda candidate: -candidate[2])
+        return candidates if per_document else candidates[:k]
+
+    def node(self, document_name, row):
+        """Returns the node of one row, tagged with its document."""
+        node = self.documents[document_name].nodes[row]
+        if "document" in node.metadata:
+            return node
+        # The stored node is shared by concurrent queries and single-document
+        # engines, so a shallow copy is tagged instead
+        tagged = node.model_copy()
+        set_shared_metadata(tagged, {**node.metadata, "document": document_name})
+        tagged.excluded_embed_metadata_keys = [*node.excluded_embed_metadata_keys, "document"]
+        return tagged
+
+    def as_retriever(self, embed_model, similarity_top_k=5, **kwargs):
+        """Returns a routing retriever over this index, mirroring VectorStoreIndex.as_retriever."""
+        return MultiDocumentRetriever(self, embed_model, similarity_top_k=similarity_top_k, **kwargs)
+
+def document_centroid(index):
+    """Returns the mean of a document's normalized embedding rows."""
+    return np.asarray(index.matrix.mean(axis=0), dtype=np.float32)
+
+class MultiDocumentRetriever(BaseRetriever):
+    """
+    Retriever over a MultiDocumentIndex.
+
+    ``document_filter`` restricts retrieval to the given documents; without one,
+    each query is routed (see MultiDocumentIndex.route). Either way documents
+    are selected before any rows are scored.
+    """
+
+    def __init__(self, index, embed_model, similarity_top_k=5, document_filter=None, verbose=False, callback_manager=None):
+        self._index = index
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        self._document_filter = list(document_filter) if document_filter else None
+        super().__init__(callback_manager=callback_manager, verbose=verbose)
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def embed_model(self):
+        return self._embed_model
+
+    @property
+    def similarity_top_k(self):
+        return self._similarity_top_k
+
+    @property
+    def last_documents(self):
+        """The documents the most recent query in this thread or asyncio task was answered from."""
+        return routed_documents.get() or []
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        if self._document_filter is not None:
+            documents = self._document_filter
+        else:
+            documents = self._index.route(query_bundle.query_str, query_bundle.embedding)
+        routed_documents.set(documents)
+        if self._verbose:
+            print(f"Retrieving from: {', '.join(documents)}")
+        results = self._index.top_k(
+            query_bundle.embedding, self._similarity_top_k, documents, per_document=len(documents) > 1
+        )
+        return [
+            NodeWithScore(node=self._index.node(name, row), score=score)
+            for name, row, score in results
+        ]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = await self._embed_model.aget_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return self._retrieve(query_bundle)
@@ -0,0 +1,235 @@
+import zlib
+import numpy as np
+from typing import Any, Dict, List, Optional
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import IndexNode, NodeRelationship, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+from bm25_index import tokenize
+
+# Ingest indexes element nodes (text blocks and tables) and a whole-page node for
+# every page, so each span of a filing would be embedded twice. Deduplication,
+# selected with the "dedup" section of config.json:
+#   - links every element to the page that contains it (PARENT / CHILD relationships),
+#   - keeps pages whose text is covered by their elements out of the index; they are
+#     stored as parents so a page can still be returned as context,
+#   - drops near-duplicate nodes (repeated boilerplate, blank pages), found with
+#     MinHash signatures and confirmed by the exact Jaccard similarity of their shingles.
+
+DEFAULT_DEDUP_CONFIG = {
+    "enabled": False,
+    "similarity_threshold": 0.9,
+    "containment_threshold": 0.5,
+    "coverage_threshold": 0.8,
+    "return_parents": False,
+}
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+BANDS = 16
+MERSENNE_PRIME = (1 << 61) - 1
+
+def dedup_config_with_defaults(dedup_config=None):
+    """Fills in the defaults for the "dedup" section of the config."""
+    return {**DEFAULT_DEDUP_CONFIG, **(dedup_config or {})}
+
+def dedup_settings(dedup_config):
+    """Returns the settings that change the deduplicated nodes, for artifact store keys, or None when disabled."""
+    if not dedup_config["enabled"]:
+        return None
+    return {key: dedup_config[key] for key in ["similarity_threshold", "containment_threshold", "coverage_threshold"]}
+
+def matching_text(node):
+    """The text a node is matched on: the table itself for table nodes, rather than its LLM summary."""
+    if isinstance(node, IndexNode) and node.obj is not None and hasattr(node.obj, "get_content"):
+        text = node.obj.get_content()
+        # The table node's text is the summary followed by the table
+        return text[len(node.text):] if text.startswith(node.text) else text
+    return node.get_content()
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Returns the set of hashed word ``size``-grams of a text; short texts are one shingle."""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))} if tokens else set()
+    return {zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8")) for i in range(len(tokens) - size + 1)}
+
+def mod_mersenne(x):
+    """Reduces uint64 values modulo MERSENNE_PRIME, using 2**61 = 1 (mod 2**61 - 1)."""
+    prime = np.uint64(MERSENNE_PRIME)
+    x = (x & prime) + (x >> np.uint64(61))
+    # Subtracts the prime only where needed, so nothing wraps below zero
+    return x - (x >= prime).astype(np.uint64) * prime
+
+def mul_mod_mersenne(a, values):
+    """
+    Returns ``a * values`` modulo MERSENNE_PRIME without overflowing uint64.
+
+    ``a`` (below the prime) is split into 32-bit halves and ``values`` must be
+    32-bit, so every partial product fits: a * v = hi * v * 2**32 + lo * v, and
+    with hi * v = t = t_hi * 2**29 + t_lo, t * 2**32 = t_hi + t_lo * 2**32 (mod p).
+    """
+    mask32, mask29 = np.uint64((1 << 32) - 1), np.uint64((1 << 29) - 1)
+    low = mod_mersenne((a & mask32) * values)
+    high = (a >> np.uint64(32)) * values
+    high = mod_mersenne((high >> np.uint64(29)) + ((high & mask29) << np.uint64(32)))
+    return mod_mersenne(low + high)
+
+def minhash_signatures(shingle_sets, num_permutations=NUM_PERMUTATIONS, seed=0):
+    """
+    Returns a (len(shingle_sets), num_permutations) array of MinHash signatures.
+
+    Each permutation is the universal hash (a * shingle + b) mod (2**61 - 1),
+    with a and b drawn over the whole field.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    signatures = np.full((len(shingle_sets), num_permutations), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for row, shingle_set in enumerate(shingle_sets):
+        if shingle_set:
+            values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+            signatures[row] = mod_mersenne(mul_mod_mersenne(a, values[:, None]) + b).min(axis=0)
+    return signatures
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second) if first or second else 1.0
+
+def near_duplicates(shingle_sets, candidates, threshold, bands=BANDS):
+    """
+    Finds the candidates that nearly duplicate an earlier candidate.
+
+    Candidates sharing a MinHash band are compared exactly; a pair with a Jaccard
+    similarity of at least ``threshold`` is a duplicate, and the later one is dropped.
+
+    Returns:
+        dict: Dropped position to the position of the node it duplicates.
+    """
+    signatures = minhash_signatures([shingle_sets[i] for i in candidates])
+    rows = signatures.shape[1] // bands
+    buckets = {}
+    duplicates = {}
+    for row, position in enumerate(candidates):
+        if not shingle_sets[position]:
+            continue
+        matches = set()
+        for band in range(bands):
+            bucket = buckets.setdefault((band, signatures[row, band * rows:(band + 1) * rows].tobytes()), [])
+            matches.update(bucket)
+            bucket.append(position)
+        for match in sorted(matches):
+            if match not in duplicates and jaccard(shingle_sets[position], shingle_sets[match]) >= threshold:
+                duplicates[position] = match
+                break
+    return duplicates
+
+def embedding_tokens(nodes):
+    """Tokens an embedding model is sent for the nodes."""
+    tokenizer = get_tokenizer()
+    return sum(len(tokenizer(node.get_content(metadata_mode="embed"))) for node in nodes)
+
+def deduplicate_nodes(element_nodes, page_nodes, dedup_config=None):
+    """
+    Links element nodes to their pages and removes overlapping nodes from the index.
+
+    An element belongs to the page holding at least ``containment_threshold`` of
+    its shingles. A page is left out of the index when its elements cover at least
+    ``coverage_threshold`` of its shingles. Of the remaining text nodes, those with
+    a Jaccard similarity of at least ``similarity_threshold`` to an earlier one are
+    dropped. Table summary nodes are never dropped.
+
+    Returns:
+        tuple: The nodes to index (in their original order), a dict of every page
+            by node id for use as parents, and a dict of before/after stats.
+    """
+    dedup_config = dedup_config_with_defaults(dedup_config)
+    nodes = list(element_nodes) + list(page_nodes)
+    num_elements = len(element_nodes)
+    shingle_sets = [shingles(matching_text(node)) for node in nodes]
+
+    # Which page contains each element, via an inverted index of page shingles.
+    # Elements too short for a full shingle are looked up in the page text instead.
+    page_texts = {page: " ".join(tokenize(nodes[page].get_content())) for page in range(num_elements, len(nodes))}
+    pages_by_shingle = {}
+    for page in range(num_elements, len(nodes)):
+        for shingle in shingle_sets[page]:
+            pages_by_shingle.setdefault(shingle, []).append(page)
+    children = {page: [] for page in range(num_elements, len(nodes))}
+    for element in range(num_elements):
+        tokens = tokenize(matching_text(nodes[element]))
+        if 0 < len(tokens) < SHINGLE_SIZE:
+            text = " ".join(tokens)
+            page = next((page for page, page_text in page_texts.items() if text in page_text), None)
+            if page is not None:
+                children[page].append(element)
+            continue
+        counts = {}
+        for shingle in shingle_sets[element]:
+            for page in pages_by_shingle.get(shingle, ()):
+                counts[page] = counts.get(page, 0) + 1
+        if not counts:
+            continue
+        page = max(counts, key=counts.get)
+        if counts[page] >= dedup_config["containment_threshold"] * len(shingle_sets[element]):
+            children[page].append(element)
+
+    covered_pages = set()
+    for page, page_children in children.items():
+        page_node = nodes[page]
+        for element in page_children:
+            nodes[element].relationships[NodeRelationship.PARENT] = page_node.as_related_node_info()
+            if isinstance(nodes[element], IndexNode) and hasattr(nodes[element].obj, "relationships"):
+                # Retrieval returns a table summary's table node in its place
+                nodes[element].obj.relationships[NodeRelationship.PARENT] = page_node.as_related_node_info()
+        if page_children:
+            page_node.relationships[NodeRelationship.CHILD] = [nodes[element].as_related_node_info() for element in page_children]
+        covered = set().union(*(shingle_sets[element] for element in page_children)) & shingle_sets[page]
+        if shingle_sets[page] and len(covered) >= dedup_config["coverage_threshold"] * len(shingle_sets[page]):
+            covered_pages.add(page)
+
+    candidates = [
+        position for position in range(len(nodes))
+        if position not in covered_pages and not isinstance(nodes[position], IndexNode)
+    ]
+    duplicates = near_duplicates(shingle_sets, candidates, dedup_config["similarity_threshold"])
+
+    indexed_nodes = [
+        node for position, node in enumerate(nodes)
+        if position not in covered_pages and position not in duplicates
+    ]
+    parents = {node.node_id: node for node in page_nodes}
+    stats = {
+        "nodes_before": len(nodes),
+        "nodes_after": len(indexed_nodes),
+        "pages_covered": len(covered_pages),
+        "near_duplicates": len(duplicates),
+        "elements_linked": sum(len(page_children) for page_children in children.values()),
+        "embedding_tokens_before": embedding_tokens(nodes),
+        "embedding_tokens_after": embedding_tokens(indexed_nodes),
+    }
+    return indexed_nodes, parents, stats
+
+class ParentPagePostprocessor(BaseNodePostprocessor):
+    """
+    Replaces retrieved elements with the page they belong to.
+
+    Several hits on the same page become one context chunk, scored by the best hit.
+    """
+
+    parents: Dict[str, Any]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ParentPagePostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        expanded = []
+        seen = set()
+        for node in nodes:
+            parent = node.node.relationships.get(NodeRelationship.PARENT)
+            page = self.parents.get(parent.node_id) if parent is not None else None
+            if page is None:
+                page = node.node
+            if page.node_id not in seen:
+                seen.add(page.node_id)
+                expanded.append(NodeWithScore(node=page, score=node.score))
+        return expanded
@@ -0,0 +1,91 @@
+import json
+import weakref
+import threading
+
+# Every node of a document carries the same metadata (file name, parser, ...),
+# and each used to get its own deepcopy, pickled separately into the nodes
+# artifact and unpickled into a separate dict on every load. Instead, all nodes
+# of a document reference one frozen, interned record:
+#   - pickle writes a record shared by many nodes once and references it after,
+#   - unpickling interns it again, so all loaded nodes (of every artifact that
+#     has the same metadata) share one dict in memory,
+#   - the record is read-only, so a change meant for one node cannot leak into
+#     every other node of the document. Set a new record instead.
+# The intern table only holds weak references: a record lives as long as some
+# node has it, so evicted engines and their documents' records are freed.
+
+def _frozen(self, *args, **kwargs):
+    raise TypeError("Node metadata is shared between nodes and read-only; assign a new record instead")
+
+class FrozenMetadata(dict):
+    """A read-only dict of node metadata, interned per process (see intern_metadata)."""
+
+    __setitem__ = __delitem__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+    __ior__ = _frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # Unpickled records are interned again rather than rebuilt per node
+        return intern_metadata, (dict(self),)
+
+_records = weakref.WeakValueDictionary()
+_records_lock = threading.Lock()
+
+def metadata_key(metadata):
+    """Canonical form of a metadata dict, equal for equal records."""
+    try:
+        key = tuple(sorted(metadata.items()))
+        hash(key)
+        return key
+    except TypeError:
+        # Unhashable values (lists, nested dicts)
+        return json.dumps(metadata, sort_keys=True, default=repr)
+
+def intern_metadata(metadata):
+    """Returns the single shared FrozenMetadata record equal to ``metadata``."""
+    key = metadata_key(metadata)
+    with _records_lock:
+        record = _records.get(key)
+        if record is None:
+            record = _records[key] = FrozenMetadata(metadata)
+        return record
+
+def interned_records():
+    """Number of distinct metadata records interned in this process and still referenced."""
+    return len(_records)
+
+def set_shared_metadata(node, metadata):
+    """
+    Points a node's metadata at the interned record equal to ``metadata``.
+
+    Nodes validate assignments (pydantic's validate_assignment), which would copy
+    the record into a new plain dict per node, so the field is set bypassing
+    validation. The record is a dict, so it still satisfies the field's type.
+    """
+    object.__setattr__(node, "metadata", intern_metadata(metadata))
+
+def share_relationship_metadata(node):
+    for related in node.relationships.values():
+        for info in related if isinstance(related, list) else [related]:
+            object.__setattr__(info, "metadata", intern_metadata(info.metadata))
+
+def share_metadata(nodes):
+    """
+    Interns the metadata of nodes and of their relationships in place. Returns the nodes.
+
+    The table node behind a table summary only has its relationships interned;
+    its own metadata (the table and its summary) is unique to it.
+    """
+    for node in nodes:
+        set_shared_metadata(node, node.metadata)
+        share_relationship_metadata(node)
+        obj = getattr(node, "obj", None)
+        if obj is not None and hasattr(obj, "relationships"):
+            share_relationship_metadata(obj)
+    return nodes
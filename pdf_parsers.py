@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from llama_index.core import Document
+
+# Parsers turn a PDF into markdown Documents whose pages are joined with
+# PAGE_SEPARATOR, which is what get_page_nodes splits on. Select one with the
+# "parser" section of config.json, e.g. {"type": "pdfplumber", "workers": 4}.
+PAGE_SEPARATOR = "\n---\n"
+
+def parse_with_llamaparse(file_path, parser_config):
+    """Parses a PDF to markdown with the LlamaParse cloud service."""
+    from llama_parse import LlamaParse
+
+    return LlamaParse(result_type="markdown").load_data(file_path)
+
+def parse_with_pdfplumber(file_path, parser_config):
+    """
+    Parses a PDF to markdown locally with pdfplumber, spreading pages over a process pool.
+
+    Tables are rendered as markdown pipe tables in their position on the page,
+    so MarkdownElementNodeParser still picks them out as table elements.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        num_pages = len(pdf.pages)
+    workers = parser_config.get("workers") or os.cpu_count() or 1
+    workers = max(1, min(workers, num_pages))
+
+    # Contiguous page ranges, one per worker, so each worker opens the file once
+    chunk_size = -(-num_pages // workers)
+    chunks = [list(range(start, min(start + chunk_size, num_pages))) for start in range(0, num_pages, chunk_size)]
+    if workers == 1:
+        pages = [page for chunk in chunks for page in parse_pages(file_path, chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pages = [page for chunk_pages in executor.map(parse_pages, [file_path] * len(chunks), chunks) for page in chunk_pages]
+
+    return [Document(
+        text=PAGE_SEPARATOR.join(pages),
+        metadata={"file_name": os.path.basename(file_path), "parser": "pdfplumber"},
+    )]
+
+def parse_pages(file_path, page_numbers):
+    """Converts the given (zero-based) pages of a PDF to markdown, one string per page."""
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(file_path) as pdf:
+        for page_number in page_numbers:
+            page = pdf.pages[page_number]
+            pages.append(page_to_markdown(page))
+            # Release the page's cached layout objects, they are not needed again
+            page.close()
+    return pages
+
+def page_to_markdown(page):
+    """Renders one pdfplumber page as text interleaved with markdown tables, top to bottom."""
+    tables = sorted(page.find_tables(), key=lambda table: table.bbox[1])
+    blocks = []
+    top = 0
+    for table in tables:
+        x0, table_top, x1, table_bottom = table.bbox
+        if table_top > top:
+            text = page.crop((0, top, page.width, table_top)).extract_text()
+            if text and text.strip():
+                blocks.append(text.strip())
+        markdown = table_to_markdown(table.extract())
+        if markdown:
+            blocks.append(markdown)
+        top = max(top, table_bottom)
+    if top < page.height:
+        text = page.crop((0, top, page.width, page.height)).extract_text()
+        if text and text.strip():
+            blocks.append(text.strip())
+    return "\n\n".join(blocks)
+
+def table_to_markdown(rows):
+    """Formats extracted table rows as a markdown pipe table, using the first row as the header."""
+    rows = [
+        [(cell or "").replace("\n", " ").replace("|", "\\|").strip() for cell in row]
+        for row in rows
+        if any(cell and cell.strip() for cell in row)
+    ]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * width]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+PARSERS = {
+    "llamaparse": parse_with_llamaparse,
+    "pdfplumber": parse_with_pdfplumber,
+}
+
+def parse_document(file_path, parser_config=None):
+    """Parses a PDF with the parser selected in the config (LlamaParse by default)."""
+    parser_config = parser_config or {}
+    parser_type = parser_config.get("type", "llamaparse").lower()
+    if parser_type not in PARSERS:
+        raise ValueError(f"Unsupported parser type: {parser_type}")
+    return PARSERS[parser_type](file_path, parser_config)
+
+def parser_settings(parser_config=None):
+    """Returns the parser settings that affect its output, for artifact store keys."""
+    parser_config = parser_config or {}
+    parser_type = parser_config.get("type", "llamaparse").lower()
+    if parser_type == "llamaparse":
+        return {"parser": "llamaparse", "result_type": "markdown"}
+    # The worker count does not change the output
+    return {"parser": parser_type}
@@ -0,0 +1,80 @@
+import random
+import asyncio
+import time as time
+
+# Requests per minute allowed per provider when config.json has no "rate_limits" entry for it
+DEFAULT_REQUESTS_PER_MINUTE = {
+    "openai": 500,
+    "gemini": 60,
+    "huggingface": 1000,
+    "replicate": 60,
+    "stub": 100000,
+}
+
+class TokenBucket:
+    """
+    Asyncio token bucket.
+
+    Tokens refill continuously at ``rate_per_minute / 60`` per second up to
+    ``burst``; ``acquire`` waits until enough tokens are available.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens=1):
+        """Waits until ``tokens`` tokens are available and takes them."""
+        # No lock needed: nothing is awaited between the check and the take
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+class ProviderRateLimiter:
+    """One token bucket per provider, sized from the "rate_limits" section of the config."""
+
+    def __init__(self, config=None):
+        self.limits = dict(DEFAULT_REQUESTS_PER_MINUTE)
+        for provider, limit in (config or {}).get("rate_limits", {}).items():
+            self.limits[provider.lower()] = limit["requests_per_minute"]
+        self.buckets = {}
+
+    def bucket(self, provider):
+        """Returns the token bucket of a provider."""
+        provider = provider.lower()
+        if provider not in self.buckets:
+            self.buckets[provider] = TokenBucket(self.limits.get(provider, 60))
+        return self.buckets[provider]
+
+def is_rate_limit_error(error):
+    """Checks whether an exception from a provider SDK is an HTTP 429 / quota error."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "resource exhausted" in message
+
+async def call_with_retries(make_call, bucket=None, max_retries=5, base_delay=1.0, max_delay=60.0):
+    """
+    Awaits ``make_call()``, retrying rate-limit errors with exponential backoff and jitter.
+
+    A fresh coroutine is created for each attempt, and each attempt first takes
+    a token from ``bucket`` when one is given. Other errors are raised at once.
+    """
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            return await make_call()
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
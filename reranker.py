@@ -0,0 +1,163 @@
+import re
+import asyncio
+import hashlib
+import threading
+import contextvars
+import time as time
+from collections import OrderedDict
+from typing import Any, List, Optional
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from pydantic import PrivateAttr
+from tracing import current_span, get_tracer
+
+# Two-stage retrieval: the retriever fetches a wide candidate set ("candidates" in
+# the "reranker" section of config.json) and a local cross-encoder re-scores it on
+# CPU, keeping the best "top_n" (by default the retrieval depth). Select with e.g.
+#   "reranker": {"type": "cross-encoder", "candidates": 20, "top_n": 5, "latency_budget_ms": 500}
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class CrossEncoderReranker(BaseNodePostprocessor):
+    """
+    Reranks retrieved nodes with a cross-encoder, keeping the ``top_n`` best.
+
+    (query, passage) pairs are scored ``batch_size`` at a time, in retrieval
+    order. Scores are cached per (query hash, node id), so a repeated question
+    costs no model calls. With a ``latency_budget_ms``, scoring stops after the
+    batch that crosses the budget and the unscored candidates follow the scored
+    ones in their retrieval order. The time spent in the last call in the
+    current thread or asyncio task is available as ``last_latency``.
+    """
+
+    model: str = DEFAULT_CROSS_ENCODER
+    top_n: int = 5
+    batch_size: int = 16
+    latency_budget_ms: Optional[float] = None
+    max_cached_scores: int = 100000
+
+    _cross_encoder: Any = PrivateAttr(default=None)
+    _scores: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+    _latency: Any = PrivateAttr(default=None)
+
+    def __init__(self, cross_encoder=None, **kwargs):
+        super().__init__(**kwargs)
+        self._cross_encoder = cross_encoder
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._latency = contextvars.ContextVar(f"rerank_latency_{id(self)}", default=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CrossEncoderReranker"
+
+    @property
+    def last_latency(self):
+        """Seconds spent reranking in the most recent call in this thread or asyncio task."""
+        return self._latency.get()
+
+    def score_pairs(self, pairs):
+        """Scores (query, passage) pairs with the cross-encoder, loading it on CPU on first use."""
+        if self._cross_encoder is None:
+            with self._lock:
+                if self._cross_encoder is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._cross_encoder = CrossEncoder(self.model, device="cpu")
+        return [float(score) for score in self._cross_encoder.predict(pairs, batch_size=self.batch_size)]
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        start_time = time.time()
+        with get_tracer().span("rerank", model=self.model, candidates=len(nodes), top_n=self.top_n):
+            reranked = self.rerank(nodes, query_bundle, start_time)
+        self._latency.set(time.time() - start_time)
+        return reranked
+
+    async def _apostprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        # Scoring runs in a worker thread; the latency is recorded in the calling task
+        start_time = time.time()
+        with get_tracer().span("rerank", model=self.model, candidates=len(nodes), top_n=self.top_n):
+            reranked = await asyncio.to_thread(self.rerank, nodes, query_bundle, start_time)
+        self._latency.set(time.time() - start_time)
+        return reranked
+
+    def rerank(self, nodes, query_bundle, start_time):
+        """Returns the ``top_n`` best nodes, scoring until the latency budget counted from ``start_time`` runs out."""
+        if query_bundle is None or not nodes:
+            return nodes[: self.top_n]
+
+        query_hash = hashlib.sha256(query_bundle.query_str.encode("utf-8")).hexdigest()
+        with self._lock:
+            scores = {
+                node.node.node_id: self._scores[(query_hash, node.node.node_id)]
+                for node in nodes
+                if (query_hash, node.node.node_id) in self._scores
+            }
+        missing = [node for node in nodes if node.node.node_id not in scores]
+        current_span().set(cache_hit=not missing, cached_scores=len(scores))
+
+        for start in range(0, len(missing), self.batch_size):
+            if self.latency_budget_ms is not None and (time.time() - start_time) * 1000 > self.latency_budget_ms:
+                break
+            batch = missing[start:start + self.batch_size]
+            batch_scores = self.score_pairs([
+                (query_bundle.query_str, node.node.get_content(metadata_mode=MetadataMode.EMBED)) for node in batch
+            ])
+            with self._lock:
+                for node, score in zip(batch, batch_scores):
+                    scores[node.node.node_id] = score
+                    self._scores[(query_hash, node.node.node_id)] = score
+                while len(self._scores) > self.max_cached_scores:
+                    self._scores.popitem(last=False)
+
+        scored = sorted(
+            (NodeWithScore(node=node.node, score=scores[node.node.node_id]) for node in nodes if node.node.node_id in scores),
+            key=lambda node: -node.score,
+        )
+        unscored = [node for node in nodes if node.node.node_id not in scores]
+        return (scored + unscored)[: self.top_n]
+
+class StubCrossEncoder:
+    """Offline stand-in for a cross-encoder: scores a pair by the share of query words in the passage."""
+
+    def predict(self, pairs, batch_size=16):
+        scores = []
+        for query, passage in pairs:
+            query_words = set(re.findall(r"\w+", query.lower()))
+            passage_words = set(re.findall(r"\w+", passage.lower()))
+            scores.append(len(query_words & passage_words) / len(query_words) if query_words else 0.0)
+        return scores
+
+def initialize_reranker(config, retrieval_depth):
+    """
+    Builds the reranker selected in the "reranker" section of the config, or returns None.
+
+    The reranker keeps the config's ``top_n`` nodes. Without one it keeps
+    ``retrieval_depth``, so the depth a caller asks for (the UI's "Retrieval
+    Depth", --retrieval_depth) is the number answered from.
+
+    Returns:
+        tuple: The reranker (or None) and how many candidates the retriever should fetch for it.
+    """
+    reranker_config = config.get("reranker") or {}
+    reranker_type = reranker_config.get("type", "none").lower()
+    if reranker_type == "none":
+        return None, retrieval_depth
+
+    settings = {
+        "top_n": reranker_config.get("top_n") or retrieval_depth,
+        "batch_size": reranker_config.get("batch_size", 16),
+        "latency_budget_ms": reranker_config.get("latency_budget_ms"),
+    }
+    if reranker_type == "cross-encoder":
+        reranker = CrossEncoderReranker(model=reranker_config.get("model", DEFAULT_CROSS_ENCODER), **settings)
+    elif reranker_type == "stub":
+        reranker = CrossEncoderReranker(cross_encoder=StubCrossEncoder(), model="stub", **settings)
+    else:
+        raise ValueError(f"Unsupported reranker type: {reranker_type}")
+    return reranker, max(reranker_config.get("candidates", 4 * settings["top_n"]), settings["top_n"])
+
+def rerank_time(engine):
+    """Seconds the engine's rerankers spent on the last query of the current thread or asyncio task."""
+    return sum(getattr(postprocessor, "last_latency", 0.0) for postprocessor in getattr(engine, "_node_postprocessors", []))
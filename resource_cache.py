@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+
+class ResourceCache:
+    """
+    Thread-safe, keyed LRU cache for expensive long-lived objects such as model
+    clients and query engines.
+
+    Entries are evicted least-recently-used first once there are more than
+    ``max_entries`` of them, or once their estimated total size exceeds
+    ``max_bytes`` (as measured by ``sizeof``). The most recently used entry is
+    always kept, even if it alone is over the ceiling. Concurrent requests for
+    the same missing key build it only once.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.build_locks = {}
+
+    def get_or_create(self, key, factory):
+        """Returns the cached value for key, calling factory() to build it on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            build_lock = self.build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self.lock:
+                # Another thread may have built it while we waited
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key]
+                self.misses += 1
+            value = factory()
+            size = self.sizeof(value)
+            with self.lock:
+                self.entries[key] = value
+                self.sizes[key] = size
+                self.build_locks.pop(key, None)
+                self._enforce_limits()
+        return value
+
+    def evict(self, key=None):
+        """Drops one entry, or every entry when key is None."""
+        with self.lock:
+            keys = list(self.entries) if key is None else [key]
+            for evicted_key in keys:
+                if evicted_key in self.entries:
+                    del self.entries[evicted_key]
+                    del self.sizes[evicted_key]
+                    self.evictions += 1
+
+    def total_bytes(self):
+        """Returns the estimated size of all entries."""
+        return sum(self.sizes.values())
+
+    def stats(self):
+        """Returns entry, hit, miss and eviction counts and the estimated size."""
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self.total_bytes(),
+            }
+
+    def _enforce_limits(self):
+        # Caller holds self.lock
+        while len(self.entries) > 1 and (
+            (self.max_entries is not None and len(self.entries) > self.max_entries)
+            or (self.max_bytes is not None and self.total_bytes() > self.max_bytes)
+        ):
+            evicted_key, _ = self.entries.popitem(last=False)
+            del self.sizes[evicted_key]
+            self.evictions += 1
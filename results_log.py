@@ -0,0 +1,72 @@
+import os
+import json
+from artifact_store import atomic_write
+
+# Evaluation results are kept in an append-only JSONL log: one record per line,
+# fsynced as it is written. A crash can at worst leave a partial last line, which
+# is dropped the next time the log is opened. The results_*.json arrays are
+# produced from the log by export_results.
+
+def log_path_for(results_file):
+    """Returns the JSONL log path that backs a results_*.json file."""
+    return os.path.splitext(results_file)[0] + ".jsonl"
+
+def append_result(record, log_path):
+    """Appends one record to the log and fsyncs it."""
+    line = json.dumps(record) + "\n"
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        log_file.write(line)
+        log_file.flush()
+        os.fsync(log_file.fileno())
+
+def read_results(log_path):
+    """Yields the records of a log one at a time, without loading the whole file."""
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, "r", encoding="utf-8") as log_file:
+        for line in log_file:
+            if not line.endswith("\n"):
+                # Partial write from an interrupted run
+                break
+            if line.strip():
+                yield json.loads(line)
+
+def repair_log(log_path):
+    """Truncates a partial last line left by an interrupted write. Returns True if anything was removed."""
+    if not os.path.exists(log_path):
+        return False
+    with open(log_path, "rb+") as log_file:
+        data = log_file.read()
+        if not data or data.endswith(b"\n"):
+            return False
+        log_file.truncate(data.rfind(b"\n") + 1)
+    return True
+
+def load_result_index(log_path, results_file=None):
+    """
+    Returns the logged records keyed by "Query ID", for the resume check.
+
+    If there is no log yet but ``results_file`` (an exported JSON array) exists,
+    the log is seeded from it so earlier results are not scored again.
+    """
+    if not os.path.exists(log_path) and results_file and os.path.exists(results_file):
+        with open(results_file, "r") as f:
+            for record in json.load(f):
+                append_result(record, log_path)
+    if repair_log(log_path):
+        print(f"Dropped a partially written record from {log_path}")
+    return {record["Query ID"]: record for record in read_results(log_path)}
+
+def export_results(log_path, results_file):
+    """
+    Compacts the log into the results_*.json layout: one JSON array, indented,
+    in first-logged order, keeping the latest record for each "Query ID".
+    """
+    records = {}
+    for record in read_results(log_path):
+        records[record["Query ID"]] = record
+    atomic_write(
+        os.path.abspath(results_file),
+        lambda f: f.write(json.dumps(list(records.values()), indent=4).encode("utf-8")),
+    )
+    print(f"Exported {len(records)} results from {log_path} to {results_file}")
@@ -1,237 +1,14 @@
-import os
 import sys
-from llama_index.core import VectorStoreIndex
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.llms.openai import OpenAI
-from llama_parse import LlamaParse
-from llama_index.core.node_parser import MarkdownElementNodeParser
-from llama_index.postprocessor.flag_embedding_reranker import FlagEmbeddingReranker
-from llama_index.core.schema import TextNode
-from copy import deepcopy
-from dotenv import load_dotenv
-import pickle
-import json
 import argparse
-import time as time
-import nest_asyncio
-from llama_index.llms.huggingface import HuggingFaceLLM
-from llama_index.llms.replicate import Replicate
-from llama_index.llms.gemini import Gemini
-from llama_index.embeddings.gemini import GeminiEmbedding
+from backend import Backend, load_config, read_queries_file
+from tracing import format_report, read_spans, span_report
 
-def initialize_keys():
-    """Automatically sets API keys from environment variables."""
-    load_dotenv()
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        sys.exit("API Key are missing. Please set OPENAI_API_KEY in your environment.")
-    llama_cloud_key = os.getenv("LLAMA_CLOUD_API_KEY")
-    if not llama_cloud_key:
-        sys.exit("API Key are missing. Please set LLAMA_CLOUD_API_KEY in your environment.")
-    #replicate_api_key = os.getenv("REPLICATE_API_TOKEN")
-    #if not replicate_api_key:
-        #sys.exit("API Key are missing. Please set REPLICATE_API_TOKEN in your environment.")
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        sys.exit("API Key are missing. Please set GOOGLE_API_KEY in your environment.")
-# --- Backend Helper Functions ---
-def load_config(config_file="config.json"):
-    """Load configuration settings from a JSON file."""
-    with open(config_file, "r") as f:
-        config = json.load(f)
-    return config
-
-# --- Utility Functions ---
-def save_cache(file_name, data):
-    """Saves the cache to a pickle file."""
-    cache_file_path = f"cached_nodes/{file_name}.pkl"
-    os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
-    with open(cache_file_path, "wb") as f:
-        pickle.dump(data, f)
-
-def load_cache(file_name):
-    """Loads the cached data from a pickle file."""
-    cache_file_path = f"cached_nodes/{file_name}.pkl"
-    if os.path.exists(cache_file_path):
-        with open(cache_file_path, "rb") as f:
-            return pickle.load(f)
-    return None
-
-def initialize_llm(config):
-    """Initialize the LLM based on the provided configuration."""
-    llm_config = config.get("llm", {})
-    llm_type = llm_config.get("type", "").lower()
-    
-    if llm_type == "openai":
-        model = llm_config.get("model", "")
-        return OpenAI(model=model)
-    elif llm_type == "huggingface":
-        model = llm_config.get("model", "")
-        tokenizer_name = llm_config.get("tokenizer", model)  # Default to model name if no tokenizer is specified
-        return HuggingFaceLLM(model_name=model, tokenizer_name=tokenizer_name)
-    elif llm_type == "replicate":
-        model = llm_config.get("model", "")
-        return Replicate(model=model)
-    elif llm_type == "gemini":
-        model = llm_config.get("model", "")  # Default model if not specified
-        return Gemini(model=model)
-    else:
-        raise ValueError(f"Unsupported LLM type: {llm_type}")
-
-def initialize_embedding_model(config):
-    """Initialize the embedding model based on the provided configuration."""
-    embedding_config = config.get("embedding_model", {})
-    llm_provider = embedding_config.get("type", "").lower()
-
-    if llm_provider == "openai":
-        model = embedding_config.get("model_name", "text-embedding-ada-002")
-        return OpenAIEmbedding(model=model)
-    elif llm_provider == "huggingface":
-        model = embedding_config.get("model_name", "BAAI/bge-small-en-v1.5")
-        return HuggingFaceEmbedding(model_name=model)
-    elif llm_provider == "gemini":
-        model = embedding_config.get("model_name", "models/text-embedding-004")
-        return GeminiEmbedding(model_name=model)
-    else:
-        raise ValueError(f"Unsupported embedding model type: {llm_provider}")
-
-def get_page_nodes(docs, separator="\n---\n"):
-    """Split each document into page nodes, by separator."""
-    nodes = []
-    for doc in docs:
-        doc_chunks = doc.text.split(separator)
-        for doc_chunk in doc_chunks:
-            node = TextNode(
-                text=doc_chunk,
-                metadata=deepcopy(doc.metadata),
-            )
-            nodes.append(node)
-    return nodes
-
-# --- Document Processing ---
-def parse_and_index_single_document(file_path, model, embedding_model, verbosity=False):
-    """
-    Parses and indexes a single document with a specific embedding model.
-    """
-    file_name = f"{os.path.basename(file_path)}_{model.model.replace('/', '_')}_{embedding_model.model_name.replace('/', '_')}"
-    cached_data = load_cache(file_name)
-    if cached_data:
-        if verbosity:
-            print("Fetching indexes from cache...")
-        return cached_data  # Return cached index and nodes
-
-    if verbosity:
-        print(f"Processing document: {file_name}")
-    doc = LlamaParse(result_type="markdown").load_data(file_path)
-
-    # Parse document into nodes
-    node_parser = MarkdownElementNodeParser(
-        llm=model, num_workers=4
-    )
-    nodes = node_parser.get_nodes_from_documents(doc)
-    base_nodes, objects = node_parser.get_nodes_and_objects(nodes)
-
-    # Combine nodes
-    combined_nodes = base_nodes + objects + get_page_nodes(doc)
-
-    # Create the index
-    index = VectorStoreIndex(nodes=combined_nodes, embedding_model=embedding_model)
-    
-    # Save the index and nodes to cache
-    save_cache(file_name, (index, combined_nodes))
-
-    return index, combined_nodes  # Return both index and nodes
-
-def create_query_engine(combined_nodes, embedding_model, retreival_depth =5, reranker=None, verbosity=True):
-    """
-    Creates a combined query engine from selected documents and embedding model.
-    """
-
-    # Create the combined index
-    combined_index = VectorStoreIndex(combined_nodes, embedding_model=embedding_model)
-    if not reranker:
-        return combined_index.as_query_engine(
-            #response_mode="tree_summarize",
-            similarity_top_k = retreival_depth,
-            verbose=verbosity,
-        )
-
-    # Apply the recursive query engine with reranker
-    return combined_index.as_query_engine(
-        similarity_top_k = retreival_depth,
-        node_postprocessors=[reranker],
-        verbose=verbosity,
-    )
-
-# --- Main Script ---
-def load(document_choice, retreival_depth, verbose):
-    """
-    Main function for running the query pipeline.
-    
-    Arguments:
-        document_choice (str): Path to the document.
-        query (str): Query string.
-        retreival_depth (int): Depth for document retrieval.
-        verbose (bool): Verbose mode.
-    """
-    
-    #nest_asyncio.apply()
-
-    # Load configuration and initialize models
-    config = load_config("config.json")
-    initialize_keys()
-    llm_choice = initialize_llm(config)
-    embedding_model = initialize_embedding_model(config)
-    
-    print(f"LLM: {llm_choice.model}")
-    print(f"Embedding Model: {embedding_model.model_name}")
-
-    if not document_choice:
-        sys.exit("No document path provided. Please add paths to your documents.")
-    query_engines = {}
-    document_name = os.path.splitext(os.path.basename(document_choice))[0]
-    
-    _, document_nodes = parse_and_index_single_document(document_choice, llm_choice, embedding_model, verbosity=verbose)
-
-    query_engine = create_query_engine(document_nodes, embedding_model, retreival_depth=retreival_depth, verbosity=verbose)
-    query_engines[document_name] = query_engine
-    print(f"Query engine made for {document_name} document")
-    return query_engines
-
-def run_query(query, query_engine, document_name, retrieval_depth, verbose=False):
-    """
-    Execute a query using the provided query engine and return the result.
-
-    Parameters:
-        query (str): The query to execute.
-        query_engine (object): The query engine to process the query.
-        document_name(str): The name of the document.
-        retrieval_depth (int): The number of retrieval chunks to include in the context.
-        verbose (bool): Whether to print verbose output.
-
-    Returns:
-        tuple: A tuple containing the response answer (str) and retrieval context (list).
-    """
-    if not query:
-        raise ValueError("Please enter a query to proceed.")
-
-    start_time = time.time()
-    response = query_engine[document_name].query(query)
-    
-    if verbose:
-        elapsed_time = round(time.time() - start_time, 2)
-        print(f"Query: {query}\n\nResponse: {response.response}")
-        print(f"Elapsed Time: {elapsed_time}s")
-
-    retrieval_context = [
-        response.source_nodes[i].get_content() for i in range(retrieval_depth)
-    ]
-    return (response.response, retrieval_context)
+# Command-line client of the query pipeline in backend.py
 
 if __name__ == "__main__":
     #
     # USAGE: python script.py --document_choice "./TSLA-10Q-Sep2024.pdf" --query "What was the net income in 2023?"
+    #        python script.py --document_choice "./PANW-10Q-Oct2024.pdf" --queries-file ./test_data_PANW.pkl --output answers.jsonl
     #
     # Argument parser for command-line arguments
     parser = argparse.ArgumentParser(
@@ -245,6 +22,20 @@ if __name__ == "__main__":
         default="./TSLA-10Q-Sep2024.pdf",
         help="Path to the document to process (default: ./TSLA-10Q-Sep2024.pdf).",
     )
+    parser.add_argument(
+        "--documents",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Ask across several documents at once; each query is routed to the relevant ones.",
+    )
+    parser.add_argument(
+        "--filter_documents",
+        type=str,
+        nargs="+",
+        default=None,
+        help="With --documents, only retrieve from these documents (file names without extension).",
+    )
     parser.add_argument(
         "--query",
         type=str,
@@ -262,6 +53,38 @@ if __name__ == "__main__":
         default=True,
         help="Enable verbose output.",
     )
+    parser.add_argument(
+        "--queries-file",
+        "--queries_file",
+        dest="queries_file",
+        type=str,
+        default=None,
+        help="Answer every question in a JSONL or test_data_*.pkl file instead of --query.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="answers.jsonl",
+        help="JSONL file that batch answers are appended to (default: answers.jsonl).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of concurrent LLM synthesis calls in batch mode (default: 4).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer token by token as it is generated.",
+    )
+
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Append per-stage spans to this JSONL file and print the latency report of every span in it.",
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -270,10 +93,35 @@ if __name__ == "__main__":
     retrieval_depth=args.retrieval_depth
     verbose=args.verbose
 
-    query_engine = load(document_choice, retrieval_depth, verbose)
-    document_name = os.path.splitext(os.path.basename(document_choice))[0]
+    config = load_config("config.json")
+    if args.trace:
+        config["tracing"] = {"enabled": True, "sink": "jsonl", "path": args.trace}
+    backend = Backend(config, retrieval_depth, verbose)
+    documents = args.documents or document_choice
+    if not documents:
+        sys.exit("No document path provided. Please add paths to your documents.")
+    engine = backend.engine(documents, streaming=args.stream and not args.queries_file, document_filter=args.filter_documents)
+    print(f"LLM: {engine['llm'].model}")
+    print(f"Embedding Model: {engine['embedding_model'].model_name}")
+    if args.documents:
+        print(f"Query engine made for {len(args.documents)} documents")
+    else:
+        print(f"Query engine made for {engine['document_name']} document")
 
-    run_query(
-         query=query, query_engine=query_engine, document_name=document_name, retrieval_depth=retrieval_depth, verbose=verbose
-    )
-    
\ No newline at end of file
+    if args.queries_file:
+        backend.batch_query(
+            read_queries_file(args.queries_file), documents, args.output, workers=args.workers, document_filter=args.filter_documents
+        )
+    elif args.stream:
+        result = backend.query(query, documents, stream=True, document_filter=args.filter_documents)
+        print(f"Query: {query}\n\nResponse: ", end="", flush=True)
+        for token in result["response"]:
+            print(token, end="", flush=True)
+        print()
+    else:
+        backend.query(query, documents, document_filter=args.filter_documents)
+
+    if verbose:
+        print(f"Embedding cache: {backend.stats()['embedding_cache']}")
+    if args.trace:
+        print(format_report(span_report(read_spans(args.trace))))
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import argparse
+import socketserver
+import time as time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from backend import Backend, load_config
+
+# --- Engines ---
+class QueryService:
+    """
+    Keeps query engines warm for every configured (document, LLM, embedding model) triple.
+
+    All models are initialized and all indexes opened once at start-up, so a
+    request only pays for the query itself. The engines, caches and latency
+    metrics are those of a Backend, sized so that no served engine is evicted.
+    """
+
+    def __init__(self, document_choices, configs, retrieval_depth=5, verbose=False):
+        self.backend = Backend(
+            configs[0] if configs else None, retrieval_depth, verbose,
+            max_cached_models=None, max_cached_engines=None, engine_cache_max_bytes=None,
+        )
+        self.engines = {}
+        self.default_models = None
+        for config in configs:
+            models = (config["llm"].get("model", ""), config["embedding_model"].get("model_name", ""))
+            if self.default_models is None:
+                self.default_models = models
+            for document_choice in document_choices:
+                engine = self.backend.engine(document_choice, config)
+                self.engines[(engine["document_name"], *models)] = (document_choice, config)
+
+    def documents(self):
+        """Lists the loaded engines."""
+        return [
+            {"document": document_name, "llm": llm, "embedding_model": embedding_model}
+            for document_name, llm, embedding_model in self.engines
+        ]
+
+    def query(self, query, document_name, llm=None, embedding_model=None):
+        """Answers a query against a loaded engine and records its stage latencies."""
+        default_llm, default_embedding_model = self.default_models
+        key = (document_name, llm or default_llm, embedding_model or default_embedding_model)
+        if key not in self.engines:
+            raise KeyError(f"No engine loaded for {key}")
+        document_choice, config = self.engines[key]
+        result = self.backend.query(query, document_choice, config=config, verbose=False)
+        return {"response": result["response"], "retrieval_context": result["retrieval_context"], "timings": result["timings"]}
+
+# --- HTTP API ---
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over a QueryService.
+
+        GET  /health     -> {"status": "ok"}
+        GET  /documents  -> loaded (document, llm, embedding_model) triples
+        GET  /metrics    -> request counts, per-stage latency percentiles and cache hit rates
+        POST /query      -> {"query": ..., "document": ..., "llm"?: ..., "embedding_model"?: ...}
+    """
+
+    service = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/documents":
+            self.send_json(200, self.service.documents())
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.backend.stats())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            result = self.service.query(
+                body.get("query"),
+                body.get("document"),
+                llm=body.get("llm"),
+                embedding_model=body.get("embedding_model"),
+            )
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, result)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server listening on a Unix domain socket, one thread per request."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+        # BaseHTTPRequestHandler expects these from HTTPServer
+        self.server_name = "localhost"
+        self.server_port = 0
+
+def make_server(service, host="127.0.0.1", port=8000, unix_socket=None, verbose=False):
+    """Creates a threaded HTTP server for the service, on TCP or on a Unix socket."""
+    handler = type("BoundQueryRequestHandler", (QueryRequestHandler,), {"service": service})
+    if unix_socket:
+        server = ThreadingUnixHTTPServer(unix_socket, handler)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+    server.verbose = verbose
+    return server
+
+if __name__ == "__main__":
+    #
+    # USAGE: python service.py --document_choice ./TSLA-10Q-Sep2024.pdf ./PANW-10Q-Oct2024.pdf --port 8000
+    #        curl -s localhost:8000/query -d '{"query": "What was the net income?", "document": "TSLA-10Q-Sep2024"}'
+    #
+    parser = argparse.ArgumentParser(
+        description="Resident query service that keeps query engines warm between requests."
+    )
+    parser.add_argument(
+        "--document_choice",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Paths to the documents to serve (default: every PDF in the current directory).",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        nargs="+",
+        default=["config.json"],
+        help="One config file per LLM and embedding model pair to serve (default: config.json).",
+    )
+    parser.add_argument("--retrieval_depth", type=int, default=5, help="Number of retrieval chunks (default: 5).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind (default: 8000).")
+    parser.add_argument("--unix_socket", type=str, default=None, help="Serve on this Unix socket path instead of TCP.")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose output.")
+    args = parser.parse_args()
+
+    document_choices = args.document_choice or sorted(
+        os.path.join(".", file) for file in os.listdir(".") if file.endswith(".pdf")
+    )
+    if not document_choices:
+        sys.exit("No documents to serve.")
+
+    start_time = time.time()
+    service = QueryService(
+        document_choices,
+        [load_config(config_file) for config_file in args.config],
+        retrieval_depth=args.retrieval_depth,
+        verbose=args.verbose,
+    )
+    print(f"Loaded {len(service.engines)} query engines in {time.time() - start_time:.2f}s")
+
+    server = make_server(service, args.host, args.port, args.unix_socket, args.verbose)
+    print(f"Serving on {args.unix_socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,82 @@
+import re
+import asyncio
+import time as time
+import hashlib
+from typing import Any, List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import CustomLLM, CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+# Offline stand-ins for the provider clients, selected with "type": "stub" in config.json.
+# They make no network calls, so the service and evaluator can be load-tested without API keys.
+
+class StubLLM(CustomLLM):
+    """LLM that answers instantly (or after a fixed latency) with a deterministic canned response."""
+
+    model: str = "stub"
+    latency: float = 0.0
+    num_output: int = 256
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name=self.model, num_output=self.num_output)
+
+    def _answer(self, prompt):
+        words = re.findall(r"\w+", prompt)
+        return f"Stub answer from {self.model} over a {len(words)}-word prompt."
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        # Waits without blocking the event loop, like a network client
+        await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        answer = self._answer(prompt)
+        tokens = answer.split(" ")
+        text = ""
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency / len(tokens))
+            delta = token if i == 0 else f" {token}"
+            text += delta
+            yield CompletionResponse(text=text, delta=delta)
+
+class StubEmbedding(BaseEmbedding):
+    """
+    Embedding model that hashes word tokens into a fixed number of buckets.
+
+    Texts sharing words get similar vectors, so retrieval over a stub index
+    still behaves like retrieval rather than returning random nodes.
+    """
+
+    model_name: str = "stub"
+    dimensions: int = 256
+    latency: float = 0.0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:4], "little")
+            vector[bucket % self.dimensions] += 1.0
+        return vector
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
@@ -0,0 +1,160 @@
+import asyncio
+import time as time
+from llama_index.core import Document, SummaryIndex
+from llama_index.core.base.response.schema import PydanticResponse
+from llama_index.core.node_parser import MarkdownElementNodeParser
+from llama_index.core.node_parser.relational.base_element import TableOutput
+from llama_index.core.utils import get_tokenizer
+from pydantic import PrivateAttr, ValidationError
+from artifact_store import text_hash
+from rate_limit import ProviderRateLimiter, call_with_retries
+from tracing import get_tracer
+
+# The LLM summary of every table is most of the cost of a first ingest. This
+# stage replaces MarkdownElementNodeParser's fixed-worker summarization:
+#   - summaries are requested with a configurable concurrency ("ingest" ->
+#     "summary_max_concurrency") under the LLM provider's rate limit ("rate_limits"),
+#   - each summary is saved to the artifact store's "table_summaries" layer as soon
+#     as it arrives, keyed by the table's text and the LLM, so a crashed ingest, a
+#     re-ingest with another embedding model or an amended filing never pays for it twice.
+
+# LLM requests in flight at once. Local models gain nothing from more than one.
+DEFAULT_SUMMARY_CONCURRENCY = {
+    "openai": 8,
+    "gemini": 4,
+    "huggingface": 1,
+    "replicate": 4,
+    "stub": 8,
+}
+
+LLM_PROVIDERS = {
+    "OpenAI": "openai",
+    "Gemini": "gemini",
+    "HuggingFaceLLM": "huggingface",
+    "Replicate": "replicate",
+    "StubLLM": "stub",
+}
+
+def llm_provider(llm):
+    """Returns the provider name of an LLM, for concurrency and rate limits."""
+    return LLM_PROVIDERS.get(type(llm).__name__, "openai")
+
+def table_context(elements, position):
+    """The text a table is summarized from: the table, with a neighbouring caption as MarkdownElementNodeParser does."""
+    context = str(elements[position].element)
+    if position > 0 and str(elements[position - 1].element).lower().strip().startswith("table"):
+        context = str(elements[position - 1].element) + "\n" + context
+        if position + 1 < len(elements):
+            context += "\n" + str(elements[position + 1].element)
+    return context
+
+class TableSummarizer:
+    """
+    Summarizes tables with an LLM, concurrently, rate-limited and cached per table.
+
+    ``stats`` covers every ``summarize`` call so far (an incremental ingest makes
+    one per page): tables seen, summaries reused and requested, requested tables
+    per second and the LLM tokens spent on them, estimated with the default tokenizer.
+    """
+
+    def __init__(self, llm, store, max_concurrency=None, rate_limiter=None):
+        self.llm = llm
+        self.store = store
+        self.provider = llm_provider(llm)
+        self.max_concurrency = max_concurrency or DEFAULT_SUMMARY_CONCURRENCY.get(self.provider, 4)
+        self.rate_limiter = rate_limiter or ProviderRateLimiter()
+        self.tables = 0
+        self.requested = 0
+        self.seconds = 0.0
+        self.llm_tokens = 0
+
+    @classmethod
+    def from_config(cls, llm, store, config):
+        """Builds a summarizer from the "ingest" and "rate_limits" sections of a config."""
+        return cls(
+            llm,
+            store,
+            max_concurrency=config.get("ingest", {}).get("summary_max_concurrency"),
+            rate_limiter=ProviderRateLimiter(config),
+        )
+
+    def summary_key(self, element):
+        return self.store.key("table_summaries", text_hash(str(element.element)), {"llm": self.llm.model})
+
+    @property
+    def stats(self):
+        return {
+            "provider": self.provider,
+            "tables": self.tables,
+            "summaries_reused": self.tables - self.requested,
+            "summaries_requested": self.requested,
+            "seconds": round(self.seconds, 3),
+            "tables_per_sec": round(self.requested / self.seconds, 2) if self.requested and self.seconds else None,
+            "llm_tokens": self.llm_tokens,
+        }
+
+    def summarize(self, elements, summary_query_str):
+        """Sets ``table_output`` on every table element, from the cache or from the LLM."""
+        with get_tracer().span("table_summaries", provider=self.provider, tables=len(elements)) as span:
+            start_time = time.time()
+            missing = []
+            for position, element in enumerate(elements):
+                summary = self.store.get("table_summaries", self.summary_key(element))
+                if summary is None:
+                    missing.append(position)
+                else:
+                    element.table_output = summary
+            prompts = {position: table_context(elements, position) for position in missing}
+            if missing:
+                asyncio.run(self.summarize_tables(elements, prompts, summary_query_str))
+            self.seconds += time.time() - start_time
+
+            # Prompt (query and table) plus the summary; the prompt template adds a little more
+            tokenizer = get_tokenizer()
+            query_tokens = len(tokenizer(summary_query_str))
+            prompt_tokens = sum(query_tokens + len(tokenizer(prompts[position])) for position in missing)
+            completion_tokens = sum(len(tokenizer(elements[position].table_output.summary)) for position in missing)
+            self.llm_tokens += prompt_tokens + completion_tokens
+            self.tables += len(elements)
+            self.requested += len(missing)
+            span.set(
+                cache_hit=not missing, summaries_requested=len(missing),
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            )
+
+    async def summarize_tables(self, elements, prompts, summary_query_str):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = self.rate_limiter.bucket(self.provider)
+
+        async def summarize_table(position):
+            async with semaphore:
+                output = await call_with_retries(lambda: self.table_output(prompts[position], summary_query_str), bucket)
+            elements[position].table_output = output
+            # Saved at once, so an interrupted ingest keeps every summary it paid for
+            self.store.put("table_summaries", self.summary_key(elements[position]), output)
+
+        await asyncio.gather(*(summarize_table(position) for position in prompts))
+
+    async def table_output(self, context, summary_query_str):
+        """Asks the LLM for a structured TableOutput, falling back to a plain-text summary."""
+        index = SummaryIndex.from_documents([Document(text=context)])
+        try:
+            response = await index.as_query_engine(llm=self.llm, output_cls=TableOutput).aquery(summary_query_str)
+            if isinstance(response, PydanticResponse):
+                return response.response
+            raise ValueError(f"Expected PydanticResponse, got {type(response)}")
+        except (ValidationError, ValueError):
+            response = await index.as_query_engine(llm=self.llm).aquery(summary_query_str)
+            return TableOutput(summary=str(response), columns=[])
+
+class SummaryCachingMarkdownElementNodeParser(MarkdownElementNodeParser):
+    """MarkdownElementNodeParser whose table summaries come from a TableSummarizer."""
+
+    _summarizer = PrivateAttr(default=None)
+
+    def __init__(self, summarizer, **kwargs):
+        super().__init__(llm=summarizer.llm, **kwargs)
+        self._summarizer = summarizer
+
+    def extract_table_summaries(self, elements):
+        self._summarizer.summarize(elements, self.summary_query_str)
@@ -0,0 +1,103 @@
+import numpy as np
+import answer_cache
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import TextNode
+from answer_cache import SemanticAnswerCache, answer_scope, query_numbers
+from embedding_matrix import EmbeddingMatrixIndex, save_embedding_matrix
+from multi_document import MultiDocumentIndex
+from node_dedup import ParentPagePostprocessor
+from reranker import initialize_reranker
+from stub_models import StubEmbedding, StubLLM
+
+QUERY = "What was total revenue in 2024?"
+EMBEDDING = [1.0, 0.0, 0.0]
+
+def matrix_index(tmp_path, name):
+    nodes = [TextNode(id_=f"{name}-{i}", text=f"{name} page {i}") for i in range(2)]
+    matrix_path = str(tmp_path / f"{name}.npy")
+    save_embedding_matrix(matrix_path, [node.node_id for node in nodes], np.eye(2, 4, dtype=np.float32))
+    return EmbeddingMatrixIndex(matrix_path, nodes=nodes)
+
+def engine(index, node_postprocessors=None, **retriever_kwargs):
+    retriever = index.as_retriever(StubEmbedding(dimensions=4), similarity_top_k=2, **retriever_kwargs)
+    return RetrieverQueryEngine.from_args(retriever, llm=StubLLM(), node_postprocessors=node_postprocessors)
+
+def test_query_numbers():
+    assert query_numbers("Revenue in Q3 2024 was $2,138.8 million") == {"3", "2024", "2,138.8"}
+
+def test_hits_similar_questions_with_the_same_numbers():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put("scope", QUERY, EMBEDDING, "$25 billion", ["context"])
+    assert cache.lookup("scope", "What was the total revenue in 2024?", [0.99, 0.05, 0.0]) == ("$25 billion", ["context"])
+    assert cache.lookup("scope", "What was total revenue in 2023?", EMBEDDING) is None
+    assert cache.lookup("scope", QUERY, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("other scope", QUERY, EMBEDDING) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.put("scope", QUERY, EMBEDDING, "answer", [])
+    now[0] += 59
+    assert cache.lookup("scope", QUERY, EMBEDDING) is not None
+    now[0] += 2
+    assert cache.lookup("scope", QUERY, EMBEDDING) is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 0
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    for year in ("2022", "2023", "2024"):
+        cache.put("scope", f"Revenue in {year}?", EMBEDDING, year, [])
+    assert cache.lookup("scope", "Revenue in 2022?", EMBEDDING) is None
+    assert cache.lookup("scope", "Revenue in 2024?", EMBEDDING) == ("2024", [])
+    assert cache.stats()["evictions"] == 1
+
+def test_a_new_artifact_invalidates_the_old_answers():
+    cache = SemanticAnswerCache()
+    cache.put(("doc", "llm", "embedding", 5, (), "artifact-1"), QUERY, EMBEDDING, "old", [])
+    assert cache.lookup(("doc", "llm", "embedding", 5, (), "artifact-2"), QUERY, EMBEDDING) is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["entries"] == 0
+
+def test_scope_depends_on_the_document_filter(tmp_path):
+    index = MultiDocumentIndex({"TSLA": matrix_index(tmp_path, "TSLA"), "PANW": matrix_index(tmp_path, "PANW")})
+    tsla = answer_scope(engine(index, document_filter=["TSLA"]), "all_documents", 2)
+    panw = answer_scope(engine(index, document_filter=["PANW"]), "all_documents", 2)
+    routed = answer_scope(engine(index), "all_documents", 2)
+    assert len({tsla, panw, routed}) == 3
+    assert tsla[-1] == panw[-1] == routed[-1]
+
+    cache = SemanticAnswerCache()
+    cache.put(tsla, QUERY, EMBEDDING, "TSLA answer", [])
+    assert cache.lookup(panw, QUERY, EMBEDDING) is None
+    assert cache.lookup(tsla, QUERY, EMBEDDING) == ("TSLA answer", [])
+
+def test_scope_depends_on_the_reranker(tmp_path):
+    index = matrix_index(tmp_path, "TSLA")
+    reranker, _ = initialize_reranker({"reranker": {"type": "stub"}}, 2)
+    assert answer_scope(engine(index), "TSLA", 2) != answer_scope(engine(index, [reranker]), "TSLA", 2)
+    assert answer_scope(engine(index), "TSLA", 2) == answer_scope(engine(index), "TSLA", 2)
+
+def test_scope_names_postprocessors_without_their_pages(tmp_path):
+    index = matrix_index(tmp_path, "TSLA")
+    pages = {f"page-{i}": TextNode(id_=f"page-{i}", text="Consolidated Balance Sheets " * 100) for i in range(3)}
+    scope = answer_scope(engine(index, [ParentPagePostprocessor(parents=pages)]), "TSLA", 2)
+    assert "Consolidated" not in repr(scope)
+    assert ("ParentPagePostprocessor", ()) in scope[-2]
+    smaller_batches, _ = initialize_reranker({"reranker": {"type": "stub", "batch_size": 4}}, 2)
+    reranker, _ = initialize_reranker({"reranker": {"type": "stub"}}, 2)
+    assert answer_scope(engine(index, [reranker]), "TSLA", 2) != answer_scope(engine(index, [smaller_batches]), "TSLA", 2)
+
+def test_async_queries_use_the_cache(tmp_path):
+    import asyncio
+    from backend import arun_query
+
+    query_engine = {"TSLA": engine(matrix_index(tmp_path, "TSLA"))}
+    cache = SemanticAnswerCache()
+    first, second = {}, {}
+    answer, _ = asyncio.run(arun_query(QUERY, query_engine, "TSLA", 2, timings=first, answer_cache=cache))
+    cached, _ = asyncio.run(arun_query(QUERY, query_engine, "TSLA", 2, timings=second, answer_cache=cache))
+    assert cached == answer
+    assert {"cache_lookup", "retrieval", "synthesis"} <= set(first)
+    assert first["cache_lookup"] + first["retrieval"] + first["synthesis"] <= first["total"]
+    assert set(second) == {"cache_lookup", "total"}
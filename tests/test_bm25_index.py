@@ -0,0 +1,58 @@
+import numpy as np
+from llama_index.core.schema import TextNode
+from bm25_index import BM25Index, HybridRetriever, reciprocal_rank_fusion, tokenize
+from embedding_matrix import EmbeddingMatrixIndex, save_embedding_matrix
+from stub_models import StubEmbedding
+
+TEXTS = [
+    "Automotive revenue grew on higher vehicle deliveries.",
+    "The 2025 Convertible Senior Notes were settled in cash.",
+    "Energy generation and storage revenue was $2,376 million.",
+    "RSUs granted to employees vest over four years.",
+]
+
+def test_tokenize_keeps_figures_whole():
+    assert tokenize("Revenue was $2,138.8 million in 2024") == ["revenue", "was", "2,138.8", "million", "in", "2024"]
+
+def test_top_k_ranks_exact_token_matches_first():
+    index = BM25Index.build(TEXTS)
+    positions, scores = index.top_k("convertible senior notes", 2)
+    assert positions.tolist() == [1]
+    assert scores[0] > 0
+    positions, _ = index.top_k("revenue 2,376", 4)
+    assert positions.tolist() == [2, 0]
+
+def test_rarer_terms_weigh_more():
+    index = BM25Index.build(["revenue rsus", "revenue", "revenue"])
+    scores = index.scores("revenue rsus")
+    assert scores[0] > scores[1] == scores[2] > 0
+
+def test_no_matches():
+    positions, scores = BM25Index.build(TEXTS).top_k("bitcoin", 3)
+    assert len(positions) == 0 and len(scores) == 0
+
+def test_save_and_load(tmp_path):
+    index = BM25Index.build(TEXTS)
+    index_path = str(tmp_path / "bm25.npz")
+    index.save(index_path)
+    loaded = BM25Index.load(index_path)
+    assert np.allclose(loaded.scores("rsus vest"), index.scores("rsus vest"))
+
+def test_reciprocal_rank_fusion_ordering():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], rrf_k=60)
+    assert [position for position, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+
+def test_reciprocal_rank_fusion_prefers_agreement_over_one_top_rank():
+    fused = dict(reciprocal_rank_fusion([[7, 5], [8, 5]], rrf_k=1))
+    assert fused[5] > fused[7] == fused[8]
+
+def test_hybrid_retriever_finds_what_dense_search_misses(tmp_path):
+    nodes = [TextNode(id_=str(i), text=text) for i, text in enumerate(TEXTS)]
+    embed_model = StubEmbedding(dimensions=64)
+    matrix_path = str(tmp_path / "matrix.npy")
+    # Dense scores that ignore the query entirely: only BM25 can surface the RSU node
+    save_embedding_matrix(matrix_path, [node.node_id for node in nodes], np.tile(embed_model.get_text_embedding("cash"), (4, 1)))
+    index = EmbeddingMatrixIndex(matrix_path, nodes=nodes)
+    retriever = HybridRetriever(index, BM25Index.build(TEXTS), embed_model, similarity_top_k=1, candidates=4)
+    assert retriever.retrieve("When do RSUs vest?")[0].node.node_id == "3"
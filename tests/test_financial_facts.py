@@ -0,0 +1,83 @@
+import pytest
+from llama_index.core import Document
+from financial_facts import FinancialFacts, classify_query, fact_answer, format_amount, parse_amount
+
+FILING = """# Consolidated Balance Sheets
+(in millions)
+
+| | September 30, 2024 | December 31, 2023 |
+|---|---|---|
+| Cash and cash equivalents | $ 18,111 | $ 16,398 |
+| Total assets | 119,852 | 106,618 |
+---
+# Consolidated Statements of Operations
+(in millions, except per share data)
+
+| | Three Months Ended September 30, | | Nine Months Ended September 30, | |
+|---|---|---|---|---|
+| | 2024 | 2023 | 2024 | 2023 |
+| Total revenues | 25,182 | 23,350 | 71,983 | 71,321 |
+| Interest expense | (92) | (38) | (254) | (95) |
+| Net income | 2,183 | 1,878 | 4,774 | 7,031 |
+| Net income per share: | | | | |
+| Basic | $ 0.68 | $ 0.58 | $ 1.51 | $ 2.23 |
+| Diluted | $ 0.62 | $ 0.53 | $ 1.38 | $ 2.03 |
+"""
+
+@pytest.fixture(scope="module")
+def facts():
+    return FinancialFacts.build([Document(text=FILING)])
+
+def answer(facts, query):
+    fact = facts.lookup(query)
+    return None if fact is None else (fact["text"], fact["period"])
+
+def test_parse_amount():
+    assert parse_amount("$ 2,138.8") == 2138.8
+    assert parse_amount("(92)") == -92
+    assert parse_amount("12.5 %") == 12.5
+    assert parse_amount("Total") is None
+
+def test_classify_query():
+    assert classify_query("What was the total revenue for the quarter?") == "lookup"
+    assert classify_query("How did revenue change compared to last year?") == "other"
+    assert classify_query("Why did margins decrease?") == "other"
+
+def test_extracts_one_fact_per_dated_cell(facts):
+    # 2 x 2 balance sheet cells and 5 x 4 statement of operations cells
+    assert len(facts) == 24
+
+def test_duration_and_year_select_the_period(facts):
+    assert answer(facts, "What was the total revenue for the quarter?") == ("25,182", "Three Months Ended September 30, 2024")
+    assert answer(facts, "What were total revenues for the nine months ended September 30, 2023?") == ("71,321", "Nine Months Ended September 30, 2023")
+    assert answer(facts, "What was net income in the third quarter of 2023?") == ("1,878", "Three Months Ended September 30, 2023")
+
+def test_balance_sheet_dates_select_the_period(facts):
+    assert answer(facts, "What were the total assets as of September 30, 2024?") == ("119,852", "September 30, 2024")
+    assert answer(facts, "How much cash and cash equivalents were there as of December 31, 2023?") == ("$ 16,398", "December 31, 2023")
+
+def test_a_year_without_a_duration_falls_through(facts):
+    # The quarter and the nine months both end in 2024: retrieval has to decide
+    assert facts.lookup("What was the net income in 2024?") is None
+    assert facts.lookup("What was the net income in 2023?") is None
+    assert facts.lookup("What was the total revenue?") is None
+
+def test_sections_disambiguate_repeated_line_items(facts):
+    assert answer(facts, "What was the diluted EPS for the quarter?") == ("$ 0.62", "Three Months Ended September 30, 2024")
+
+def test_unknown_line_items_fall_through(facts):
+    assert facts.lookup("What was the free cash flow for the quarter?") is None
+
+def test_answers_carry_units_and_signs(facts):
+    fact = facts.lookup("What was the interest expense for the nine months ended September 30, 2024?")
+    assert format_amount(fact) == "-$254 million"
+    assert fact_answer(facts.lookup("What was the total revenue for the quarter?")) == (
+        "Total revenues was $25,182 million for Three Months Ended September 30, 2024 (Consolidated Statements of Operations)."
+    )
+
+def test_save_and_load(facts, tmp_path):
+    facts_path = str(tmp_path / "facts.npz")
+    facts.save(facts_path)
+    loaded = FinancialFacts.load(facts_path)
+    assert len(loaded) == len(facts)
+    assert loaded.lookup("What was the total revenue for the quarter?") == facts.lookup("What was the total revenue for the quarter?")
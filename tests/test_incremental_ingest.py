@@ -0,0 +1,55 @@
+import numpy as np
+from llama_index.core import Document
+from llama_index.core.schema import TextNode
+from artifact_store import ArtifactStore
+from embedding_matrix import save_embedding_matrix
+from incremental_ingest import build_nodes_incrementally, embed_incrementally, split_pages
+from stub_models import StubLLM
+
+class CountingPipeline:
+    """Stands in for an EmbeddingPipeline, recording which nodes it is asked to embed."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, nodes, show_progress=False):
+        self.embedded += [node.node_id for node in nodes]
+        return {node.node_id: np.ones(4, dtype=np.float32) for node in nodes}
+
+def test_split_pages_keeps_document_metadata():
+    docs = [Document(text="one\n---\ntwo", metadata={"file_name": "a.pdf"}), Document(text="three")]
+    assert split_pages(docs) == [("one", {"file_name": "a.pdf"}), ("two", {"file_name": "a.pdf"}), ("three", {})]
+
+def test_only_changed_pages_are_rebuilt(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    llm = StubLLM()
+    original = Document(text="Revenue grew in the quarter.\n---\nRisk factors are unchanged.")
+    _, page_nodes, stats = build_nodes_incrementally([original], llm, store)
+    assert len(page_nodes) == 2
+    assert stats["pages_reused"] == 0 and stats["pages_recomputed"] == 2
+
+    amended = Document(text="Revenue grew in the quarter.\n---\nRisk factors now include tariffs.")
+    _, amended_pages, stats = build_nodes_incrementally([amended], llm, store)
+    assert stats["pages_reused"] == 1 and stats["pages_recomputed"] == 1
+    assert amended_pages[0].node_id == page_nodes[0].node_id
+    assert amended_pages[1].node_id != page_nodes[1].node_id
+
+def test_identical_pages_keep_their_page_nodes(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    text = "Cover page\n---\nRevenue grew in the quarter.\n---\nCover page"
+    element_nodes, page_nodes, stats = build_nodes_incrementally([Document(text=text)], StubLLM(), store)
+    assert [page.text for page in page_nodes] == ["Cover page", "Revenue grew in the quarter.", "Cover page"]
+    assert len({page.node_id for page in page_nodes}) == 3
+    # The repeated page's elements are only added once
+    assert len({node.node_id for node in element_nodes}) == len(element_nodes) == 2
+    assert stats["pages_reused"] == 1
+
+def test_embeddings_of_surviving_nodes_are_reused(tmp_path):
+    matrix_path = str(tmp_path / "previous.npy")
+    save_embedding_matrix(matrix_path, ["kept", "removed"], np.eye(2, 4, dtype=np.float32))
+    nodes = [TextNode(id_="kept", text="kept"), TextNode(id_="new", text="new")]
+    pipeline = CountingPipeline()
+    embeddings, stats = embed_incrementally(nodes, pipeline, matrix_path)
+    assert pipeline.embedded == ["new"]
+    assert np.allclose(embeddings["kept"], [1, 0, 0, 0])
+    assert stats == {"embeddings_reused": 1, "embeddings_recomputed": 1, "nodes_removed": 1}
@@ -0,0 +1,58 @@
+from llama_index.core.schema import IndexNode, NodeRelationship, NodeWithScore, TextNode
+import numpy as np
+from node_dedup import MERSENNE_PRIME, ParentPagePostprocessor, dedup_settings, deduplicate_nodes, dedup_config_with_defaults, jaccard, minhash_signatures, mod_mersenne, mul_mod_mersenne, shingles
+
+BOILERPLATE = "Forward-looking statements in this report involve risks and uncertainties that could cause actual results to differ"
+REVENUE = "Total revenues were 25,182 million for the three months ended September 30 2024 compared to 25,167 million a year ago"
+CASH = "Cash and cash equivalents and investments were 33,648 million as of September 30 2024 up from the prior quarter"
+
+def test_shingles_and_jaccard():
+    assert shingles(BOILERPLATE) == shingles(BOILERPLATE.upper())
+    assert len(shingles("too short")) == 1
+    assert jaccard(shingles(BOILERPLATE), shingles(BOILERPLATE)) == 1.0
+    assert jaccard(shingles(BOILERPLATE), shingles(REVENUE)) == 0.0
+
+def test_minhash_is_exact_modular_arithmetic():
+    rng = np.random.default_rng(1)
+    a = np.append(rng.integers(1, MERSENNE_PRIME, 1000, dtype=np.uint64), np.uint64(MERSENNE_PRIME - 1))
+    values = np.append(rng.integers(0, 1 << 32, 1000, dtype=np.uint64), np.uint64((1 << 32) - 1))
+    b = rng.integers(0, MERSENNE_PRIME, 1001, dtype=np.uint64)
+    expected = [(int(x) * int(v) + int(y)) % MERSENNE_PRIME for x, v, y in zip(a, values, b)]
+    assert mod_mersenne(mul_mod_mersenne(a, values) + b).tolist() == expected
+    signatures = minhash_signatures([shingles(BOILERPLATE), shingles(BOILERPLATE), shingles(REVENUE)])
+    assert (signatures[0] == signatures[1]).all() and (signatures[0] != signatures[2]).any()
+
+def test_near_duplicates_keep_the_first_copy():
+    first, copy, other = TextNode(text=BOILERPLATE), TextNode(text=BOILERPLATE + "."), TextNode(text=REVENUE)
+    indexed, _, stats = deduplicate_nodes([first, copy, other], [])
+    assert [node.node_id for node in indexed] == [first.node_id, other.node_id]
+    assert stats["near_duplicates"] == 1
+
+def test_table_summaries_are_never_dropped():
+    table = TextNode(text="| Revenue | 25,182 |")
+    summaries = [IndexNode(text=BOILERPLATE, index_id=table.node_id, obj=table) for _ in range(2)]
+    indexed, _, stats = deduplicate_nodes(summaries, [])
+    assert len(indexed) == 2
+    assert stats["near_duplicates"] == 0
+
+def test_pages_covered_by_their_elements_become_parents():
+    elements = [TextNode(text=REVENUE), TextNode(text=CASH)]
+    covered_page = TextNode(text=f"{REVENUE} {CASH}")
+    uncovered_page = TextNode(text=BOILERPLATE)
+    indexed, parents, stats = deduplicate_nodes(elements, [covered_page, uncovered_page])
+    assert [node.node_id for node in indexed] == [elements[0].node_id, elements[1].node_id, uncovered_page.node_id]
+    assert set(parents) == {covered_page.node_id, uncovered_page.node_id}
+    assert elements[0].relationships[NodeRelationship.PARENT].node_id == covered_page.node_id
+    assert stats["pages_covered"] == 1 and stats["elements_linked"] == 2
+
+def test_parent_pages_replace_retrieved_elements_once():
+    elements = [TextNode(text=REVENUE), TextNode(text=CASH)]
+    page = TextNode(text=f"{REVENUE} {CASH}")
+    _, parents, _ = deduplicate_nodes(elements, [page])
+    postprocessor = ParentPagePostprocessor(parents=parents)
+    expanded = postprocessor.postprocess_nodes([NodeWithScore(node=elements[1], score=0.9), NodeWithScore(node=elements[0], score=0.5)])
+    assert [(node.node.node_id, node.score) for node in expanded] == [(page.node_id, 0.9)]
+
+def test_settings_are_only_keyed_when_enabled():
+    assert dedup_settings(dedup_config_with_defaults()) is None
+    assert dedup_settings(dedup_config_with_defaults({"enabled": True}))["similarity_threshold"] == 0.9
@@ -0,0 +1,49 @@
+import gc
+import copy
+import pickle
+import pytest
+from llama_index.core.schema import NodeRelationship, TextNode
+from node_metadata import FrozenMetadata, intern_metadata, interned_records, set_shared_metadata, share_metadata
+
+METADATA = {"file_name": "TSLA-10Q-Sep2024.pdf", "parser": "pdfplumber", "pages": [1, 2]}
+
+def nodes_with_copies(count):
+    parent = TextNode(text="page", metadata=dict(METADATA))
+    nodes = [TextNode(text=f"element {i}", metadata=copy.deepcopy(METADATA)) for i in range(count)]
+    for node in nodes:
+        node.relationships[NodeRelationship.PARENT] = parent.as_related_node_info()
+    return nodes
+
+def test_equal_metadata_is_interned_once():
+    nodes = share_metadata(nodes_with_copies(3))
+    assert isinstance(nodes[0].metadata, FrozenMetadata)
+    assert nodes[0].metadata is nodes[1].metadata is nodes[2].metadata
+    assert nodes[0].relationships[NodeRelationship.PARENT].metadata is nodes[0].metadata
+
+def test_records_are_read_only():
+    record = intern_metadata(METADATA)
+    with pytest.raises(TypeError):
+        record["file_name"] = "other.pdf"
+    with pytest.raises(TypeError):
+        record.update(parser="llamaparse")
+    assert copy.deepcopy(record) is record
+
+def test_assigning_a_new_record_changes_one_node():
+    nodes = share_metadata(nodes_with_copies(2))
+    set_shared_metadata(nodes[0], {**nodes[0].metadata, "document": "TSLA"})
+    assert nodes[0].metadata["document"] == "TSLA"
+    assert "document" not in nodes[1].metadata
+    nodes[1].metadata = {"file_name": "PANW-10Q-Oct2024.pdf"}
+    assert nodes[1].metadata == {"file_name": "PANW-10Q-Oct2024.pdf"}
+
+def test_records_are_shared_again_after_a_reload():
+    loaded = share_metadata(pickle.loads(pickle.dumps(share_metadata(nodes_with_copies(2)))))
+    assert loaded[0].metadata is loaded[1].metadata is intern_metadata(METADATA)
+
+def test_records_are_freed_with_their_nodes():
+    metadata = {"file_name": "freed.pdf"}
+    nodes = share_metadata([TextNode(text="a", metadata=dict(metadata)), TextNode(text="b", metadata=dict(metadata))])
+    before = interned_records()
+    del nodes
+    gc.collect()
+    assert interned_records() == before - 1
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from rate_limit import ProviderRateLimiter, TokenBucket, call_with_retries, is_rate_limit_error
+
+class RateLimitError(Exception):
+    status_code = 429
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(RateLimitError())
+    assert is_rate_limit_error(Exception("429 Resource has been exhausted"))
+    assert is_rate_limit_error(Exception("Rate limit reached for gpt-4o-mini"))
+    assert not is_rate_limit_error(ValueError("invalid api key"))
+
+def test_call_with_retries_retries_rate_limits_until_success():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimitError()
+        return "answer"
+
+    assert asyncio.run(call_with_retries(call, base_delay=0)) == "answer"
+    assert len(attempts) == 3
+
+def test_call_with_retries_raises_other_errors_at_once():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_retries(call, base_delay=0))
+    assert len(attempts) == 1
+
+def test_call_with_retries_gives_up_after_max_retries():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(call_with_retries(call, max_retries=2, base_delay=0))
+    assert len(attempts) == 3
+
+def test_token_bucket_takes_tokens_up_to_its_burst():
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    asyncio.run(take(3))
+    assert bucket.tokens < 1
+
+def test_provider_limits_come_from_the_config():
+    limiter = ProviderRateLimiter({"rate_limits": {"OpenAI": {"requests_per_minute": 30}}})
+    assert limiter.bucket("openai").rate == 0.5
+    assert limiter.bucket("OPENAI") is limiter.bucket("openai")
+    assert limiter.bucket("gemini").rate == 1.0
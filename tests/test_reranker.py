@@ -0,0 +1,26 @@
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from reranker import initialize_reranker
+
+PASSAGES = ["Risk factors", "Total revenues for the quarter", "Revenues by segment", "Legal proceedings"]
+
+def nodes():
+    return [NodeWithScore(node=TextNode(id_=str(i), text=text), score=1.0) for i, text in enumerate(PASSAGES)]
+
+def test_no_reranker_fetches_the_retrieval_depth():
+    assert initialize_reranker({}, 5) == (None, 5)
+
+def test_top_n_defaults_to_the_retrieval_depth():
+    reranker, candidates = initialize_reranker({"reranker": {"type": "stub", "candidates": 20}}, 8)
+    assert reranker.top_n == 8 and candidates == 20
+
+def test_top_n_is_configured_separately_from_the_candidates():
+    reranker, candidates = initialize_reranker({"reranker": {"type": "stub", "candidates": 20, "top_n": 3}}, 8)
+    assert reranker.top_n == 3 and candidates == 20
+    # At least top_n candidates are fetched
+    _, candidates = initialize_reranker({"reranker": {"type": "stub", "candidates": 2, "top_n": 3}}, 8)
+    assert candidates == 3
+
+def test_keeps_the_best_top_n():
+    reranker, _ = initialize_reranker({"reranker": {"type": "stub", "top_n": 2}}, 5)
+    reranked = reranker.postprocess_nodes(nodes(), QueryBundle("total revenues"))
+    assert [node.node.text for node in reranked] == ["Total revenues for the quarter", "Revenues by segment"]
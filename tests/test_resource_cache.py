@@ -0,0 +1,54 @@
+import threading
+import time as time
+from resource_cache import ResourceCache
+
+def test_hits_and_misses():
+    cache = ResourceCache()
+    assert cache.get_or_create("a", lambda: 1) == 1
+    assert cache.get_or_create("a", lambda: 2) == 1
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "evictions": 0, "bytes": 0}
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    cache = ResourceCache(max_entries=2)
+    cache.get_or_create("a", lambda: 1)
+    cache.get_or_create("b", lambda: 2)
+    cache.get_or_create("a", lambda: 1)
+    cache.get_or_create("c", lambda: 3)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.evictions == 1
+
+def test_evicts_beyond_max_bytes_but_keeps_the_newest_entry():
+    cache = ResourceCache(max_bytes=10, sizeof=len)
+    cache.get_or_create("a", lambda: "x" * 6)
+    cache.get_or_create("b", lambda: "x" * 6)
+    assert list(cache.entries) == ["b"]
+    cache.get_or_create("c", lambda: "x" * 20)
+    assert list(cache.entries) == ["c"]
+    assert cache.total_bytes() == 20
+
+def test_evict_one_or_all():
+    cache = ResourceCache()
+    for key in "abc":
+        cache.get_or_create(key, lambda: key)
+    cache.evict("a")
+    assert list(cache.entries) == ["b", "c"]
+    cache.evict()
+    assert cache.stats()["entries"] == 0
+
+def test_concurrent_requests_build_once():
+    cache = ResourceCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("engine", build))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
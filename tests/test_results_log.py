@@ -0,0 +1,43 @@
+import json
+from results_log import append_result, export_results, load_result_index, log_path_for, read_results, repair_log
+
+def test_log_path_for():
+    assert log_path_for("results_gpt-4o-mini_text-embedding-3-small.json") == "results_gpt-4o-mini_text-embedding-3-small.jsonl"
+
+def test_read_results_skips_a_partial_last_line(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    append_result({"Query ID": "a", "score": 1}, log_path)
+    with open(log_path, "a") as f:
+        f.write('{"Query ID": "b", "sco')
+    assert [record["Query ID"] for record in read_results(log_path)] == ["a"]
+
+def test_repair_log_truncates_a_partial_last_line(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    append_result({"Query ID": "a"}, log_path)
+    append_result({"Query ID": "b"}, log_path)
+    with open(log_path, "a") as f:
+        f.write('{"Query ID": "c"')
+    assert repair_log(log_path)
+    assert not repair_log(log_path)
+    assert log_path.read_text().count("\n") == 2
+    append_result({"Query ID": "c"}, log_path)
+    assert [record["Query ID"] for record in read_results(log_path)] == ["a", "b", "c"]
+
+def test_repair_log_without_a_log(tmp_path):
+    assert not repair_log(tmp_path / "missing.jsonl")
+
+def test_load_result_index_seeds_the_log_from_exported_results(tmp_path):
+    results_file = tmp_path / "results.json"
+    results_file.write_text(json.dumps([{"Query ID": "a", "score": 0.5}]))
+    log_path = tmp_path / "results.jsonl"
+    index = load_result_index(log_path, results_file)
+    assert index == {"a": {"Query ID": "a", "score": 0.5}}
+    assert log_path.exists()
+
+def test_export_results_keeps_the_latest_record_in_first_logged_order(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    for record in [{"Query ID": "a", "score": 0}, {"Query ID": "b", "score": 1}, {"Query ID": "a", "score": 2}]:
+        append_result(record, log_path)
+    results_file = tmp_path / "results.json"
+    export_results(log_path, results_file)
+    assert json.loads(results_file.read_text()) == [{"Query ID": "a", "score": 2}, {"Query ID": "b", "score": 1}]
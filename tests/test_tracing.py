@@ -0,0 +1,146 @@
+import json
+import threading
+import urllib.request
+import pytest
+from tracing import NULL_SPAN, JsonlSpanSink, OtlpHttpSpanSink, Tracer, current_span, otlp_payload, otlp_records, percentile, read_spans, span_report
+from trace_collector import make_collector
+from backend import stream_tokens
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def export(self, record):
+        self.records.append(record)
+
+    def flush(self):
+        pass
+
+def record(name, duration_ms, error=None, **attributes):
+    return {"name": name, "duration_ms": duration_ms, "attributes": attributes, "error": error}
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer.from_config({})
+    with tracer.span("query") as span:
+        assert span is NULL_SPAN
+        assert current_span() is NULL_SPAN
+    assert not tracer.enabled
+
+def test_nested_spans_form_one_trace():
+    sink = ListSink()
+    tracer = Tracer(sink)
+    with tracer.span("query", question="q") as query:
+        with tracer.span("retrieve", top_k=3, document=None):
+            assert current_span().name == "retrieve"
+        assert current_span() is query
+    retrieve, query = sink.records
+    assert retrieve["parent_id"] == query["span_id"]
+    assert retrieve["trace_id"] == query["trace_id"]
+    assert query["parent_id"] is None
+    # None attributes are skipped
+    assert retrieve["attributes"] == {"top_k": 3}
+
+def test_errors_are_recorded_and_reraised():
+    sink = ListSink()
+    tracer = Tracer(sink)
+    with pytest.raises(ValueError):
+        with tracer.span("synthesize"):
+            raise ValueError("no nodes")
+    assert sink.records[0]["error"] == "ValueError: no nodes"
+
+def test_detached_spans_end_once():
+    sink = ListSink()
+    tracer = Tracer(sink)
+    with tracer.span("synthesize") as span:
+        span.detach()
+    assert sink.records == []
+    span.end(completion_tokens=12)
+    span.end(completion_tokens=99)
+    assert [r["attributes"] for r in sink.records] == [{"completion_tokens": 12}]
+
+def test_abandoned_streams_end_their_spans():
+    sink = ListSink()
+    tracer = Tracer(sink)
+    spans = (tracer.start_span("synthesize"), tracer.start_span("query"))
+    tokens = stream_tokens(iter(["The", " answer"]), 0.0, 0.1, 0.0, spans=spans)
+    assert next(tokens) == "The"
+    tokens.close()
+    assert [(r["name"], r["attributes"], r["error"]) for r in sink.records] == [
+        ("synthesize", {"aborted": True}, None), ("query", {"aborted": True}, None),
+    ]
+
+def test_jsonl_sink_round_trip(tmp_path):
+    path = str(tmp_path / "traces" / "traces.jsonl")
+    tracer = Tracer.from_config({"tracing": {"enabled": True, "sink": "jsonl", "path": path}})
+    for _ in range(3):
+        with tracer.span("retrieve", cache_hit=False):
+            pass
+    records = read_spans(path)
+    assert [r["name"] for r in records] == ["retrieve"] * 3
+    assert all(r["duration_ms"] >= 0 for r in records)
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 101))
+    assert percentile(ordered, 50) == 50
+    assert percentile(ordered, 95) == 95
+    assert percentile(ordered, 99) == 99
+    assert percentile([7], 99) == 7
+
+def test_span_report():
+    records = [record("retrieve", ms, cache_hit=ms > 80) for ms in range(1, 101)]
+    records += [record("synthesize", 10, prompt_tokens=100, completion_tokens=20)] * 2
+    records += [record("synthesize", 30, error="TimeoutError: slow")]
+    records += [record("ingest", 500)]
+    report = span_report(records)
+    # Pipeline order, not arrival order
+    assert list(report) == ["ingest", "retrieve", "synthesize"]
+    assert report["retrieve"]["p50_ms"] == 50 and report["retrieve"]["p95_ms"] == 95 and report["retrieve"]["max_ms"] == 100
+    assert report["retrieve"]["cache_hit_rate"] == 0.2
+    assert report["synthesize"]["count"] == 3 and report["synthesize"]["errors"] == 1
+    assert report["synthesize"]["tokens"] == {"prompt_tokens": 200, "completion_tokens": 40}
+    assert report["synthesize"]["cache_hit_rate"] is None
+
+def test_otlp_payload_round_trip():
+    sink = ListSink()
+    tracer = Tracer(sink)
+    with pytest.raises(RuntimeError):
+        with tracer.span("query", cached=True, top_k=5, score=0.5, model="gpt"):
+            with tracer.span("retrieve"):
+                pass
+            raise RuntimeError("boom")
+    records = otlp_records(json.loads(json.dumps(otlp_payload(sink.records))))
+    for original, decoded in zip(sink.records, records):
+        assert {**decoded, "start_time": None, "end_time": None, "duration_ms": None} == {**original, "start_time": None, "end_time": None, "duration_ms": None}
+        assert decoded["start_time"] == pytest.approx(original["start_time"])
+        assert decoded["duration_ms"] == pytest.approx(original["duration_ms"], abs=0.01)
+
+def test_unreachable_collector_drops_batches():
+    sink = OtlpHttpSpanSink("http://127.0.0.1:9/v1/traces", batch_size=2, timeout=0.5)
+    tracer = Tracer(sink)
+    for _ in range(3):
+        with tracer.span("retrieve"):
+            pass
+    assert sink.dropped == 2 and len(sink.buffer) == 1
+    tracer.flush()
+    assert sink.dropped == 3 and sink.sent == 0
+
+def test_collector_receives_otlp_spans(tmp_path):
+    path = str(tmp_path / "collected.jsonl")
+    server = make_collector(path, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        sink = OtlpHttpSpanSink(f"http://{host}:{port}/v1/traces", batch_size=10)
+        tracer = Tracer(sink)
+        for _ in range(4):
+            with tracer.span("rerank"):
+                pass
+        tracer.flush()
+        assert sink.sent == 4 and sink.dropped == 0
+        assert [r["name"] for r in read_spans(path)] == ["rerank"] * 4
+        with urllib.request.urlopen(f"http://{host}:{port}/report") as response:
+            assert json.loads(response.read())["rerank"]["count"] == 4
+    finally:
+        server.shutdown()
+        server.server_close()
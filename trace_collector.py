@@ -0,0 +1,90 @@
+import os
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tracing import DEFAULT_TRACES_PATH, otlp_records, span_report
+
+# A stand-in for an OpenTelemetry collector, for local runs without one: it
+# accepts OTLP/HTTP JSON on /v1/traces (what the "otlp" tracing sink sends) and
+# appends the spans to a JSONL file in the "jsonl" sink's format, so
+# ``python tracing.py <file>`` reports on either.
+
+class TraceCollectorHandler(BaseHTTPRequestHandler):
+    """
+        POST /v1/traces  -> OTLP JSON ExportTraceServiceRequest; spans are appended to the output file
+        GET  /report     -> per-stage p50/p95/p99 latency, tokens and cache hit rate of the spans received
+    """
+
+    output_path = DEFAULT_TRACES_PATH
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            records = otlp_records(json.loads(self.rfile.read(length) or b"{}"))
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        with self.lock:
+            with open(self.output_path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+        # An empty ExportTraceServiceResponse: every span was accepted
+        self.send_json(200, {})
+
+    def do_GET(self):
+        if self.path != "/report":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        with self.lock:
+            records = []
+            if os.path.exists(self.output_path):
+                with open(self.output_path, "r") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+        self.send_json(200, span_report(records))
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_collector(output_path=DEFAULT_TRACES_PATH, host="127.0.0.1", port=4318, verbose=False):
+    """Creates a threaded HTTP server that collects OTLP spans into a JSONL file."""
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    handler = type("BoundTraceCollectorHandler", (TraceCollectorHandler,), {"output_path": output_path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.verbose = verbose
+    return server
+
+if __name__ == "__main__":
+    #
+    # USAGE: python trace_collector.py --output artifacts/traces.jsonl --port 4318
+    #        curl -s localhost:4318/report
+    #
+    parser = argparse.ArgumentParser(description="Local stand-in for an OpenTelemetry collector (OTLP/HTTP JSON).")
+    parser.add_argument("--output", type=str, default=DEFAULT_TRACES_PATH, help=f"JSONL file spans are appended to (default: {DEFAULT_TRACES_PATH}).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=4318, help="Port to bind (default: 4318, the OTLP/HTTP port).")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = make_collector(args.output, args.host, args.port, args.verbose)
+    print(f"Collecting spans on http://{args.host}:{args.port}/v1/traces into {args.output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,413 @@
+import os
+import sys
+import json
+import math
+import atexit
+import secrets
+import argparse
+import threading
+import contextvars
+import time as time
+import urllib.request
+from contextlib import contextmanager
+
+# Structured spans around every stage of ingest and query, so a slow query or
+# ingest can be broken down: parse, element_parse, table_summaries, embed and
+# index_build under "ingest", and retrieve, rerank and synthesize under "query".
+# Spans carry token counts and cache hit flags as attributes and are sent to a
+# sink selected in the "tracing" section of config.json:
+#   "tracing": {"enabled": true, "sink": "jsonl", "path": "artifacts/traces.jsonl"}
+#   "tracing": {"enabled": true, "sink": "otlp", "endpoint": "http://localhost:4318/v1/traces"}
+# Tracing is off by default, and then costs one no-op call per stage.
+
+DEFAULT_TRACES_PATH = os.path.join("artifacts", "traces.jsonl")
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318/v1/traces"
+DEFAULT_SERVICE_NAME = "findoc"
+
+# The stages of the report, in pipeline order; other span names follow them
+STAGES = [
+    "ingest", "parse", "element_parse", "table_summaries", "embed", "index_build",
+    "query", "retrieve", "rerank", "synthesize",
+]
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """
+    One timed stage. Attributes are set with ``set`` while it runs and it is
+    exported when ``end`` is called, once.
+    """
+
+    recording = True
+
+    def __init__(self, tracer, name, parent=None, attributes=None, start_time=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.start_time = start_time or time.time()
+        self.end_time = None
+        self.error = None
+        self.detached = False
+
+    def set(self, **attributes):
+        """Sets attributes, skipping None values."""
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+        return self
+
+    def detach(self):
+        """Keeps the span open when its ``Tracer.span`` block exits, for whoever ends it later (e.g. a token stream)."""
+        self.detached = True
+        return self
+
+    def end(self, error=None, end_time=None, **attributes):
+        """Finishes the span and exports it. Later calls do nothing."""
+        if self.end_time is not None:
+            return
+        self.set(**attributes)
+        self.end_time = end_time or time.time()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.tracer.export(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round((self.end_time - self.start_time) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class NullSpan:
+    """Span returned while tracing is off: every method is a no-op."""
+
+    recording = False
+    trace_id = span_id = None
+
+    def set(self, **attributes):
+        return self
+
+    def detach(self):
+        return self
+
+    def end(self, error=None, end_time=None, **attributes):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def current_span():
+    """The innermost open span of the current thread or asyncio task, or a no-op span."""
+    return _current_span.get() or NULL_SPAN
+
+class Tracer:
+    """
+    Creates spans and exports finished ones to a sink; without a sink nothing is recorded.
+
+    A span's parent defaults to the innermost span opened with ``span`` in the
+    current thread or asyncio task, so nested stages form one trace.
+    """
+
+    def __init__(self, sink=None, settings=None):
+        self.sink = sink
+        self.settings = settings
+        self.exported = 0
+
+    @property
+    def enabled(self):
+        return self.sink is not None
+
+    def start_span(self, name, parent=None, start_time=None, **attributes):
+        """Starts a span that the caller ends with ``Span.end``."""
+        if self.sink is None:
+            return NULL_SPAN
+        if parent is None or not parent.recording:
+            parent = _current_span.get()
+        return Span(self, name, parent, attributes, start_time)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times the enclosed block as a span that is the parent of the spans started within it.
+
+        An exception leaving the block is recorded on the span and re-raised.
+        """
+        span = self.start_span(name, **attributes)
+        if not span.recording:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+        if not span.detached:
+            span.end()
+
+    def export(self, span):
+        self.sink.export(span.to_dict())
+        self.exported += 1
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a tracer from the "tracing" section of a config; a disabled one when tracing is off."""
+        tracing_config = config.get("tracing") or {}
+        if not tracing_config.get("enabled", False):
+            return cls()
+        sink_type = tracing_config.get("sink", "jsonl").lower()
+        if sink_type == "jsonl":
+            sink = JsonlSpanSink(tracing_config.get("path", DEFAULT_TRACES_PATH))
+        elif sink_type == "otlp":
+            sink = OtlpHttpSpanSink(
+                tracing_config.get("endpoint", DEFAULT_OTLP_ENDPOINT),
+                service_name=tracing_config.get("service_name", DEFAULT_SERVICE_NAME),
+                batch_size=tracing_config.get("batch_size", 64),
+            )
+        else:
+            raise ValueError(f"Unsupported tracing sink: {sink_type}")
+        return cls(sink, settings=json.dumps(tracing_config, sort_keys=True))
+
+_tracer = Tracer()
+
+def get_tracer():
+    """Returns the process-wide tracer (disabled until configure_tracing turns it on)."""
+    return _tracer
+
+def configure_tracing(config):
+    """Sets the process-wide tracer from a config's "tracing" section, keeping the current one if its settings are unchanged."""
+    global _tracer
+    tracer = Tracer.from_config(config)
+    if tracer.settings != _tracer.settings:
+        _tracer.flush()
+        _tracer = tracer
+    return _tracer
+
+# Spans still buffered by a sink are sent when the process exits
+atexit.register(lambda: _tracer.flush())
+
+# --- Sinks ---
+class JsonlSpanSink:
+    """Appends each finished span to a JSONL file, one ``Span.to_dict`` object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def flush(self):
+        pass
+
+class OtlpHttpSpanSink:
+    """
+    Sends spans to an OpenTelemetry collector with OTLP/HTTP in its JSON encoding.
+
+    Spans are buffered and posted ``batch_size`` at a time (and on ``flush``, which
+    runs at exit) by the thread that ends the batch's last span. A collector that
+    cannot be reached never fails a query: the batch is dropped and counted in
+    ``dropped``.
+    """
+
+    def __init__(self, endpoint=DEFAULT_OTLP_ENDPOINT, service_name=DEFAULT_SERVICE_NAME, batch_size=64, timeout=2.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.buffer = []
+        self.sent = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def export(self, record):
+        with self.lock:
+            self.buffer.append(record)
+            if len(self.buffer) < self.batch_size:
+                return
+            batch, self.buffer = self.buffer, []
+        self.send(batch)
+
+    def flush(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+        if batch:
+            self.send(batch)
+
+    def send(self, batch):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(otlp_payload(batch, self.service_name)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            self.sent += len(batch)
+        except OSError:
+            self.dropped += len(batch)
+
+def otlp_value(value):
+    """An attribute value in OTLP's JSON encoding."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_payload(records, service_name=DEFAULT_SERVICE_NAME):
+    """An OTLP ExportTraceServiceRequest, JSON-encoded, for span records."""
+    spans = []
+    for record in records:
+        span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(int(record["start_time"] * 1e9)),
+            "endTimeUnixNano": str(int(record["end_time"] * 1e9)),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in record["attributes"].items()],
+            # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+            "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 0},
+        }
+        if record["parent_id"]:
+            span["parentSpanId"] = record["parent_id"]
+        spans.append(span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]
+    }
+
+def otlp_records(payload):
+    """The span records of an OTLP JSON payload: the inverse of otlp_payload."""
+    records = []
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                start_time = int(span["startTimeUnixNano"]) / 1e9
+                end_time = int(span["endTimeUnixNano"]) / 1e9
+                status = span.get("status") or {}
+                records.append({
+                    "name": span["name"],
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId") or None,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "duration_ms": round((end_time - start_time) * 1000, 3),
+                    "attributes": {
+                        attribute["key"]: otlp_attribute_value(attribute["value"])
+                        for attribute in span.get("attributes", [])
+                    },
+                    "error": status.get("message") if status.get("code") == 2 else None,
+                })
+    return records
+
+def otlp_attribute_value(value):
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+# --- Token counts ---
+def count_tokens(text):
+    """Estimated token count of a text, with llama_index's default tokenizer."""
+    from llama_index.core.utils import get_tokenizer
+
+    return len(get_tokenizer()(text))
+
+# --- Report ---
+def percentile(ordered, q):
+    """Returns the q-th percentile of an already sorted, non-empty list (nearest rank)."""
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def read_spans(path):
+    """Reads span records from a JSONL file written by JsonlSpanSink or trace_collector.py."""
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def span_report(records):
+    """
+    Summarizes span records per stage.
+
+    Returns:
+        dict: Per span name, in pipeline order: count, errors, p50/p95/p99/max
+            duration in milliseconds, the total of every ``*tokens`` attribute and,
+            for stages with a ``cache_hit`` flag, the share of cache hits.
+    """
+    durations, tokens, cache_hits, errors = {}, {}, {}, {}
+    for record in records:
+        name = record["name"]
+        durations.setdefault(name, []).append(record["duration_ms"])
+        errors[name] = errors.get(name, 0) + bool(record.get("error"))
+        for key, value in record["attributes"].items():
+            if key.endswith("tokens") and isinstance(value, (int, float)):
+                stage_tokens = tokens.setdefault(name, {})
+                stage_tokens[key] = stage_tokens.get(key, 0) + value
+        if "cache_hit" in record["attributes"]:
+            cache_hits.setdefault(name, []).append(bool(record["attributes"]["cache_hit"]))
+
+    order = {stage: position for position, stage in enumerate(STAGES)}
+    report = {}
+    for name in sorted(durations, key=lambda name: (order.get(name, len(STAGES)), name)):
+        ordered = sorted(durations[name])
+        report[name] = {
+            "count": len(ordered),
+            "errors": errors[name],
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p95_ms": round(percentile(ordered, 95), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2),
+            "tokens": tokens.get(name, {}),
+            "cache_hit_rate": round(sum(cache_hits[name]) / len(cache_hits[name]), 3) if name in cache_hits else None,
+        }
+    return report
+
+def format_report(report):
+    """The span report as a text table."""
+    lines = [f"{'stage':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'cache hits':>12}  tokens"]
+    for name, stage in report.items():
+        cache_hit_rate = "" if stage["cache_hit_rate"] is None else f"{stage['cache_hit_rate']:.0%}"
+        stage_tokens = ", ".join(f"{key}={value:g}" for key, value in stage["tokens"].items())
+        lines.append(
+            f"{name:<16}{stage['count']:>7}{stage['errors']:>8}{stage['p50_ms']:>10.1f}{stage['p95_ms']:>10.1f}"
+            f"{stage['p99_ms']:>10.1f}{stage['max_ms']:>10.1f}{cache_hit_rate:>12}  {stage_tokens}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    #
+    # USAGE: python tracing.py artifacts/traces.jsonl
+    #        python tracing.py artifacts/traces.jsonl --json
+    #
+    parser = argparse.ArgumentParser(description="p50/p95/p99 latency, tokens and cache hits per stage from recorded spans.")
+    parser.add_argument("traces", type=str, nargs="?", default=DEFAULT_TRACES_PATH, help="JSONL file of spans.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.traces):
+        sys.exit(f"No spans at {args.traces}; enable the \"tracing\" section of config.json first.")
+    report = span_report(read_spans(args.traces))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))